@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
 from typing import Dict
 
-from flask import Flask, redirect, render_template, url_for
+import click
+from flask import Flask, current_app, redirect, render_template, url_for
 from flask_login import current_user
 from flask.cli import with_appcontext
 
 from .extensions import csrf, db, login_manager, migrate
-from .models import Gift, Purchase, User
+from .models import Gift, Job, Purchase, User
+from .utils.serving import check_send_mode
 
 CONFIG_MAPPING: Dict[str, str] = {
     "development": "config.DevelopmentConfig",
@@ -24,6 +28,7 @@ def create_app(config_name: str | None = None) -> Flask:
         config_name = os.getenv("FLASK_ENV", "development")
     config_path = CONFIG_MAPPING.get(config_name, config_name)
     app.config.from_object(config_path)
+    check_send_mode(app.config.get("UPLOADS_SEND_MODE", "python"))
 
     register_extensions(app)
     register_blueprints(app)
@@ -50,11 +55,13 @@ def register_extensions(app: Flask) -> None:
 
 
 def register_blueprints(app: Flask) -> None:
+    from .api.routes import api_bp
     from .auth.routes import auth_bp
     from .gifts.routes import gifts_bp
     from .purchases.routes import purchases_bp
     from .users.routes import users_bp
 
+    app.register_blueprint(api_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(gifts_bp)
     app.register_blueprint(purchases_bp)
@@ -64,17 +71,110 @@ def register_blueprints(app: Flask) -> None:
 def register_shellcontext(app: Flask) -> None:
     @app.shell_context_processor
     def shell_context():
-        return {"db": db, "User": User, "Gift": Gift, "Purchase": Purchase}
+        return {"db": db, "User": User, "Gift": Gift, "Purchase": Purchase, "Job": Job}
 
 
 def register_cli(app: Flask) -> None:
+    from .services import gift_images  # noqa: F401 - registers job handlers
+    from .services.gift_stats import rebuild_gift_stats
+    from .services.gift_transfer import IMPORT_FORMATS, import_format, import_gifts
+    from .services.jobs import run_pending_jobs, start_workers
     from .services.seed import seed_demo_data
+    from .services.uploads import collect_orphaned_uploads, migrate_legacy_uploads
 
     @app.cli.command("seed")
     @with_appcontext
     def seed() -> None:
         seed_demo_data()
 
+    @app.cli.command("gifts-import")
+    @click.argument("email")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(sorted(set(IMPORT_FORMATS.values()))), default=None)
+    @with_appcontext
+    def gifts_import(email: str, path: str, fmt: str | None) -> None:
+        """Import gifts for the user with EMAIL from a CSV or JSON file."""
+        user = db.session.scalar(db.select(User).where(User.email == email))
+        if user is None:
+            raise click.ClickException(f"No user with email {email}")
+        fmt = fmt or import_format(path)
+        if fmt is None:
+            raise click.ClickException("Cannot tell the file format from its name; pass --format")
+        started = time.perf_counter()
+        with open(path, "rb") as handle:
+            try:
+                result = import_gifts(user.id, handle, fmt)
+            except ValueError as exc:
+                raise click.ClickException(str(exc)) from exc
+        for number, message in result.errors:
+            click.echo(f"row {number}: {message}", err=True)
+        click.echo(
+            f"Imported {result.imported} gift(s) in {time.perf_counter() - started:.2f}s, "
+            f"skipped {len(result.errors)}, queued {result.queued} image lookup(s)"
+        )
+
+    @app.cli.command("stats-rebuild")
+    @with_appcontext
+    def stats_rebuild() -> None:
+        """Recompute every user's gift statistics from scratch."""
+        click.echo(f"Rebuilt gift statistics for {rebuild_gift_stats()} user(s)")
+
+    @app.cli.command("uploads-migrate")
+    @click.option("--batch-size", type=int, default=200, show_default=True)
+    @with_appcontext
+    def uploads_migrate(batch_size: int) -> None:
+        """Move legacy uploads into content-addressed storage."""
+        stats = migrate_legacy_uploads(batch_size=batch_size)
+        click.echo(
+            f"Migrated {stats['migrated']} file(s), deduplicated {stats['deduplicated']}, "
+            f"{stats['missing']} missing on disk"
+        )
+
+    @app.cli.command("uploads-gc")
+    @click.option("--grace-seconds", type=int, default=None, help="Minimum file age (default UPLOADS_GC_GRACE_SECONDS).")
+    @click.option("--dry-run", is_flag=True, help="Report what would be removed without deleting anything.")
+    @click.option("--interval", type=float, default=None, help="Keep running, sweeping every INTERVAL seconds.")
+    @with_appcontext
+    def uploads_gc(grace_seconds: int | None, dry_run: bool, interval: float | None) -> None:
+        """Delete uploaded files that no gift references any more."""
+        if grace_seconds is None:
+            grace_seconds = current_app.config.get("UPLOADS_GC_GRACE_SECONDS", 24 * 3600)
+        while True:
+            stats = collect_orphaned_uploads(grace_seconds, dry_run=dry_run)
+            verb = "Would remove" if dry_run else "Removed"
+            click.echo(
+                f"{verb} {stats['removed']} of {stats['scanned']} file(s), {stats['bytes'] / 1024:.1f} KiB; "
+                f"{stats['recent']} inside the grace period"
+            )
+            if interval is None:
+                return
+            db.session.remove()
+            time.sleep(interval)
+
+    @app.cli.command("jobs-worker")
+    @click.option("--concurrency", type=int, default=None, help="Worker threads (default JOBS_CONCURRENCY).")
+    @click.option("--poll-interval", type=float, default=None, help="Seconds to sleep when the queue is empty.")
+    @click.option("--once", is_flag=True, help="Drain the queue in this thread and exit.")
+    @with_appcontext
+    def jobs_worker(concurrency: int | None, poll_interval: float | None, once: bool) -> None:
+        """Run background jobs (image inference and friends)."""
+        if once:
+            click.echo(f"Ran {run_pending_jobs()} job(s)")
+            return
+        worker_app = current_app._get_current_object()
+        concurrency = concurrency or worker_app.config.get("JOBS_CONCURRENCY", 2)
+        poll_interval = poll_interval or worker_app.config.get("JOBS_POLL_INTERVAL", 1.0)
+        stop = threading.Event()
+        threads = start_workers(worker_app, concurrency, poll_interval, stop)
+        click.echo(f"Job worker running with {concurrency} thread(s); Ctrl+C to stop")
+        try:
+            while any(thread.is_alive() for thread in threads):
+                stop.wait(1.0)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
 
 def initialize_database(app: Flask) -> None:
     """Ensure that the database schema exists before handling requests."""
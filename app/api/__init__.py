@@ -0,0 +1,3 @@
+from .routes import api_bp
+
+__all__ = ["api_bp"]
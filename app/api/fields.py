@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import url_for
+from flask_login import current_user
+
+from ..models import Gift, Purchase, User
+
+
+@dataclass(frozen=True)
+class ApiField:
+    """One selectable attribute of an API item: the columns it reads and how it is rendered."""
+
+    name: str
+    columns: Tuple[Any, ...]
+    render: Callable[[Any], Any]
+
+
+def _column(column, label: Optional[str] = None) -> ApiField:
+    label = label or column.key
+    labelled = column.label(label)
+    return ApiField(label, (labelled,), lambda row: getattr(row, label))
+
+
+def _text(column, label: Optional[str] = None) -> ApiField:
+    label = label or column.key
+    return ApiField(label, (column.label(label),), lambda row: _str_or_none(getattr(row, label)))
+
+
+def _timestamp(column, label: Optional[str] = None) -> ApiField:
+    label = label or column.key
+    return ApiField(label, (column.label(label),), lambda row: getattr(row, label).isoformat() + "Z")
+
+
+def _str_or_none(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _gift_image(row) -> Optional[str]:
+    if row.image_path:
+        return url_for("gifts.uploaded_file", filename=row.image_path, _external=True)
+    return row.image_url
+
+
+GIFT_FIELDS: Dict[str, ApiField] = {
+    field.name: field
+    for field in (
+        _column(Gift.id),
+        _column(Gift.title),
+        _column(Gift.description),
+        _column(Gift.url),
+        ApiField("image", (Gift.image_path.label("image_path"), Gift.image_url.label("image_url")), _gift_image),
+        _text(Gift.price),
+        _column(Gift.notes),
+        _timestamp(Gift.created_at),
+    )
+}
+
+# Purchase state exists only for people looking at someone else's list; the
+# owner never gets these fields, whatever ``fields=`` asks for.
+GUEST_GIFT_FIELDS: Dict[str, ApiField] = {
+    "purchased": ApiField("purchased", (Purchase.buyer_id.label("buyer_id"),), lambda row: row.buyer_id is not None),
+    "purchased_by_me": ApiField(
+        "purchased_by_me", (Purchase.buyer_id.label("buyer_id"),), lambda row: row.buyer_id == current_user.id
+    ),
+}
+
+PURCHASE_FIELDS: Dict[str, ApiField] = {
+    field.name: field
+    for field in (
+        _column(Purchase.id),
+        _timestamp(Purchase.purchased_at),
+        _column(Purchase.gift_id),
+        _column(Gift.title, "gift_title"),
+        _column(Gift.url, "gift_url"),
+        _column(User.name, "owner_name"),
+        _column(User.slug, "owner_username"),
+    )
+}
+
+
+def parse_fields(raw: Optional[str], available: Dict[str, ApiField], hidden: Sequence[str] = ()) -> List[ApiField]:
+    """Resolve a ``fields=a,b`` parameter against ``available``; no parameter means every field.
+
+    Names in ``hidden`` are accepted but dropped, so one widget can ask every
+    list for the same fields. Raises ``ValueError`` naming unknown fields.
+    """
+
+    if not raw:
+        return [field for name, field in available.items() if name not in hidden]
+    names = list(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available and name not in hidden]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}; choose from {', '.join(available)}")
+    return [available[name] for name in names if name not in hidden]
+
+
+def selected_columns(fields: Sequence[ApiField], *always) -> List[Any]:
+    """The distinct columns ``fields`` read, after the ``always`` ones (keyset and join keys)."""
+
+    columns: List[Any] = list(always)
+    seen = {column.key for column in columns}
+    for field in fields:
+        for column in field.columns:
+            if column.key not in seen:
+                seen.add(column.key)
+                columns.append(column)
+    return columns
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+from typing import Any
+
+from flask import Response, current_app, request
+
+from ..utils.conditional import not_modified, with_etag
+
+
+def api_response(payload: Any) -> Response:
+    """Serialize ``payload`` with a content ETag, answering 304 or gzip as the client allows.
+
+    The ETag is the digest of the uncompressed body, so it is the same in
+    every worker and for both encodings (hence weak); a revalidation that
+    matches skips compression and the body entirely.
+    """
+
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    cached = not_modified(etag)
+    if cached is not None:
+        cached.vary.add("Accept-Encoding")
+        return cached
+    response = with_etag(body, etag)
+    response.mimetype = "application/json"
+    response.vary.add("Accept-Encoding")
+    if len(body) >= current_app.config.get("API_GZIP_MIN_BYTES", 1024) and request.accept_encodings["gzip"]:
+        response.set_data(gzip.compress(body, compresslevel=6, mtime=0))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
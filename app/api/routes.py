@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from flask import Blueprint, current_app, request
+from flask_login import current_user
+from sqlalchemy import select
+
+from ..models import Gift, Purchase, User
+from ..services.usernames import resolve_username
+from ..utils.pagination import keyset_paginate
+from .fields import GIFT_FIELDS, GUEST_GIFT_FIELDS, PURCHASE_FIELDS, parse_fields, selected_columns
+from .responses import api_response
+
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+_PURCHASE_GIFT_FIELDS = {"gift_title", "gift_url", "owner_name", "owner_username"}
+
+
+@api_bp.before_request
+def _require_login():
+    # Same session cookie as the site, but a JSON 401 instead of the login redirect.
+    if not current_user.is_authenticated:
+        return {"error": "Authentication required"}, 401
+    return None
+
+
+def _page_size(default: int) -> int:
+    limit = request.args.get("limit", default, type=int)
+    return min(max(limit, 1), current_app.config.get("API_MAX_PAGE_SIZE", 200))
+
+
+def _items(page, fields):
+    return [{field.name: field.render(row) for field in fields} for row in page.items]
+
+
+@api_bp.route("/users/<string:username>/gifts")
+def user_gifts(username: str):
+    owner = resolve_username(username)
+    if owner is None:
+        return {"error": "User not found"}, 404
+    is_owner = owner.id == current_user.id
+    available = GIFT_FIELDS if is_owner else {**GIFT_FIELDS, **GUEST_GIFT_FIELDS}
+    try:
+        fields = parse_fields(request.args.get("fields"), available, hidden=list(GUEST_GIFT_FIELDS) if is_owner else ())
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+
+    # Only the requested columns are selected; purchases are joined only when
+    # a guest asked for purchase state.
+    stmt = select(*selected_columns(fields, Gift.id, Gift.created_at)).where(Gift.owner_id == owner.id)
+    if any(field.name in GUEST_GIFT_FIELDS for field in fields):
+        stmt = stmt.outerjoin(Purchase, Purchase.gift_id == Gift.id)
+    page = keyset_paginate(
+        stmt,
+        Gift.created_at,
+        Gift.id,
+        cursor=request.args.get("cursor"),
+        per_page=_page_size(current_app.config.get("GIFTS_PER_PAGE", 48)),
+        descending=False,
+        scalars=False,
+    )
+    return api_response(
+        {
+            "owner": {"name": owner.name, "username": owner.username},
+            "items": _items(page, fields),
+            "next_cursor": page.next_cursor,
+        }
+    )
+
+
+@api_bp.route("/me/purchases")
+def my_purchases():
+    try:
+        fields = parse_fields(request.args.get("fields"), PURCHASE_FIELDS)
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+
+    stmt = select(*selected_columns(fields, Purchase.id, Purchase.purchased_at)).where(
+        Purchase.buyer_id == current_user.id
+    )
+    names = {field.name for field in fields}
+    if names & _PURCHASE_GIFT_FIELDS:
+        stmt = stmt.join(Gift, Gift.id == Purchase.gift_id)
+    if any(name.startswith("owner_") for name in names):
+        stmt = stmt.join(User, User.id == Gift.owner_id)
+    page = keyset_paginate(
+        stmt,
+        Purchase.purchased_at,
+        Purchase.id,
+        cursor=request.args.get("cursor"),
+        per_page=_page_size(current_app.config.get("PURCHASES_PER_PAGE", 50)),
+        descending=True,
+        scalars=False,
+    )
+    return api_response({"items": _items(page, fields), "next_cursor": page.next_cursor})
@@ -1,16 +1,42 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from flask import Blueprint, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
+from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import TooManyRequests
 
 from ..extensions import db
 from ..models import User
+from ..services.passwords import hash_password, verify_password
 from ..utils.rate_limit import limit_auth_route
 from .forms import LoginForm, PasswordResetRequestForm, RegistrationForm
 
 auth_bp = Blueprint("auth", __name__, template_folder="../templates/auth")
 
+_REGISTER_ATTEMPTS = 3
+
+
+def _create_account(email: str, name: str, password_hash: str) -> Optional[User]:
+    # Two sign-ups whose email local parts slugify alike can both pick the
+    # same free slug; the loser rolls back and the slug listener, now seeing
+    # the winner, picks the next suffix. ``None`` means the email was taken.
+    for attempt in range(1, _REGISTER_ATTEMPTS + 1):
+        user = User(email=email, name=name, password_hash=password_hash)
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if User.query.filter_by(email=email).first() is not None:
+                return None
+            if attempt == _REGISTER_ATTEMPTS:
+                raise
+        else:
+            return user
+    return None
+
 
 @auth_bp.route("/register", methods=["GET", "POST"])
 @limit_auth_route
@@ -19,13 +45,12 @@ def register():
         return redirect(url_for("gifts.my_gifts"))
     form = RegistrationForm()
     if form.validate_on_submit():
-        user = User(email=form.email.data.lower(), name=form.name.data)
-        user.set_password(form.password.data)
-        db.session.add(user)
-        db.session.commit()
-        login_user(user)
-        flash("Welcome to GiftList!", "success")
-        return redirect(url_for("gifts.my_gifts"))
+        user = _create_account(form.email.data.lower(), form.name.data, hash_password(form.password.data))
+        if user is not None:
+            login_user(user)
+            flash("Welcome to GiftList!", "success")
+            return redirect(url_for("gifts.my_gifts"))
+        form.email.errors.append("Email already registered.")
     return render_template("auth/register.html", form=form)
 
 
@@ -37,7 +62,8 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data.lower()).first()
-        if user and user.check_password(form.password.data):
+        if user and verify_password(user, form.password.data):
+            db.session.commit()  # persists an upgraded hash, if any
             login_user(user)
             flash("Logged in successfully", "success")
             next_page = request.args.get("next")
@@ -3,7 +3,7 @@ from __future__ import annotations
 from urllib.parse import urlparse
 
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileAllowed, FileField
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import DecimalField, StringField, SubmitField, TextAreaField
 from wtforms.validators import URL, Length, Optional, ValidationError
 
@@ -27,3 +27,11 @@ class GiftForm(FlaskForm):
     price = DecimalField("Price", validators=[Optional()], places=2)
     notes = TextAreaField("Notes", validators=[Optional(), Length(max=2000)])
     submit = SubmitField("Save")
+
+
+class GiftImportForm(FlaskForm):
+    file = FileField(
+        "CSV or JSON file",
+        validators=[FileRequired(), FileAllowed({"csv", "json", "jsonl", "ndjson"}, "CSV or JSON files only!")],
+    )
+    submit = SubmitField("Import")
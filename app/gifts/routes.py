@@ -3,31 +3,80 @@ from __future__ import annotations
 from decimal import Decimal
 from pathlib import Path
 
-from flask import (Blueprint, current_app, flash, redirect, render_template,
-                   request, send_from_directory, url_for)
+import requests
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_required
+from sqlalchemy import select
+from sqlalchemy.orm import raiseload
 
 from ..extensions import db
-from ..models import Gift
-from ..utils.images import fetch_image, infer_image_url, save_upload
-from .forms import GiftForm
+from ..models import Gift, UserGiftStats
+from ..services.gift_images import (
+    needs_image_inference,
+    needs_proxy_warmup,
+    queue_image_inference,
+    queue_proxy_warmup,
+)
+from ..services.gift_transfer import export_gifts_csv, export_gifts_json, import_format, import_gifts
+from ..services.list_versions import owner_gifts_version
+from ..utils.conditional import not_modified, page_etag, with_etag
+from ..utils.derivatives import ensure_derivative, image_srcset
+from ..utils.http import HostBusy
+from ..utils.image_proxy import fetch_proxied_image, is_proxyable, proxied_image_url, verify_signature
+from ..utils.images import fetch_image, save_upload
+from ..utils.pagination import keyset_paginate
+from ..utils.serving import send_immutable_file
+from .forms import GiftForm, GiftImportForm
 
 
 gifts_bp = Blueprint("gifts", __name__, url_prefix="", template_folder="../templates/gifts")
 
 
+def _owner_gifts_page():
+    # Owners never see purchase state, so refuse to lazy-load it at all: a
+    # template touching ``gift.purchase`` here is both an N+1 and a spoiler.
+    stmt = select(Gift).where(Gift.owner_id == current_user.id).options(raiseload(Gift.purchase))
+    return keyset_paginate(
+        stmt,
+        Gift.created_at,
+        Gift.id,
+        cursor=request.args.get("cursor"),
+        per_page=current_app.config.get("GIFTS_PER_PAGE", 48),
+        descending=True,
+    )
+
+
+def _render_owner_gifts(template: str, **context):
+    # The version covers every gift column the stats are derived from.
+    etag = page_etag(request.endpoint, request.args.get("cursor"), owner_gifts_version(current_user.id))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    page = _owner_gifts_page()
+    return with_etag(render_template(template, gifts=page.items, page=page, **context), etag)
+
+
 @gifts_bp.route("/dashboard")
 @login_required
 def dashboard():
-    gifts = Gift.query.filter_by(owner_id=current_user.id).order_by(Gift.created_at.desc()).all()
-    return render_template("dashboard.html", gifts=gifts)
+    return _render_owner_gifts("dashboard.html", stats=db.session.get(UserGiftStats, current_user.id))
 
 
 @gifts_bp.route("/me/gifts")
 @login_required
 def my_gifts():
-    gifts = Gift.query.filter_by(owner_id=current_user.id).order_by(Gift.created_at.desc()).all()
-    return render_template("gifts/my_gifts.html", gifts=gifts)
+    return _render_owner_gifts("gifts/my_gifts.html")
 
 
 @gifts_bp.route("/gifts/create", methods=["GET", "POST"])
@@ -52,11 +101,12 @@ def create_gift():
             except ValueError as exc:
                 flash(str(exc), "danger")
                 return render_template("gifts/gift_form.html", form=form, gift=None)
-        if not image_uploaded and not gift.image_url and gift.url:
-            inferred = infer_image_url(gift.url)
-            if inferred:
-                gift.image_url = inferred
         db.session.add(gift)
+        if not image_uploaded and needs_image_inference(gift):
+            db.session.flush()
+            queue_image_inference(gift)
+        elif needs_proxy_warmup(gift):
+            queue_proxy_warmup(gift)
         db.session.commit()
         flash("Gift created", "success")
         return redirect(url_for("gifts.my_gifts"))
@@ -75,6 +125,7 @@ def edit_gift(gift_id: int):
         gift.title = form.title.data
         gift.description = form.description.data
         gift.url = form.url.data
+        image_url_changed = gift.image_url != form.image_url.data
         gift.image_url = form.image_url.data
         gift.price = Decimal(str(form.price.data)) if form.price.data is not None else None
         gift.notes = form.notes.data
@@ -86,10 +137,10 @@ def edit_gift(gift_id: int):
             except ValueError as exc:
                 flash(str(exc), "danger")
                 return render_template("gifts/gift_form.html", form=form, gift=gift)
-        if not image_uploaded and not gift.image_url and not gift.image_path and gift.url:
-            inferred = infer_image_url(gift.url)
-            if inferred:
-                gift.image_url = inferred
+        if not image_uploaded and needs_image_inference(gift):
+            queue_image_inference(gift)
+        elif image_url_changed and needs_proxy_warmup(gift):
+            queue_proxy_warmup(gift)
         db.session.commit()
         flash("Gift updated", "success")
         return redirect(url_for("gifts.my_gifts"))
@@ -109,10 +160,85 @@ def delete_gift(gift_id: int):
     return redirect(url_for("gifts.my_gifts"))
 
 
+_EXPORTS = {
+    "csv": (export_gifts_csv, "text/csv; charset=utf-8"),
+    "json": (export_gifts_json, "application/json"),
+}
+
+
+@gifts_bp.route("/me/gifts/export.<fmt>")
+@login_required
+def export_gifts(fmt: str):
+    if fmt not in _EXPORTS:
+        abort(404)
+    export, mimetype = _EXPORTS[fmt]
+    response = Response(stream_with_context(export(current_user.id)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{current_user.username}-gifts.{fmt}"'
+    return response
+
+
+@gifts_bp.route("/me/gifts/import", methods=["GET", "POST"])
+@login_required
+def import_gifts_view():
+    form = GiftImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            result = import_gifts(current_user.id, upload.stream, import_format(upload.filename or ""))
+        except ValueError as exc:
+            flash(str(exc), "danger")
+            return render_template("gifts/import.html", form=form)
+        flash(f"Imported {result.imported} gift(s)", "success")
+        if result.errors:
+            shown = "; ".join(f"row {number}: {message}" for number, message in result.errors[:5])
+            more = f" (and {len(result.errors) - 5} more)" if len(result.errors) > 5 else ""
+            flash(f"Skipped {len(result.errors)} row(s): {shown}{more}", "warning")
+        return redirect(url_for("gifts.my_gifts"))
+    return render_template("gifts/import.html", form=form)
+
+
 @gifts_bp.route("/uploads/<path:filename>")
 def uploaded_file(filename: str):
     upload_folder = Path(current_app.config["UPLOAD_FOLDER"]).resolve()
-    return send_from_directory(upload_folder, filename)
+    return send_immutable_file(upload_folder, filename)
+
+
+@gifts_bp.route("/images/<int:width>/<fmt>/<path:filename>")
+def image_variant(width: int, fmt: str, filename: str):
+    try:
+        relative = ensure_derivative(filename, width, fmt)
+    except (FileNotFoundError, ValueError):
+        abort(404)
+    except OSError:
+        current_app.logger.warning("Could not render %s at %spx as %s", filename, width, fmt, exc_info=True)
+        abort(404)
+    return send_immutable_file(Path(current_app.config["UPLOAD_FOLDER"]).resolve(), relative)
+
+
+@gifts_bp.route("/images/proxy/<sig>")
+def image_proxy(sig: str):
+    url = request.args.get("url", "")
+    if not is_proxyable(url) or not verify_signature(url, sig):
+        abort(404)
+    relative = fetch_proxied_image(url)
+    if relative is None:
+        abort(404)
+    return send_immutable_file(
+        Path(current_app.config["UPLOAD_FOLDER"]).resolve(),
+        relative,
+        max_age=current_app.config.get("IMAGE_PROXY_MAX_AGE", 24 * 3600),
+        immutable=False,
+    )
+
+
+@gifts_bp.app_template_global()
+def gift_image_proxy_url(url: str) -> str:
+    return proxied_image_url(url) if is_proxyable(url) else url
+
+
+@gifts_bp.app_template_global()
+def gift_image_srcset(source: str, fmt: str = "jpeg") -> str:
+    return image_srcset(source, fmt)
 
 
 @gifts_bp.route("/images/fetch", methods=["POST"])
@@ -126,4 +252,8 @@ def image_fetcher():
         path = fetch_image(url)
     except ValueError as exc:
         return {"error": str(exc)}, 400
+    except HostBusy as exc:
+        return {"error": str(exc)}, 503
+    except requests.RequestException:
+        return {"error": "The image could not be downloaded"}, 502
     return {"path": path}, 200
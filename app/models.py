@@ -1,42 +1,103 @@
 from __future__ import annotations
 
+import re
 from datetime import datetime
 from typing import Optional
 
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
 
 from .extensions import db, login_manager
 
 
 class User(UserMixin, db.Model):
     __tablename__ = "users"
+    __table_args__ = (db.UniqueConstraint("slug", name="uq_users_slug"),)
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
+    slug = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(120), nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    # Part of the session id: bumping it signs out every existing session.
+    session_version = db.column_property(
+        db.Column(db.Integer, nullable=False, default=1, server_default="1"), active_history=True
+    )
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     gifts = db.relationship("Gift", back_populates="owner", cascade="all, delete-orphan")
     purchases = db.relationship("Purchase", back_populates="buyer", cascade="all, delete-orphan")
+    # Maintained by listeners in ``services.gift_stats``; never written through the ORM.
+    gift_stats = db.relationship("UserGiftStats", uselist=False, viewonly=True)
 
     def __repr__(self) -> str:  # pragma: no cover - debug helper
         return f"<User {self.email}>"
 
     @property
     def username(self) -> str:
-        return self.email.split("@")[0]
+        return self.slug or slug_base(self.email)
+
+    def get_id(self) -> str:
+        return f"{self.id}:{self.session_version or 1}"
 
     def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
+        from .services.passwords import hash_password
+
+        if self.password_hash:
+            self.session_version = (self.session_version or 1) + 1
+        self.password_hash = hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        from .services.passwords import get_password_hasher
+
+        return get_password_hasher().verify(self.password_hash, password)
+
+
+_SLUG_INVALID_RE = re.compile(r"[^a-z0-9._-]+")
+
+
+def slug_base(email: str) -> str:
+    """Derive the URL-safe username stem from the local part of ``email``."""
+    local_part = (email or "").split("@")[0].lower()
+    return _SLUG_INVALID_RE.sub("-", local_part).strip("-.") or "user"
+
+
+def unique_slug(connection, base: str, reserved: frozenset[str] = frozenset()) -> str:
+    """Return ``base`` or the first free ``base-N`` not present in the users table."""
+    escaped = base.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    taken = set(
+        connection.scalars(
+            select(User.slug).where((User.slug == base) | User.slug.like(f"{escaped}-%", escape="\\"))
+        )
+    )
+    taken |= reserved
+    if base not in taken:
+        return base
+    suffix = 2
+    while f"{base}-{suffix}" in taken:
+        suffix += 1
+    return f"{base}-{suffix}"
+
+
+@event.listens_for(User, "before_insert")
+def _assign_user_slug(mapper, connection, target: User) -> None:
+    if target.slug:
+        return
+    session = object_session(target)
+    pending = frozenset(
+        other.slug for other in (session.new if session else ()) if isinstance(other, User) and other.slug
+    )
+    target.slug = unique_slug(connection, slug_base(target.email), pending)
 
 
 class Gift(db.Model):
     __tablename__ = "gifts"
+    __table_args__ = (
+        db.Index("ix_gifts_owner_created", "owner_id", "created_at", "id"),
+        # Lets the upload collector ask "is this file still referenced?" per batch.
+        db.Index("ix_gifts_image_path", "image_path"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
@@ -44,8 +105,11 @@ class Gift(db.Model):
     description = db.Column(db.Text)
     url = db.Column(db.String(512))
     image_url = db.Column(db.String(512))
-    image_path = db.Column(db.String(512))
-    price = db.Column(db.Numeric(10, 2))
+    # Active history so replacing an image on an expired instance still
+    # reports the old path to the reference-count listeners.
+    image_path = db.column_property(db.Column(db.String(512)), active_history=True)
+    # Active history so the per-user price total can subtract the old value.
+    price = db.column_property(db.Column(db.Numeric(10, 2)), active_history=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -66,7 +130,10 @@ class Gift(db.Model):
 
 class Purchase(db.Model):
     __tablename__ = "purchases"
-    __table_args__ = (db.UniqueConstraint("gift_id", name="uq_purchases_gift"),)
+    __table_args__ = (
+        db.UniqueConstraint("gift_id", name="uq_purchases_gift"),
+        db.Index("ix_purchases_buyer_purchased", "buyer_id", "purchased_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     gift_id = db.Column(db.Integer, db.ForeignKey("gifts.id"), nullable=False, index=True)
@@ -80,6 +147,81 @@ class Purchase(db.Model):
         return f"<Purchase gift={self.gift_id} buyer={self.buyer_id}>"
 
 
+class UserGiftStats(db.Model):
+    """Per-user gift totals for the directory and dashboard, one row per user."""
+
+    __tablename__ = "user_gift_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    gift_count = db.Column(db.Integer, nullable=False, default=0)
+    purchased_count = db.Column(db.Integer, nullable=False, default=0)
+    total_price = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<UserGiftStats user={self.user_id} gifts={self.gift_count}>"
+
+
+class StoredFile(db.Model):
+    """Reference count for one file in upload storage, keyed by its relative path."""
+
+    __tablename__ = "stored_files"
+
+    path = db.Column(db.String(512), primary_key=True)
+    size = db.Column(db.BigInteger)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<StoredFile {self.path} refs={self.ref_count}>"
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    __table_args__ = (db.Index("ix_jobs_status_run_at", "status", "run_at"),)
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+
+class ImageInferenceCache(db.Model):
+    """Shared record of which image a product page advertises (or that it has none)."""
+
+    __tablename__ = "image_inference_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    url_key = db.Column(db.String(64), unique=True, nullable=False)
+    page_url = db.Column(db.String(2048), nullable=False)
+    image_url = db.Column(db.String(512))
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<ImageInferenceCache {self.page_url} -> {self.image_url}>"
+
+
 @login_manager.user_loader
 def load_user(user_id: str) -> Optional[User]:
-    return User.query.get(int(user_id))
+    from .services.identity import load_cached_user
+
+    return load_cached_user(user_id)
@@ -1,47 +1,99 @@
 from __future__ import annotations
 
-from flask import Blueprint, flash, redirect, render_template, request, url_for
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select
 
 from ..extensions import db
-from ..models import Gift, Purchase
+from ..models import Gift, Purchase, User
+from ..services.list_versions import purchases_version
+from ..services.purchases import (
+    ALREADY_YOURS,
+    CLAIMED,
+    NOT_FOUND,
+    OWN_GIFT,
+    TAKEN,
+    claim_gifts,
+    gift_owner_username,
+)
+from ..utils.conditional import not_modified, page_etag, with_etag
+from ..utils.pagination import KeysetPage, keyset_paginate
 
 
 purchases_bp = Blueprint("purchases", __name__, url_prefix="", template_folder="../templates/purchases")
 
 
+def _purchase_rows(buyer_id: int, cursor: str | None, per_page: int) -> KeysetPage:
+    """Return one keyset page of flat purchase rows for ``buyer_id``.
+
+    Everything the "Purchased by Me" template shows comes from a single joined
+    SELECT, so no ORM objects (and no lazy owner loads) are involved.
+    """
+    stmt = (
+        select(
+            Purchase.id,
+            Purchase.purchased_at,
+            Gift.title.label("gift_title"),
+            Gift.url.label("gift_url"),
+            User.name.label("owner_name"),
+            User.email.label("owner_email"),
+        )
+        .join(Gift, Gift.id == Purchase.gift_id)
+        .join(User, User.id == Gift.owner_id)
+        .where(Purchase.buyer_id == buyer_id)
+    )
+    return keyset_paginate(
+        stmt, Purchase.purchased_at, Purchase.id, cursor=cursor, per_page=per_page, descending=True, scalars=False
+    )
+
+
 @purchases_bp.route("/me/purchases")
 @login_required
 def my_purchases():
-    purchases = (
-        Purchase.query.filter_by(buyer_id=current_user.id)
-        .join(Gift)
-        .order_by(Purchase.purchased_at.desc())
-        .all()
-    )
-    return render_template("purchases/my_purchases.html", purchases=purchases)
+    cursor = request.args.get("cursor")
+    etag = page_etag("purchases.my_purchases", cursor, purchases_version(current_user.id))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    per_page = current_app.config.get("PURCHASES_PER_PAGE", 50)
+    page = _purchase_rows(current_user.id, cursor, per_page)
+    return with_etag(render_template("purchases/my_purchases.html", purchases=page.items, page=page), etag)
+
+
+_CLAIM_MESSAGES = {
+    CLAIMED: ("Gift marked as purchased!", "success"),
+    ALREADY_YOURS: ("You already purchased this gift", "info"),
+    TAKEN: ("This gift has already been purchased", "warning"),
+    OWN_GIFT: ("You cannot purchase your own gift", "warning"),
+}
 
 
 @purchases_bp.route("/gifts/<int:gift_id>/purchase", methods=["POST"])
 @login_required
 def purchase_gift(gift_id: int):
-    gift = Gift.query.get_or_404(gift_id)
-    if gift.owner_id == current_user.id:
-        flash("You cannot purchase your own gift", "warning")
-        return redirect(request.referrer or url_for("users.user_gifts", username=gift.owner.username))
-    if gift.purchase and gift.purchase.buyer_id == current_user.id:
-        flash("You already purchased this gift", "info")
-        return redirect(request.referrer or url_for("users.user_gifts", username=gift.owner.username))
-    purchase = Purchase(gift=gift, buyer=current_user)
-    db.session.add(purchase)
-    try:
-        db.session.commit()
-        flash("Gift marked as purchased!", "success")
-    except IntegrityError:
-        db.session.rollback()
-        flash("This gift has already been purchased", "warning")
-    return redirect(request.referrer or url_for("users.user_gifts", username=gift.owner.username))
+    status = claim_gifts(current_user.id, [gift_id])[gift_id]
+    if status == NOT_FOUND:
+        abort(404)
+    flash(*_CLAIM_MESSAGES[status])
+    return redirect(request.referrer or url_for("users.user_gifts", username=gift_owner_username(gift_id)))
+
+
+@purchases_bp.route("/purchases/claim", methods=["POST"])
+@login_required
+def claim_purchases():
+    data = request.get_json(silent=True) or {}
+    gift_ids = data.get("gift_ids")
+    # ``type() is int``: JSON ``true`` decodes to a bool, which isinstance would let through as gift 1.
+    if not isinstance(gift_ids, list) or not all(type(gift_id) is int for gift_id in gift_ids):
+        return {"error": "gift_ids must be a list of gift ids"}, 400
+    limit = current_app.config.get("PURCHASE_CLAIM_MAX_GIFTS", 100)
+    if len(gift_ids) > limit:
+        return {"error": f"At most {limit} gifts can be claimed at once"}, 400
+    results = claim_gifts(current_user.id, gift_ids)
+    return {
+        "results": [{"gift_id": gift_id, "status": status} for gift_id, status in results.items()],
+        "claimed": sum(1 for status in results.values() if status == CLAIMED),
+    }
 
 
 @purchases_bp.route("/gifts/<int:gift_id>/unpurchase", methods=["POST"])
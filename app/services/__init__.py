@@ -1,3 +1,35 @@
+from .gift_lists import invalidate_gift_list, user_gift_list
+from .gift_stats import rebuild_gift_stats
+from .gift_transfer import export_gifts_csv, export_gifts_json, import_gifts
+from .identity import identity_cache_stats, load_cached_user
+from .jobs import enqueue, job_handler, run_pending_jobs
+from .passwords import hash_password, verify_password
+from .purchases import claim_gifts
+from .search import install_search_schema, search_users, typeahead_users
 from .seed import seed_demo_data
+from .uploads import collect_orphaned_uploads, migrate_legacy_uploads
+from .usernames import resolve_username
 
-__all__ = ["seed_demo_data"]
+__all__ = [
+    "claim_gifts",
+    "collect_orphaned_uploads",
+    "enqueue",
+    "export_gifts_csv",
+    "export_gifts_json",
+    "hash_password",
+    "identity_cache_stats",
+    "import_gifts",
+    "install_search_schema",
+    "invalidate_gift_list",
+    "job_handler",
+    "load_cached_user",
+    "migrate_legacy_uploads",
+    "rebuild_gift_stats",
+    "resolve_username",
+    "run_pending_jobs",
+    "search_users",
+    "seed_demo_data",
+    "typeahead_users",
+    "user_gift_list",
+    "verify_password",
+]
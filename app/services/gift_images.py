@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+import requests
+
+from ..extensions import db
+from ..models import Gift
+from ..utils.http import BlockedAddress
+from ..utils.image_proxy import get_proxy_cache, is_proxyable
+from .image_inference import cached_infer_image_url
+from .jobs import PermanentJobError, enqueue, job_handler
+
+INFER_GIFT_IMAGE = "gift.infer_image"
+WARM_PROXY_IMAGE = "gift.warm_proxy_image"
+
+
+def needs_image_inference(gift: Gift) -> bool:
+    return bool(gift.url) and not gift.image_url and not gift.image_path
+
+
+def queue_image_inference(gift: Gift) -> None:
+    """Schedule image inference for ``gift``; the gift must already have an id."""
+
+    enqueue(INFER_GIFT_IMAGE, {"gift_id": gift.id, "url": gift.url})
+
+
+@job_handler(INFER_GIFT_IMAGE)
+def infer_gift_image(payload: Dict[str, Any]) -> None:
+    gift = db.session.get(Gift, payload["gift_id"])
+    # The owner may have deleted the gift, picked an image or changed the link
+    # while the job waited; a newer job covers the new link.
+    if gift is None or not needs_image_inference(gift) or gift.url != payload.get("url"):
+        return
+    try:
+        inferred = cached_infer_image_url(gift.url)
+    except BlockedAddress as exc:
+        raise PermanentJobError(str(exc)) from exc
+    except requests.HTTPError as exc:
+        status = exc.response.status_code if exc.response is not None else None
+        if status is not None and 400 <= status < 500 and status != 429:
+            raise PermanentJobError(f"{gift.url} answered {status}") from exc
+        raise
+    if inferred:
+        gift.image_url = inferred
+        if needs_proxy_warmup(gift):
+            queue_proxy_warmup(gift)
+        db.session.commit()
+
+
+def needs_proxy_warmup(gift: Gift) -> bool:
+    return not gift.image_path and is_proxyable(gift.image_url)
+
+
+def queue_proxy_warmup(gift: Gift) -> None:
+    """Download ``gift``'s remote image into the proxy cache before anyone views it."""
+
+    enqueue(WARM_PROXY_IMAGE, {"url": gift.image_url})
+
+
+@job_handler(WARM_PROXY_IMAGE)
+def warm_proxy_image(payload: Dict[str, Any]) -> None:
+    # The proxy view still downloads on a miss, but after this job it rarely
+    # has to do so inside a page view.
+    try:
+        get_proxy_cache().fetch(payload["url"])
+    except ValueError as exc:
+        # Not an image, too large, or a non-public address: retrying won't help.
+        raise PermanentJobError(str(exc)) from exc
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload, object_session, raiseload
+
+from ..models import Gift, Purchase, User
+from ..utils.cache import LRUCache, app_cache, shared_stamp_changed, touch_shared_stamp
+from ..utils.pagination import KeysetPage, keyset_paginate
+from .usernames import resolve_username, slug_cache
+
+OWNER_VIEW = "owner"
+GUEST_VIEW = "guest"
+
+# Generations only ever move forward, including ones handed out after an
+# eviction, so a snapshot stored under an old generation can never match again.
+_generations = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class ListOwner:
+    id: int
+    name: str
+    username: str
+
+
+@dataclass(frozen=True)
+class PurchaseMark:
+    buyer_id: int
+
+
+@dataclass(frozen=True)
+class GiftCard:
+    """What a gift card on a list page shows; ``purchase`` is only ever set for guest views."""
+
+    id: int
+    title: str
+    description: Optional[str]
+    url: Optional[str]
+    image_url: Optional[str]
+    image_path: Optional[str]
+    price: Optional[Decimal]
+    notes: Optional[str]
+    created_at: datetime
+    purchase: Optional[PurchaseMark] = None
+
+
+@dataclass(frozen=True)
+class GiftListSnapshot:
+    owner: ListOwner
+    page: KeysetPage
+    # Digest of everything above; equal data gives an equal version in every worker.
+    version: str
+
+
+def _snapshot_cache() -> LRUCache:
+    config = current_app.config
+    return app_cache(
+        "gift_list_snapshots",
+        maxsize=config.get("GIFT_LIST_CACHE_SIZE", 1024),
+        ttl=config.get("GIFT_LIST_CACHE_TTL_SECONDS", 60),
+    )
+
+
+def _generation_cache() -> LRUCache:
+    return app_cache("gift_list_generations", maxsize=current_app.config.get("GIFT_LIST_CACHE_SIZE", 1024) * 4)
+
+
+def _generation(owner_id: int) -> int:
+    generations = _generation_cache()
+    generation = generations.get(owner_id)
+    if generation is None:
+        generation = next(_generations)
+        generations.set(owner_id, generation)
+    return generation
+
+
+def _bump_generations(owner_ids: Iterable[Optional[int]]) -> List[int]:
+    owner_ids = [owner_id for owner_id in owner_ids if owner_id is not None]
+    if owner_ids and has_app_context():
+        generations = _generation_cache()
+        for owner_id in owner_ids:
+            generations.set(owner_id, next(_generations))
+    return owner_ids
+
+
+def invalidate_gift_list(*owner_ids: Optional[int]) -> None:
+    """Drop the cached lists of ``owner_ids``; call once the change is committed.
+
+    Generations live per worker, so the other workers are told through the
+    ``GIFT_LIST_INVALIDATION_PATH`` file and drop their snapshots on their
+    next lookup.
+    """
+
+    if _bump_generations(owner_ids) and has_app_context():
+        touch_shared_stamp(current_app.config.get("GIFT_LIST_INVALIDATION_PATH"))
+
+
+def _cards(page: KeysetPage, view: str) -> List[GiftCard]:
+    cards = []
+    for gift in page.items:
+        purchase = None
+        if view == GUEST_VIEW and gift.purchase is not None:
+            purchase = PurchaseMark(buyer_id=gift.purchase.buyer_id)
+        cards.append(
+            GiftCard(
+                id=gift.id,
+                title=gift.title,
+                description=gift.description,
+                url=gift.url,
+                image_url=gift.image_url,
+                image_path=gift.image_path,
+                price=gift.price,
+                notes=gift.notes,
+                created_at=gift.created_at,
+                purchase=purchase,
+            )
+        )
+    return cards
+
+
+def _load(owner: User, view: str, cursor: Optional[str]) -> GiftListSnapshot:
+    stmt = select(Gift).where(Gift.owner_id == owner.id)
+    if view == OWNER_VIEW:
+        # Owners never see purchase state: it is not even loaded for them.
+        stmt = stmt.options(raiseload(Gift.purchase))
+    else:
+        # The template only reads ``purchase.buyer_id``; one LEFT OUTER JOIN
+        # replaces the per-card lazy load and the buyer row is never needed.
+        stmt = stmt.options(joinedload(Gift.purchase).raiseload(Purchase.buyer))
+    page = keyset_paginate(
+        stmt,
+        Gift.created_at,
+        Gift.id,
+        cursor=cursor,
+        per_page=current_app.config.get("GIFTS_PER_PAGE", 48),
+        descending=False,
+    )
+    cards = _cards(page, view)
+    list_owner = ListOwner(id=owner.id, name=owner.name, username=owner.username)
+    version = hashlib.sha256(repr((view, list_owner, cards, page.next_cursor)).encode("utf-8")).hexdigest()
+    return GiftListSnapshot(
+        owner=list_owner,
+        page=KeysetPage(items=cards, next_cursor=page.next_cursor, cursor=page.cursor),
+        version=version,
+    )
+
+
+def user_gift_list(username: str, viewer_id: Optional[int], cursor: Optional[str]) -> Optional[GiftListSnapshot]:
+    """Return one page of ``username``'s gift list as seen by ``viewer_id``.
+
+    Snapshots are plain data cached per ``(owner, generation, viewer class,
+    cursor)``; the viewer class is either the owner (no purchase state at
+    all) or everyone else, so personal bits such as "purchased by you" are
+    derived from the shared snapshot at render time. Any write to the owner's
+    gifts, their purchases or the owner row moves the owner's generation on,
+    and a repeat view whose slug is cached touches no database at all.
+    """
+
+    slug = username.lower()
+    owner_id = slug_cache().get(slug)
+    owner: Optional[User] = None
+    if owner_id is None:
+        owner = resolve_username(username)
+        if owner is None:
+            return None
+        owner_id = owner.id
+    view = OWNER_VIEW if viewer_id == owner_id else GUEST_VIEW
+    cache = _snapshot_cache()
+    if shared_stamp_changed("gift_lists", current_app.config.get("GIFT_LIST_INVALIDATION_PATH")):
+        cache.clear()
+    # Read the generation before the data so a write that lands in between
+    # files our snapshot under a generation that is already stale.
+    key: Tuple = (owner_id, _generation(owner_id), view, cursor or "")
+    snapshot = cache.get(key)
+    if snapshot is not None and snapshot.owner.username == slug:
+        return snapshot
+    if owner is None:
+        owner = resolve_username(username)
+        if owner is None or owner.id != owner_id:
+            return None
+    snapshot = _load(owner, view, cursor)
+    cache.set(key, snapshot)
+    return snapshot
+
+
+# Writes are collected per session and the owners' generations move on both
+# at flush (this worker stops serving the old data at once) and at commit (a
+# read that raced the open transaction cannot keep stale data cached). Other
+# workers are only told at commit, once they can read the new rows.
+def _mark(session: Optional[Session], owner_ids: Iterable[Optional[int]]) -> None:
+    owner_ids = _bump_generations(owner_ids)
+    if session is not None:
+        session.info.setdefault("gift_list_owners", set()).update(owner_ids)
+
+
+def _gift_owner(connection, gift_id: Optional[int]) -> Optional[int]:
+    if gift_id is None:
+        return None
+    return connection.scalar(select(Gift.owner_id).where(Gift.id == gift_id))
+
+
+@event.listens_for(Gift, "after_insert")
+@event.listens_for(Gift, "after_update")
+@event.listens_for(Gift, "after_delete")
+def _gift_changed(mapper, connection, target: Gift) -> None:
+    _mark(object_session(target), [target.owner_id])
+
+
+@event.listens_for(Purchase, "after_insert")
+@event.listens_for(Purchase, "after_update")
+@event.listens_for(Purchase, "after_delete")
+def _purchase_changed(mapper, connection, target: Purchase) -> None:
+    _mark(object_session(target), [_gift_owner(connection, target.gift_id)])
+
+
+@event.listens_for(User, "after_update")
+def _owner_changed(mapper, connection, target: User) -> None:
+    _mark(object_session(target), [target.id])
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    owner_ids = session.info.pop("gift_list_owners", None)
+    if owner_ids:
+        invalidate_gift_list(*owner_ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop("gift_list_owners", None)
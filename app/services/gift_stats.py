@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.engine import Connection
+
+from ..extensions import db
+from ..models import Gift, Purchase, User, UserGiftStats
+from ..utils.sql import upsert_insert
+
+
+_STATS_COLUMNS = ["user_id", "gift_count", "purchased_count", "total_price", "updated_at"]
+
+
+def _price(value) -> Decimal:
+    return Decimal(str(value)) if value is not None else Decimal("0")
+
+
+def adjust_gift_stats(
+    connection: Connection, user_id: Optional[int], gifts: int = 0, purchased: int = 0, total: Decimal = Decimal("0")
+) -> None:
+    """Move ``user_id``'s counters by the given deltas.
+
+    The mapper listeners below call this for ORM writes; bulk inserts, which
+    bypass those listeners, must call it themselves in the same transaction.
+    """
+
+    if user_id is None or not (gifts or purchased or total):
+        return
+    if _bump(connection, user_id, gifts, purchased, total):
+        return
+    # Users created before the table existed and never rebuilt: start them
+    # from their real totals rather than from this one change. A concurrent
+    # writer may seed the row first; then ours is a no-op and the delta is
+    # applied on top of theirs, which never saw this transaction's writes.
+    seed = (
+        upsert_insert(connection, UserGiftStats)
+        .from_select(_STATS_COLUMNS, _stats_select(user_id))
+        .on_conflict_do_nothing(index_elements=[UserGiftStats.user_id])
+    )
+    if connection.execute(seed).rowcount == 0:
+        _bump(connection, user_id, gifts, purchased, total)
+
+
+def _bump(connection: Connection, user_id: int, gifts: int, purchased: int, total: Decimal) -> bool:
+    result = connection.execute(
+        update(UserGiftStats)
+        .where(UserGiftStats.user_id == user_id)
+        .values(
+            gift_count=UserGiftStats.gift_count + gifts,
+            purchased_count=UserGiftStats.purchased_count + purchased,
+            total_price=UserGiftStats.total_price + total,
+            updated_at=datetime.utcnow(),
+        )
+    )
+    return result.rowcount > 0
+
+
+def _gift_owner(connection: Connection, gift_id: Optional[int]) -> Optional[int]:
+    if gift_id is None:
+        return None
+    return connection.scalar(select(Gift.owner_id).where(Gift.id == gift_id))
+
+
+def _stats_select(user_id: Optional[int] = None):
+    # Purchases are unique per gift, so the second join never multiplies rows.
+    stmt = (
+        select(
+            User.id,
+            func.count(Gift.id),
+            func.count(Purchase.id),
+            func.coalesce(func.sum(Gift.price), 0),
+            func.current_timestamp(),
+        )
+        .select_from(User)
+        .outerjoin(Gift, Gift.owner_id == User.id)
+        .outerjoin(Purchase, Purchase.gift_id == Gift.id)
+        .group_by(User.id)
+    )
+    if user_id is not None:
+        stmt = stmt.where(User.id == user_id)
+    return stmt
+
+
+# The counters move inside the flush that writes the gift or purchase, so they
+# commit or roll back together with it. Purchases are cascaded away before
+# their gift is deleted, so the gift row is still there to name the owner.
+@event.listens_for(User, "after_insert")
+def _create_user_stats(mapper, connection, target: User) -> None:
+    connection.execute(insert(UserGiftStats).values(user_id=target.id, updated_at=datetime.utcnow()))
+
+
+@event.listens_for(User, "after_delete")
+def _delete_user_stats(mapper, connection, target: User) -> None:
+    connection.execute(delete(UserGiftStats).where(UserGiftStats.user_id == target.id))
+
+
+@event.listens_for(Gift, "after_insert")
+def _count_new_gift(mapper, connection, target: Gift) -> None:
+    adjust_gift_stats(connection, target.owner_id, gifts=1, total=_price(target.price))
+
+
+@event.listens_for(Gift, "after_update")
+def _count_changed_gift(mapper, connection, target: Gift) -> None:
+    state = inspect(target)
+    owner = state.attrs.owner_id.history
+    price = state.attrs.price.history
+    old_price = _price(price.deleted[0] if price.deleted else target.price)
+    new_price = _price(target.price)
+    old_owner = owner.deleted[0] if owner.deleted else target.owner_id
+    if old_owner == target.owner_id:
+        adjust_gift_stats(connection, target.owner_id, total=new_price - old_price)
+        return
+    purchased = 1 if connection.scalar(select(Purchase.id).where(Purchase.gift_id == target.id)) else 0
+    adjust_gift_stats(connection, old_owner, gifts=-1, purchased=-purchased, total=-old_price)
+    adjust_gift_stats(connection, target.owner_id, gifts=1, purchased=purchased, total=new_price)
+
+
+@event.listens_for(Gift, "after_delete")
+def _count_deleted_gift(mapper, connection, target: Gift) -> None:
+    adjust_gift_stats(connection, target.owner_id, gifts=-1, total=-_price(target.price))
+
+
+@event.listens_for(Purchase, "after_insert")
+def _count_new_purchase(mapper, connection, target: Purchase) -> None:
+    adjust_gift_stats(connection, _gift_owner(connection, target.gift_id), purchased=1)
+
+
+@event.listens_for(Purchase, "after_delete")
+def _count_deleted_purchase(mapper, connection, target: Purchase) -> None:
+    adjust_gift_stats(connection, _gift_owner(connection, target.gift_id), purchased=-1)
+
+
+def rebuild_gift_stats() -> int:
+    """Recompute every user's gift totals from the gifts and purchases tables.
+
+    Runs as one transaction, so readers see either the old or the new
+    numbers. Returns the number of users written.
+    """
+
+    db.session.execute(delete(UserGiftStats))
+    db.session.execute(insert(UserGiftStats).from_select(_STATS_COLUMNS, _stats_select()))
+    db.session.commit()
+    return db.session.scalar(select(func.count()).select_from(UserGiftStats))
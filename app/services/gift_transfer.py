@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import insert, select
+from werkzeug.datastructures import MultiDict
+
+from ..extensions import db
+from ..models import Gift
+from .gift_images import INFER_GIFT_IMAGE
+from .gift_lists import invalidate_gift_list
+from .gift_stats import adjust_gift_stats
+from .jobs import enqueue_many
+
+GIFT_FIELDS = ("title", "description", "url", "image_url", "price", "notes")
+IMPORT_FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "json", ".ndjson": "json"}
+_READ_SIZE = 64 * 1024
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    queued: int = 0
+    # ``(row number, message)`` for rows that were skipped.
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+def import_format(filename: str) -> Optional[str]:
+    """Map an upload's file name to ``"csv"``/``"json"``, or ``None`` when unsupported."""
+
+    suffix = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return IMPORT_FORMATS.get(suffix)
+
+
+def _export_rows(owner_id: int) -> Iterator[Dict[str, Any]]:
+    columns = [getattr(Gift, name) for name in GIFT_FIELDS]
+    stmt = (
+        select(*columns)
+        .where(Gift.owner_id == owner_id)
+        .order_by(Gift.created_at, Gift.id)
+        .execution_options(yield_per=500)
+    )
+    for row in db.session.execute(stmt):
+        yield row._asdict()
+
+
+def export_gifts_csv(owner_id: int) -> Iterator[str]:
+    """Yield ``owner_id``'s gifts as CSV text, a chunk of rows at a time."""
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=GIFT_FIELDS)
+    writer.writeheader()
+    for count, row in enumerate(_export_rows(owner_id), start=1):
+        writer.writerow(row)
+        if count % 200 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_gifts_json(owner_id: int) -> Iterator[str]:
+    """Yield ``owner_id``'s gifts as one JSON array, one object per chunk."""
+
+    yield "["
+    separator = "\n"
+    for row in _export_rows(owner_id):
+        if row["price"] is not None:
+            row["price"] = str(row["price"])
+        yield separator + json.dumps(row)
+        separator = ",\n"
+    yield "\n]\n"
+
+
+def _iter_json(stream: IO[bytes]) -> Iterator[Any]:
+    # Accepts a top-level array or JSON Lines. Objects are decoded as soon as
+    # they are complete, so memory is bounded by the largest single object.
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    eof = False
+    while True:
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                position += 1
+            if position == len(buffer):
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("The file is not valid JSON") from None
+                break
+            yield item
+            position = end
+        buffer = buffer[position:]
+        if eof:
+            return
+        chunk = stream.read(_READ_SIZE)
+        eof = not chunk
+        buffer += text.decode(chunk or b"", final=eof)
+
+
+def _iter_csv(stream: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        yield {(key or "").strip().lower(): value for key, value in row.items()}
+
+
+def parse_gift_rows(stream: IO[bytes], fmt: str) -> Iterator[Any]:
+    """Yield raw rows from a CSV or JSON upload without reading it all first."""
+
+    if fmt == "csv":
+        return _iter_csv(stream)
+    if fmt == "json":
+        return _iter_json(stream)
+    raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _validate(row: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    # Imported here: the gifts package imports this module through its routes.
+    from ..gifts.forms import GiftForm
+
+    if not isinstance(row, dict):
+        return None, "expected an object with gift fields"
+    data = MultiDict({name: str(row[name]) for name in GIFT_FIELDS if row.get(name) not in (None, "")})
+    form = GiftForm(formdata=data, meta={"csrf": False})
+    if not form.validate():
+        messages = [f"{name}: {', '.join(errors)}" for name, errors in form.errors.items()]
+        return None, "; ".join(messages)
+    return {
+        "title": form.title.data,
+        "description": form.description.data or None,
+        "url": form.url.data or None,
+        "image_url": form.image_url.data or None,
+        "price": Decimal(str(form.price.data)) if form.price.data is not None else None,
+        "notes": form.notes.data or None,
+    }, None
+
+
+def _insert_batch(owner_id: int, rows: List[Dict[str, Any]], result: ImportResult) -> None:
+    for row in rows:
+        row["owner_id"] = owner_id
+    # One executemany INSERT; ORM bulk inserts skip the mapper listeners, so
+    # the stats row is moved here and the list cache is dropped after commit.
+    # Nothing is committed here: the whole file lands in one transaction.
+    inserted = db.session.execute(insert(Gift).returning(Gift.id, Gift.url, Gift.image_url), rows).all()
+    adjust_gift_stats(
+        db.session.connection(),
+        owner_id,
+        gifts=len(rows),
+        total=sum((row["price"] or Decimal("0") for row in rows), Decimal("0")),
+    )
+    lookups = [{"gift_id": gift_id, "url": url} for gift_id, url, image_url in inserted if url and not image_url]
+    result.queued += enqueue_many(INFER_GIFT_IMAGE, lookups)
+    result.imported += len(rows)
+
+
+def import_gifts(owner_id: int, stream: IO[bytes], fmt: str) -> ImportResult:
+    """Add the valid rows of a CSV/JSON upload to ``owner_id``'s list.
+
+    Rows are validated with the ``GiftForm`` rules and invalid ones are
+    reported and skipped. Valid rows are inserted in ``GIFTS_IMPORT_BATCH_SIZE``
+    chunks together with their image-inference jobs, so inference runs in the
+    background instead of once per row, and the file is committed as a whole.
+    Raises ``ValueError`` for an unreadable file or one over
+    ``GIFTS_IMPORT_MAX_ROWS`` rows, after rolling back every chunk: a failed
+    import never leaves part of the file behind to be duplicated by a retry.
+    """
+
+    config = current_app.config
+    batch_size = config.get("GIFTS_IMPORT_BATCH_SIZE", 500)
+    max_rows = config.get("GIFTS_IMPORT_MAX_ROWS", 5000)
+    result = ImportResult()
+    batch: List[Dict[str, Any]] = []
+    try:
+        for number, row in enumerate(parse_gift_rows(stream, fmt), start=1):
+            if number > max_rows:
+                raise ValueError(f"Imports are limited to {max_rows} rows")
+            values, error = _validate(row)
+            if error:
+                result.errors.append((number, error))
+                continue
+            batch.append(values)
+            if len(batch) >= batch_size:
+                _insert_batch(owner_id, batch, result)
+                batch = []
+        if batch:
+            _insert_batch(owner_id, batch, result)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        db.session.rollback()
+        raise ValueError(f"The file could not be read: {exc}") from exc
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.commit()
+    if result.imported:
+        invalidate_gift_list(owner_id)
+    return result
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Set, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from ..extensions import db
+from ..models import User
+from ..utils.cache import LRUCache, app_cache, shared_stamp_changed, touch_shared_stamp
+
+
+def _identity_cache() -> LRUCache:
+    config = current_app.config
+    return app_cache(
+        "identity",
+        maxsize=config.get("IDENTITY_CACHE_SIZE", 4096),
+        ttl=config.get("IDENTITY_CACHE_TTL_SECONDS", 30),
+    )
+
+
+def parse_session_id(user_id: str) -> Optional[Tuple[int, int]]:
+    """Split a Flask-Login id of the form ``"<id>:<session_version>"``.
+
+    Sessions created before versions existed carry a bare id; they are
+    treated as version 1 so a password change still ends them.
+    """
+
+    raw_id, _, raw_version = str(user_id).partition(":")
+    try:
+        return int(raw_id), int(raw_version or 1)
+    except ValueError:
+        return None
+
+
+def load_cached_user(user_id: str) -> Optional[User]:
+    """Resolve the logged-in user for a request, skipping the database when possible.
+
+    A detached, fully loaded ``User`` is cached per ``(id, session_version)``
+    for ``IDENTITY_CACHE_TTL_SECONDS``; a hit is merged into the request's
+    session with ``load=False``, so no SELECT is issued until the view touches
+    a relationship. A session whose version no longer matches the user's
+    (after a password change) resolves to ``None`` and is logged out. Other
+    workers learn of the change through ``IDENTITY_INVALIDATION_PATH``; without
+    that file (or across hosts) they keep the old entry until its TTL runs out.
+    """
+
+    parsed = parse_session_id(user_id)
+    if parsed is None:
+        return None
+    cache = _identity_cache()
+    if shared_stamp_changed("identity", current_app.config.get("IDENTITY_INVALIDATION_PATH")):
+        cache.clear()
+    cached = cache.get(parsed)
+    if cached is not None:
+        return db.session.merge(cached, load=False)
+
+    user = db.session.get(User, parsed[0])
+    if user is None or (user.session_version or 1) != parsed[1]:
+        return None
+    snapshot = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    # Give the copy a persistent identity without a session so merge() can
+    # adopt it later without asking the database.
+    make_transient_to_detached(snapshot)
+    cache.set(parsed, snapshot)
+    return user
+
+
+def identity_cache_stats() -> Dict[str, int]:
+    return _identity_cache().stats()
+
+
+def _forget(forget: Set[Tuple[int, int]]) -> None:
+    if not forget or not has_app_context():
+        return
+    cache = _identity_cache()
+    for key in forget:
+        cache.pop(key)
+    touch_shared_stamp(current_app.config.get("IDENTITY_INVALIDATION_PATH"))
+
+
+# Changed users are only collected at flush. Dropping the cache there would
+# let a concurrent request reload the not yet committed (old) row, whose
+# session version still matches, and cache it for the full TTL; the entries
+# are dropped, and other workers told, once the change is committed.
+def _mark(target: User, *versions: Optional[int]) -> None:
+    session = object_session(target)
+    if target.id is None or session is None:
+        return
+    pending = session.info.setdefault("identity_forget", set())
+    pending.update((target.id, version or 1) for version in versions)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_update(mapper, connection, target: User) -> None:
+    history = inspect(target).attrs.session_version.history
+    _mark(target, target.session_version, *(history.deleted or ()))
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_on_delete(mapper, connection, target: User) -> None:
+    _mark(target, target.session_version)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_after_commit(session: Session) -> None:
+    _forget(session.info.pop("identity_forget", set()))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _keep_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop("identity_forget", None)
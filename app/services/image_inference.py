@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models import ImageInferenceCache
+from ..utils.cache import LRUCache, app_cache
+from ..utils.images import probe_page
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_"}
+# Pages that are gone are remembered as "no image" rather than refetched.
+_NEGATIVE_STATUSES = {404, 410}
+
+
+@dataclass(frozen=True)
+class _Entry:
+    image_url: Optional[str]
+    expires_at: datetime
+
+
+def normalize_page_url(url: str) -> str:
+    """Canonicalise a product URL so trivially different links share a cache entry.
+
+    Scheme and host are lowercased, default ports, fragments and common
+    tracking parameters are dropped, and the remaining query is sorted.
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def _url_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _lru() -> LRUCache:
+    return app_cache("image_inference", maxsize=current_app.config.get("IMAGE_INFERENCE_LRU_SIZE", 2048))
+
+
+def _lifetime(image_url: Optional[str]) -> timedelta:
+    config = current_app.config
+    if image_url:
+        return timedelta(seconds=config.get("IMAGE_INFERENCE_TTL_SECONDS", 86400))
+    return timedelta(seconds=config.get("IMAGE_INFERENCE_NEGATIVE_TTL_SECONDS", 3600))
+
+
+def cached_infer_image_url(page_url: str) -> Optional[str]:
+    """Return the image advertised by ``page_url``, consulting the shared cache first.
+
+    Lookups go in-process LRU → ``image_inference_cache`` table → network. An
+    expired row with validators is revalidated with a conditional GET, and
+    pages without an image are cached for the (shorter) negative TTL.
+    Transport errors propagate so the job queue can retry; nothing is cached
+    for them. The cache row is committed by this function.
+    """
+
+    if not page_url:
+        return None
+    normalized = normalize_page_url(page_url)
+    key = _url_key(normalized)
+    lru = _lru()
+    now = datetime.utcnow()
+
+    entry = lru.get(key)
+    if entry is not None and entry.expires_at > now:
+        return entry.image_url
+
+    row = db.session.scalar(select(ImageInferenceCache).where(ImageInferenceCache.url_key == key))
+    if row is not None and row.expires_at > now:
+        lru.set(key, _Entry(row.image_url, row.expires_at))
+        return row.image_url
+
+    try:
+        probe = probe_page(
+            page_url,
+            etag=row.etag if row is not None else None,
+            last_modified=row.last_modified if row is not None else None,
+        )
+    except requests.HTTPError as exc:
+        status = exc.response.status_code if exc.response is not None else None
+        if status not in _NEGATIVE_STATUSES:
+            raise
+        probe = None
+
+    if row is None:
+        row = ImageInferenceCache(url_key=key, page_url=normalized[:2048])
+        db.session.add(row)
+    if probe is None:
+        row.image_url = row.etag = row.last_modified = None
+    elif not probe.not_modified:
+        row.image_url = probe.image_url
+        row.etag = probe.etag
+        row.last_modified = probe.last_modified
+    row.fetched_at = now
+    row.expires_at = now + _lifetime(row.image_url)
+    image_url = row.image_url
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker inserted the same page first; its answer is as good.
+        db.session.rollback()
+    lru.set(key, _Entry(image_url, now + _lifetime(image_url)))
+    return image_url
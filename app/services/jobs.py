@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import random
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from flask import Flask, current_app
+from sqlalchemy import and_, insert, or_, select, update
+
+from ..extensions import db
+from ..models import Job
+
+JobHandler = Callable[[Dict[str, Any]], None]
+
+_HANDLERS: Dict[str, JobHandler] = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot possibly help."""
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register ``func`` as the handler for jobs of ``kind``."""
+
+    def decorator(func: JobHandler) -> JobHandler:
+        _HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(kind: str, payload: Dict[str, Any], delay: float = 0) -> Job:
+    """Add a job to the current session; it is committed with the caller's transaction."""
+
+    job = Job(
+        kind=kind,
+        payload=payload,
+        max_attempts=current_app.config.get("JOBS_MAX_ATTEMPTS", 5),
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(job)
+    return job
+
+
+def enqueue_many(kind: str, payloads: Iterable[Dict[str, Any]]) -> int:
+    """Queue one job per payload with a single executemany INSERT in the caller's transaction."""
+
+    now = datetime.utcnow()
+    max_attempts = current_app.config.get("JOBS_MAX_ATTEMPTS", 5)
+    rows = [
+        {"kind": kind, "payload": payload, "max_attempts": max_attempts, "run_at": now, "created_at": now}
+        for payload in payloads
+    ]
+    if rows:
+        db.session.execute(insert(Job), rows)
+    return len(rows)
+
+
+def _claimable(now: datetime):
+    stale_before = now - timedelta(seconds=current_app.config.get("JOBS_LOCK_TIMEOUT_SECONDS", 300))
+    return or_(
+        and_(Job.status == Job.QUEUED, Job.run_at <= now),
+        # A worker that died mid-job leaves it "running"; hand it out again.
+        and_(Job.status == Job.RUNNING, Job.locked_at < stale_before),
+    )
+
+
+def claim_next_job() -> Optional[Job]:
+    """Atomically move the next due job to ``running`` and return it.
+
+    The claim is a conditional UPDATE on the candidate's id, so concurrent
+    workers (threads or processes) racing for the same row get exactly one
+    winner without needing dialect-specific row locks.
+    """
+
+    for _ in range(3):
+        now = datetime.utcnow()
+        candidate = db.session.scalar(
+            select(Job.id).where(_claimable(now)).order_by(Job.run_at, Job.id).limit(1)
+        )
+        if candidate is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == candidate, _claimable(now))
+            .values(status=Job.RUNNING, locked_at=now, attempts=Job.attempts + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed.rowcount == 1:
+            return db.session.get(Job, candidate, populate_existing=True)
+    return None
+
+
+def _backoff(attempts: int) -> float:
+    base = current_app.config.get("JOBS_BACKOFF_SECONDS", 30)
+    ceiling = current_app.config.get("JOBS_BACKOFF_MAX_SECONDS", 3600)
+    delay = min(base * (2 ** max(attempts - 1, 0)), ceiling)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run_job(job: Job) -> None:
+    """Execute a claimed job and record its outcome."""
+
+    handler = _HANDLERS.get(job.kind)
+    job_id = job.id
+    try:
+        if handler is None:
+            raise PermanentJobError(f"No handler registered for {job.kind!r}")
+        handler(dict(job.payload or {}))
+    except Exception as exc:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        if isinstance(exc, PermanentJobError) or job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            current_app.logger.warning("Job %s (%s) failed: %s", job_id, job.kind, job.last_error)
+        else:
+            job.status = Job.QUEUED
+            job.run_at = datetime.utcnow() + timedelta(seconds=_backoff(job.attempts))
+        job.locked_at = None
+        db.session.commit()
+        return
+    job = db.session.get(Job, job_id)
+    job.status = Job.DONE
+    job.locked_at = None
+    job.last_error = None
+    db.session.commit()
+
+
+def run_pending_jobs(limit: Optional[int] = None) -> int:
+    """Run due jobs in the current thread until none are left; return how many ran."""
+
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def _worker_loop(app: Flask, stop: threading.Event, poll_interval: float) -> None:
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                ran = run_pending_jobs(limit=10)
+            except Exception:  # pragma: no cover - keep the worker alive
+                app.logger.exception("Job worker iteration failed")
+                db.session.rollback()
+                ran = 0
+            finally:
+                db.session.remove()
+        if not ran:
+            stop.wait(poll_interval)
+
+
+def start_workers(app: Flask, concurrency: int, poll_interval: float, stop: threading.Event) -> List[threading.Thread]:
+    threads = []
+    for index in range(concurrency):
+        thread = threading.Thread(
+            target=_worker_loop, args=(app, stop, poll_interval), name=f"giftlist-job-worker-{index}", daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+from sqlalchemy import func, select
+
+from ..extensions import db
+from ..models import Gift, Purchase
+
+
+def owner_gifts_version(owner_id: int) -> Tuple:
+    """Data version of an owner's own gift pages: no purchase columns on purpose.
+
+    The count catches deletions, ``max(updated_at)`` edits (including images
+    filled in by background jobs) and ``max(id)`` additions. One aggregate
+    over the ``(owner_id, created_at, id)`` index.
+    """
+
+    return tuple(
+        db.session.execute(
+            select(func.count(Gift.id), func.max(Gift.updated_at), func.max(Gift.id)).where(Gift.owner_id == owner_id)
+        ).one()
+    )
+
+
+def purchases_version(buyer_id: int) -> Tuple:
+    """Data version of a buyer's "Purchased by Me" pages, including the gifts' own edits.
+
+    ``max(purchased_at)`` rather than ``max(id)``: SQLite hands the highest
+    rowid out again, so undoing the latest purchase and buying another gift
+    would otherwise leave the version unchanged.
+    """
+
+    return tuple(
+        db.session.execute(
+            select(func.count(Purchase.id), func.max(Purchase.purchased_at), func.max(Gift.updated_at))
+            .join(Gift, Gift.id == Purchase.gift_id)
+            .where(Purchase.buyer_id == buyer_id)
+        ).one()
+    )
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from ..models import User
+
+T = TypeVar("T")
+
+_hasher_lock = threading.Lock()
+
+
+class PasswordHashingBusy(ServiceUnavailable):
+    description = "The server is busy signing people in. Please try again in a moment."
+
+
+class PasswordHasher:
+    """Runs password hashing on a small, bounded thread pool.
+
+    ``hashlib``'s scrypt and PBKDF2 release the GIL, so with threaded workers
+    other requests keep being served while a hash is computed. At most
+    ``max_pending`` hashes may be queued or running; a login burst beyond that
+    waits up to ``wait_seconds`` for a slot and is then turned away with a 503
+    instead of piling up CPU work nobody will wait for.
+    """
+
+    def __init__(self, method: str, concurrency: int, max_pending: int, wait_seconds: float) -> None:
+        self.method = method
+        # Werkzeug expands shorthand such as "pbkdf2" to its full parameters;
+        # stored hashes are compared against the expanded form.
+        self.method_prefix = generate_password_hash("", method).split("$", 1)[0]
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="giftlist-password")
+        # Each app (and each fork) builds its own hasher; its threads go with it
+        # once it is dropped, or at interpreter exit.
+        self._finalizer = weakref.finalize(self, self._executor.shutdown, wait=False)
+
+    def _run(self, func: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise PasswordHashingBusy()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return password_hash.split("$", 1)[0] != self.method_prefix
+
+    def shutdown(self) -> None:
+        self._finalizer()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Return this process's hasher for the current app (rebuilt after a fork)."""
+
+    holder = current_app.extensions.setdefault("giftlist.passwords", {})
+    pid = os.getpid()
+    hasher = holder.get(pid)
+    if hasher is not None:
+        return hasher
+    with _hasher_lock:
+        hasher = holder.get(pid)
+        if hasher is None:
+            # Anything keyed by another pid was inherited from the parent.
+            for stale in holder.values():
+                stale.shutdown()
+            holder.clear()
+            config = current_app.config
+            concurrency = config.get("PASSWORD_HASH_CONCURRENCY") or os.cpu_count() or 2
+            hasher = holder[pid] = PasswordHasher(
+                method=config.get("PASSWORD_HASH_METHOD", "scrypt"),
+                concurrency=concurrency,
+                max_pending=config.get("PASSWORD_HASH_MAX_PENDING") or concurrency * 4,
+                wait_seconds=config.get("PASSWORD_HASH_WAIT_SECONDS", 10.0),
+            )
+    return hasher
+
+
+def hash_password(password: str) -> str:
+    return get_password_hasher().hash(password)
+
+
+def verify_password(user: User, password: str) -> bool:
+    """Check ``password`` for ``user``, upgrading a hash made with outdated parameters.
+
+    On success with a stale hash the new hash is set on ``user``; the caller
+    commits it along with the rest of the login.
+    """
+
+    hasher = get_password_hasher()
+    if not hasher.verify(user.password_hash, password):
+        return False
+    if hasher.needs_rehash(user.password_hash):
+        user.password_hash = hasher.hash(password)
+    return True
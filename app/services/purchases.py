@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models import Gift, Purchase, User
+from .gift_lists import invalidate_gift_list
+from .gift_stats import adjust_gift_stats
+
+CLAIMED = "claimed"
+ALREADY_YOURS = "already_yours"
+TAKEN = "taken"
+OWN_GIFT = "own_gift"
+NOT_FOUND = "not_found"
+
+
+def _claim_statement(dialect: str, buyer_id: int, gift_ids: List[int]):
+    source = select(Gift.id, literal(buyer_id), literal(datetime.utcnow(), Purchase.purchased_at.type)).where(
+        Gift.id.in_(gift_ids), Gift.owner_id != buyer_id
+    )
+    columns = [Purchase.gift_id, Purchase.buyer_id, Purchase.purchased_at]
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    # The SELECT keeps its WHERE clause: SQLite needs one to tell the upsert's
+    # ON CONFLICT apart from a join constraint.
+    return (
+        dialect_insert(Purchase)
+        .from_select(columns, source)
+        .on_conflict_do_nothing(index_elements=[Purchase.gift_id])
+        .returning(Purchase.gift_id)
+    )
+
+
+def _claim_one_by_one(buyer_id: int, gift_ids: List[int]) -> List[int]:
+    claimed = []
+    owners = dict(db.session.execute(select(Gift.id, Gift.owner_id).where(Gift.id.in_(gift_ids))).all())
+    for gift_id in gift_ids:
+        if owners.get(gift_id) in (None, buyer_id):
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(
+                    insert(Purchase).values(gift_id=gift_id, buyer_id=buyer_id, purchased_at=datetime.utcnow())
+                )
+        except IntegrityError:
+            continue
+        claimed.append(gift_id)
+    return claimed
+
+
+def claim_gifts(buyer_id: int, gift_ids: Iterable[int]) -> Dict[int, str]:
+    """Mark every available gift in ``gift_ids`` as purchased by ``buyer_id`` in one transaction.
+
+    On PostgreSQL and SQLite the whole cart is claimed by one
+    ``INSERT ... SELECT ... ON CONFLICT (gift_id) DO NOTHING RETURNING``, so
+    concurrent shoppers never see an IntegrityError or a rollback: each gift
+    goes to exactly one of them. Returns a status per requested gift;
+    only gifts that were not claimed cost an extra query to explain why.
+    """
+
+    gift_ids = list(dict.fromkeys(gift_ids))
+    if not gift_ids:
+        return {}
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        claimed = list(db.session.scalars(_claim_statement(dialect, buyer_id, gift_ids)))
+    else:
+        claimed = _claim_one_by_one(buyer_id, gift_ids)
+
+    owners: Dict[int, int] = {}
+    if claimed:
+        # Core inserts bypass the Purchase listeners; keep their bookkeeping here.
+        owners = dict(db.session.execute(select(Gift.id, Gift.owner_id).where(Gift.id.in_(claimed))).all())
+        connection = db.session.connection()
+        for owner_id, count in Counter(owners.values()).items():
+            adjust_gift_stats(connection, owner_id, purchased=count)
+    db.session.commit()
+    if owners:
+        invalidate_gift_list(*set(owners.values()))
+
+    results = {gift_id: CLAIMED for gift_id in claimed}
+    missed = [gift_id for gift_id in gift_ids if gift_id not in results]
+    if missed:
+        rows = db.session.execute(
+            select(Gift.id, Gift.owner_id, Purchase.buyer_id)
+            .outerjoin(Purchase, Purchase.gift_id == Gift.id)
+            .where(Gift.id.in_(missed))
+        ).all()
+        for gift_id, owner_id, holder_id in rows:
+            if owner_id == buyer_id:
+                results[gift_id] = OWN_GIFT
+            elif holder_id == buyer_id:
+                results[gift_id] = ALREADY_YOURS
+            else:
+                results[gift_id] = TAKEN
+    return {gift_id: results.get(gift_id, NOT_FOUND) for gift_id in gift_ids}
+
+
+def gift_owner_username(gift_id: int) -> Optional[str]:
+    return db.session.scalar(select(User.slug).join(Gift, Gift.owner_id == User.id).where(Gift.id == gift_id))
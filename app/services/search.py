@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+from sqlalchemy import column, event, literal_column, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import joinedload
+
+from ..extensions import db
+from ..models import User
+
+# SQLite: an external-content FTS5 table mirroring ``users.name``/``users.email``
+# and kept in sync by triggers, so writes never have to know about it.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "name, email, content='users', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF name, email ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); "
+    "INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+]
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS users_fts_au",
+    "DROP TRIGGER IF EXISTS users_fts_ad",
+    "DROP TRIGGER IF EXISTS users_fts_ai",
+    "DROP TABLE IF EXISTS users_fts",
+]
+
+# PostgreSQL: a trigram GIN index over the normalized search expression. The
+# query below must spell the expression exactly like this for the planner to
+# match it against the index.
+POSTGRES_SEARCH_EXPRESSION = "(lower(users.name) || ' ' || lower(users.email))"
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users "
+    "USING gin ((lower(name) || ' ' || lower(email)) gin_trgm_ops)",
+]
+POSTGRES_DROP_DDL = ["DROP INDEX IF EXISTS ix_users_search_trgm"]
+
+_users_fts = table("users_fts", column("rowid"), column("rank"))
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def install_search_schema(connection: Connection, rebuild: bool = False) -> None:
+    """Create the dialect-specific search structures for the ``users`` table."""
+
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        if rebuild:
+            connection.exec_driver_sql("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def drop_search_schema(connection: Connection) -> None:
+    dialect = connection.dialect.name
+    statements = {"sqlite": SQLITE_DROP_DDL, "postgresql": POSTGRES_DROP_DDL}.get(dialect, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(User.__table__, "after_create")
+def _create_search_schema(target, connection, **kw) -> None:
+    install_search_schema(connection)
+
+
+@event.listens_for(User.__table__, "before_drop")
+def _drop_search_schema(target, connection, **kw) -> None:
+    drop_search_schema(connection)
+
+
+def _tokens(query: str) -> List[str]:
+    return _TOKEN_RE.findall(query.lower())
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_statement(query: str):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        tokens = _tokens(query)
+        if not tokens:
+            return None
+        # Every token is matched as a quoted prefix, which also neutralises
+        # FTS5 query syntax typed into the search box.
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return (
+            select(User)
+            .join(_users_fts, _users_fts.c.rowid == User.id)
+            .where(text("users_fts MATCH :match").bindparams(match=match))
+            .order_by(_users_fts.c.rank, User.id)
+        )
+
+    needle = query.lower()
+    if dialect == "postgresql":
+        expression = literal_column(POSTGRES_SEARCH_EXPRESSION)
+        return (
+            select(User)
+            .where(expression.like(f"%{_escape_like(needle)}%", escape="\\"))
+            .order_by(db.func.similarity(expression, needle).desc(), User.id)
+        )
+
+    prefix = f"{_escape_like(needle)}%"
+    return (
+        select(User)
+        .where(db.func.lower(User.name).like(prefix, escape="\\") | db.func.lower(User.email).like(prefix, escape="\\"))
+        .order_by(User.name, User.id)
+    )
+
+
+def search_users(
+    query: str, page: int = 1, per_page: int = 50, with_stats: bool = False
+) -> Tuple[List[User], bool]:
+    """Return one ranked page of users matching ``query`` and whether more follow.
+
+    An empty query lists the directory in sign-up order. ``with_stats`` joins
+    each user's ``gift_stats`` row into the same SELECT.
+    """
+
+    query = query.strip()
+    if query:
+        stmt = _search_statement(query)
+        if stmt is None:
+            return [], False
+    else:
+        stmt = select(User).order_by(User.created_at.asc(), User.id.asc())
+    if with_stats:
+        stmt = stmt.options(joinedload(User.gift_stats))
+    stmt = stmt.limit(per_page + 1).offset((max(page, 1) - 1) * per_page)
+    users = list(db.session.scalars(stmt))
+    return users[:per_page], len(users) > per_page
+
+
+def typeahead_users(query: str, limit: int = 8) -> List[User]:
+    if not query.strip():
+        return []
+    users, _ = search_users(query, page=1, per_page=limit)
+    return users
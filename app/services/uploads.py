@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, event, inspect, select, update
+from sqlalchemy.engine import Connection
+
+from ..extensions import db
+from ..models import Gift, StoredFile
+from ..utils.derivatives import DERIVATIVE_DIR, derivative_dir
+from ..utils.image_proxy import PROXY_DIR
+from ..utils.images import IMAGE_EXTENSIONS, sniff_image_type
+from ..utils.sql import upsert_insert
+from ..utils.storage import (
+    content_path,
+    file_digest,
+    is_content_addressed,
+    store_file,
+    temp_upload_path,
+    upload_root,
+)
+
+
+def _adjust_ref_count(connection: Connection, path: Optional[str], delta: int) -> None:
+    if not path:
+        return
+    now = datetime.utcnow()
+    if delta <= 0:
+        connection.execute(
+            update(StoredFile)
+            .where(StoredFile.path == path)
+            .values(ref_count=StoredFile.ref_count + delta, updated_at=now)
+        )
+        return
+    try:
+        size = (upload_root() / path).stat().st_size
+    except OSError:
+        size = None
+    # One upsert: two first uploads of the same image racing each other both
+    # land here, and the loser increments the winner's row instead of failing.
+    stmt = upsert_insert(connection, StoredFile).values(
+        path=path, size=size, ref_count=delta, created_at=now, updated_at=now
+    )
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StoredFile.path],
+            set_={"ref_count": StoredFile.ref_count + delta, "updated_at": now},
+        )
+    )
+
+
+# Reference counts move in the same transaction as the gift row that holds the
+# path, so a rolled-back edit never leaves the count out of step. Files whose
+# count reaches zero are left on disk for the upload collector.
+@event.listens_for(Gift, "after_insert")
+def _count_new_gift_image(mapper, connection, target: Gift) -> None:
+    _adjust_ref_count(connection, target.image_path, +1)
+
+
+@event.listens_for(Gift, "after_update")
+def _count_changed_gift_image(mapper, connection, target: Gift) -> None:
+    history = inspect(target).attrs.image_path.history
+    if not history.has_changes():
+        return
+    for old in history.deleted or ():
+        _adjust_ref_count(connection, old, -1)
+    for new in history.added or ():
+        _adjust_ref_count(connection, new, +1)
+
+
+@event.listens_for(Gift, "after_delete")
+def _count_deleted_gift_image(mapper, connection, target: Gift) -> None:
+    _adjust_ref_count(connection, target.image_path, -1)
+
+
+def migrate_legacy_uploads(batch_size: int = 200) -> Dict[str, int]:
+    """Move flat, randomly named uploads referenced by gifts into content-addressed storage.
+
+    Gifts are walked in primary-key batches so memory stays flat. Each legacy
+    file is copied into place (duplicates collapse onto one path), the gifts
+    pointing at it are repointed, and the old file is removed once committed.
+    """
+
+    root = upload_root()
+    stats = {"migrated": 0, "deduplicated": 0, "missing": 0}
+    last_id = 0
+    while True:
+        gifts = db.session.scalars(
+            select(Gift)
+            .where(Gift.id > last_id, Gift.image_path.isnot(None), Gift.image_path != "")
+            .order_by(Gift.id)
+            .limit(batch_size)
+        ).all()
+        if not gifts:
+            break
+        last_id = gifts[-1].id
+        retired = []
+        for gift in gifts:
+            if is_content_addressed(gift.image_path):
+                continue
+            source = root / gift.image_path
+            if not source.is_file():
+                stats["missing"] += 1
+                continue
+            with open(source, "rb") as handle:
+                sniffed = sniff_image_type(handle.read(12))
+            extension = IMAGE_EXTENSIONS.get(sniffed or "", source.suffix.lower() or ".jpg")
+            digest = file_digest(source)
+            already_stored = (root / content_path(digest, extension)).exists()
+            tmp_path = temp_upload_path(".migrate-")
+            shutil.copyfile(source, tmp_path)
+            gift.image_path = store_file(tmp_path, extension, digest=digest)
+            stats["deduplicated" if already_stored else "migrated"] += 1
+            retired.append(source)
+        db.session.commit()
+        for source in retired:
+            still_used = db.session.scalar(
+                select(Gift.id).where(Gift.image_path == source.relative_to(root).as_posix()).limit(1)
+            )
+            if still_used is None:
+                source.unlink(missing_ok=True)
+    current_app.logger.info("Upload migration finished: %s", stats)
+    return stats
+
+
+# Managed by their own code paths: variants go with their source, and the
+# proxy cache evicts itself.
+_COLLECTOR_SKIP_DIRS = {DERIVATIVE_DIR, PROXY_DIR}
+
+
+def _iter_upload_files(root: Path) -> Iterator[os.DirEntry]:
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if directory == root and entry.name in _COLLECTOR_SKIP_DIRS:
+                        continue
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def _remove_tree(path: Path) -> int:
+    reclaimed = 0
+    if not path.is_dir():
+        return reclaimed
+    for file in path.rglob("*"):
+        if file.is_file():
+            reclaimed += file.stat().st_size
+    shutil.rmtree(path, ignore_errors=True)
+    return reclaimed
+
+
+def _changed_since(stat: os.stat_result, cutoff: float) -> bool:
+    return max(stat.st_mtime, stat.st_ctime) > cutoff
+
+
+def collect_orphaned_uploads(grace_seconds: int, batch_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    """Delete upload files no gift references, returning what was scanned and reclaimed.
+
+    The upload folder is streamed with ``os.scandir`` and checked against
+    ``gifts.image_path`` one indexed ``IN`` query per batch, so neither side is
+    ever held in memory in full. Files changed within ``grace_seconds`` (their
+    ctime, which ``store_file`` bumps when deduplicating) are left alone so an
+    upload whose gift has not been committed yet is never collected; the check
+    is repeated just before each delete. Resized
+    variants go with their source, stale temp files are collected like any
+    other unreferenced file, and zero-count ``stored_files`` rows are dropped.
+    """
+
+    root = upload_root()
+    cutoff = time.time() - grace_seconds
+    stats = {"scanned": 0, "recent": 0, "removed": 0, "bytes": 0}
+    batch: Dict[str, Tuple[Path, int]] = {}
+
+    def sweep() -> None:
+        referenced = set(db.session.scalars(select(Gift.image_path).where(Gift.image_path.in_(list(batch)))))
+        removed = []
+        for relative, (path, size) in batch.items():
+            if relative in referenced:
+                continue
+            # ``store_file`` may have reused the file since it was scanned,
+            # for a gift that committed after the query above.
+            try:
+                recent = _changed_since(path.stat(), cutoff)
+            except FileNotFoundError:
+                continue
+            if recent:
+                stats["recent"] += 1
+                continue
+            stats["removed"] += 1
+            stats["bytes"] += size
+            if dry_run:
+                continue
+            path.unlink(missing_ok=True)
+            stats["bytes"] += _remove_tree(root / derivative_dir(relative))
+            removed.append(relative)
+        if removed:
+            db.session.execute(
+                delete(StoredFile).where(StoredFile.path.in_(removed), StoredFile.ref_count <= 0)
+            )
+            db.session.commit()
+        batch.clear()
+
+    for entry in _iter_upload_files(root):
+        stats["scanned"] += 1
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        if _changed_since(stat, cutoff):
+            stats["recent"] += 1
+            continue
+        batch[Path(entry.path).relative_to(root).as_posix()] = (Path(entry.path), stat.st_size)
+        if len(batch) >= batch_size:
+            sweep()
+    if batch:
+        sweep()
+    current_app.logger.info("Upload collection finished: %s", stats)
+    return stats
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from flask import has_app_context
+from sqlalchemy import event, inspect
+
+from ..extensions import db
+from ..models import User
+from ..utils.cache import LRUCache, app_cache
+
+
+def slug_cache() -> LRUCache:
+    return app_cache("username_slugs", maxsize=4096)
+
+
+def resolve_username(username: str) -> Optional[User]:
+    """Look up a user by their URL slug.
+
+    A slug→id LRU sits in front of the unique ``users.slug`` index; a cached id
+    resolves through the identity map or a primary-key fetch and is re-checked
+    against the slug in case the cache raced a rename.
+    """
+
+    slug = username.lower()
+    cache = slug_cache()
+    user_id = cache.get(slug)
+    if user_id is not None:
+        user = db.session.get(User, user_id)
+        if user is not None and user.slug == slug:
+            return user
+        cache.pop(slug)
+    user = User.query.filter_by(slug=slug).first()
+    if user is not None:
+        cache.set(slug, user.id)
+    return user
+
+
+def _forget(*slugs: Optional[str]) -> None:
+    if not has_app_context():
+        return
+    cache = slug_cache()
+    for slug in slugs:
+        if slug:
+            cache.pop(slug)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_update(mapper, connection, target: User) -> None:
+    history = inspect(target).attrs.slug.history
+    _forget(target.slug, *(history.deleted or ()))
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_on_delete(mapper, connection, target: User) -> None:
+    _forget(target.slug)
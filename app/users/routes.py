@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from flask import Blueprint, abort, render_template, request
+from flask import Blueprint, abort, current_app, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from ..models import Gift, User
+from ..services.gift_lists import user_gift_list
+from ..services.search import search_users, typeahead_users
+from ..utils.conditional import not_modified, page_etag, with_etag
 
 
 users_bp = Blueprint("users", __name__, url_prefix="/users", template_folder="../templates/users")
@@ -13,21 +15,48 @@ users_bp = Blueprint("users", __name__, url_prefix="/users", template_folder="..
 @login_required
 def list_users():
     query = request.args.get("q", "").strip()
-    users = User.query
-    if query:
-        q = f"%{query}%"
-        users = users.filter((User.name.ilike(q)) | (User.email.ilike(q)))
-    users = users.order_by(User.created_at.asc()).all()
-    return render_template("users/list.html", users=users, query=query)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = current_app.config.get("USERS_PER_PAGE", 50)
+    users, has_next = search_users(query, page=page, per_page=per_page, with_stats=True)
+    return render_template("users/list.html", users=users, query=query, page=page, has_next=has_next)
+
+
+@users_bp.route("/typeahead")
+@login_required
+def typeahead():
+    query = request.args.get("q", "")[:100]
+    limit = current_app.config.get("USERS_TYPEAHEAD_LIMIT", 8)
+    users = typeahead_users(query, limit=limit)
+    return {
+        "results": [
+            {
+                "name": user.name,
+                "username": user.username,
+                "url": url_for("users.user_gifts", username=user.username),
+            }
+            for user in users
+        ]
+    }
 
 
 @users_bp.route("/<string:username>/gifts")
 @login_required
 def user_gifts(username: str):
-    user = User.query.filter(User.email.ilike(f"{username}@%"))
-    user = user.order_by(User.created_at.asc()).first()
-    if not user:
+    snapshot = user_gift_list(username, current_user.id, request.args.get("cursor"))
+    if snapshot is None:
         abort(404)
-    is_owner = current_user.is_authenticated and current_user.id == user.id
-    gifts = Gift.query.filter_by(owner_id=user.id).order_by(Gift.created_at.asc()).all()
-    return render_template("users/user_gifts.html", user=user, gifts=gifts, show_purchases=not is_owner)
+    is_owner = current_user.id == snapshot.owner.id
+    # The snapshot version already differs between the owner and guest views;
+    # the view name is added so the two can never collide even in principle.
+    etag = page_etag("users.user_gifts", "owner" if is_owner else "guest", snapshot.version)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    html = render_template(
+        "users/user_gifts.html",
+        user=snapshot.owner,
+        gifts=snapshot.page.items,
+        page=snapshot.page,
+        show_purchases=not is_owner,
+    )
+    return with_etag(html, etag)
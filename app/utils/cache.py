@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from flask import current_app
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A small thread-safe LRU map with an optional per-entry time to live."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def app_cache(name: str, maxsize: int = 1024, ttl: Optional[float] = None) -> LRUCache:
+    """Return the ``LRUCache`` registered on the current app under ``name``.
+
+    Caches live in ``app.extensions`` so every app instance (and every test)
+    starts with its own empty cache.
+    """
+
+    caches = current_app.extensions.setdefault("giftlist.caches", {})
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches.setdefault(name, LRUCache(maxsize=maxsize, ttl=ttl))
+    return cache
+
+
+def shared_stamp_changed(name: str, path: Optional[str]) -> bool:
+    """Whether the file at ``path`` was touched since this worker last checked ``name``.
+
+    Workers on one host share a cache invalidation by touching a file and
+    comparing its mtime on their next lookup. Without a ``path`` there is
+    nothing to compare and the answer is always ``False``.
+    """
+
+    if not path:
+        return False
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        stamp = 0
+    stamps = current_app.extensions.setdefault("giftlist.stamps", {})
+    previous = stamps.get(name, stamp)
+    stamps[name] = stamp
+    return previous != stamp
+
+
+def touch_shared_stamp(path: Optional[str]) -> None:
+    """Tell every worker watching ``path`` through ``shared_stamp_changed`` to drop its cache."""
+
+    if path:
+        with open(path, "a"):
+            os.utime(path)
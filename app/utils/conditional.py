@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from flask import Response, current_app, make_response, request, session
+from flask_login import current_user
+
+_template_stamp: Optional[str] = None
+
+
+def _templates_stamp() -> str:
+    # Pages must change ETag when a deploy changes their markup. The newest
+    # template mtime is the same in every worker of one release.
+    global _template_stamp
+    if _template_stamp is None:
+        root = Path(current_app.root_path) / "templates"
+        newest = max((entry.stat().st_mtime_ns for entry in root.rglob("*.html")), default=0)
+        _template_stamp = str(newest)
+    return _template_stamp
+
+
+def _csrf_bucket() -> int:
+    # The pages embed a signed CSRF token that Flask-WTF rejects after
+    # ``WTF_CSRF_TIME_LIMIT``. Rolling the ETag every half limit means a 304
+    # never keeps a page alive with a token that has less than half left.
+    limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    if not limit:
+        return 0
+    return int(time.time() // max(limit // 2, 1))
+
+
+def page_etag(view: str, *parts: Any) -> Optional[str]:
+    """Build the ETag of a personal page from ``view`` and its data version ``parts``.
+
+    The viewer's id, name (shown in the navbar) and CSRF session token are
+    always mixed in, so two people, or one person before and after logging in
+    again, never share a token; so is a time bucket shorter than the CSRF
+    token lifetime, so forms on a revalidated page still post. Returns ``None`` while flash messages are
+    pending: those render exactly once and must not be hidden behind a 304.
+    """
+
+    if session.get("_flashes"):
+        return None
+    digest = hashlib.sha256()
+    viewer = (current_user.id, current_user.name) if current_user.is_authenticated else ("anonymous",)
+    for part in (view, _templates_stamp(), *viewer, session.get("csrf_token", ""), _csrf_bucket(), *parts):
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _private_revalidate(response: Response) -> Response:
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def not_modified(etag: Optional[str]) -> Optional[Response]:
+    """A 304 for ``etag`` when the client already holds it; ``None`` otherwise."""
+
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return _private_revalidate(response)
+
+
+def with_etag(body: str, etag: Optional[str]) -> Response:
+    response = make_response(body)
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return _private_revalidate(response)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import math
+import os
+import tempfile
+from pathlib import Path, PurePosixPath
+from typing import List, Tuple
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+from werkzeug.security import safe_join
+
+from .storage import upload_root
+
+DERIVATIVE_DIR = "_derivatives"
+# format name in URLs -> (Pillow encoder, file extension)
+DERIVATIVE_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg")}
+
+
+def derivative_widths() -> Tuple[int, ...]:
+    return tuple(sorted(current_app.config.get("IMAGE_DERIVATIVE_WIDTHS", (320, 640, 960))))
+
+
+def derivative_path(source: str, width: int, fmt: str) -> str:
+    """Relative path of the ``width``/``fmt`` variant of the upload at ``source``.
+
+    Uploads are content-addressed and never rewritten, so the variant's name is
+    derived from the source path alone and never needs invalidating.
+    """
+
+    return f"{derivative_dir(source)}/{width}{DERIVATIVE_FORMATS[fmt][1]}"
+
+
+def derivative_dir(source: str) -> str:
+    """Relative directory holding every variant of the upload at ``source``."""
+
+    return f"{DERIVATIVE_DIR}/{PurePosixPath(source).with_suffix('')}"
+
+
+def ensure_derivative(source: str, width: int, fmt: str) -> str:
+    """Return the relative path of a resized variant, rendering it on first use.
+
+    Raises ``FileNotFoundError`` when the source upload does not exist and
+    ``ValueError`` for widths or formats that are not configured, so callers
+    cannot be used to fill the disk with arbitrary sizes.
+    """
+
+    if width not in derivative_widths() or fmt not in DERIVATIVE_FORMATS:
+        raise ValueError("Unsupported image variant")
+    root = upload_root()
+    source_file = safe_join(str(root), source)
+    if source_file is None or source.startswith(f"{DERIVATIVE_DIR}/") or not os.path.isfile(source_file):
+        raise FileNotFoundError(source)
+
+    relative = derivative_path(source, width, fmt)
+    target = root / relative
+    if target.exists():
+        return relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".render-", suffix=".part")
+    os.close(fd)
+    try:
+        _render(Path(source_file), Path(tmp_name), width, fmt)
+        # Concurrent renders of the same variant produce identical files, so
+        # whichever rename lands last is as good as the first.
+        os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return relative
+
+
+def _render(source: Path, target: Path, width: int, fmt: str) -> None:
+    encoder = DERIVATIVE_FORMATS[fmt][0]
+    quality = current_app.config.get("IMAGE_DERIVATIVE_QUALITY", 80)
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding. The
+        # request keeps the short side >= width so an EXIF rotation afterwards
+        # still leaves enough pixels.
+        scale = width / min(image.size)
+        if scale < 1:
+            image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if encoder == "JPEG":
+            image = _flatten(image)
+            image.save(target, format=encoder, quality=quality, optimize=True, progressive=True)
+        else:
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+            image.save(target, format=encoder, quality=quality, method=4)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    if image.mode == "RGB":
+        return image
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def image_srcset(source: str, fmt: str = "jpeg") -> str:
+    """``srcset`` value listing every configured width of ``source`` in ``fmt``."""
+
+    entries: List[str] = [
+        f"{url_for('gifts.image_variant', width=width, fmt=fmt, filename=source)} {width}w"
+        for width in derivative_widths()
+    ]
+    return ", ".join(entries)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import ipaddress
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+DEFAULT_USER_AGENT = "GiftListBot/1.0 (+https://example.com)"
+
+_client_lock = threading.Lock()
+
+
+class HostBusy(requests.RequestException):
+    """Raised when a host's concurrency slots stay taken for too long."""
+
+
+class BlockedAddress(ValueError):
+    """Raised instead of connecting to a private, loopback, link-local or otherwise non-public address."""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def ensure_public_host(host: str, port: Optional[int]) -> None:
+    """Refuse ``host`` unless every address it resolves to is public.
+
+    Resolution errors are left for the connection attempt to report.
+    """
+
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return
+    for *_, sockaddr in infos:
+        if not _is_public(sockaddr[0]):
+            raise BlockedAddress(f"{host} resolves to a non-public address")
+
+
+def _public_only(base: type) -> type:
+    # Owners choose the URLs we fetch, and any page view can trigger one, so
+    # internal services must never be reachable. The host is vetted before
+    # connecting (this also covers redirects) and the connected peer again
+    # afterwards, in case DNS answered differently the second time.
+    class PublicOnlyConnection(base):  # type: ignore[misc, valid-type]
+        def _new_conn(self):
+            ensure_public_host(self._dns_host, self.port)
+            sock = super()._new_conn()
+            if not _is_public(sock.getpeername()[0]):
+                sock.close()
+                raise BlockedAddress(f"{self.host} resolves to a non-public address")
+            return sock
+
+    PublicOnlyConnection.__name__ = f"PublicOnly{base.__name__}"
+    return PublicOnlyConnection
+
+
+class PoolStats:
+    """Thread-safe counters for connection checkouts from the urllib3 pools."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.pool_hits = 0
+        self.pool_misses = 0
+
+    def record_checkout(self, reused: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            if reused:
+                self.pool_hits += 1
+            else:
+                self.pool_misses += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "pool_hits": self.pool_hits, "pool_misses": self.pool_misses}
+
+
+def _counting_pool(base: type, stats: PoolStats, connection_cls: Optional[type] = None) -> type:
+    class CountingPool(base):  # type: ignore[misc, valid-type]
+        if connection_cls is not None:
+            ConnectionCls = connection_cls
+
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout)
+            # Brand-new connections and ones reset after the peer dropped them
+            # both come back without a socket; only a live socket is a reuse.
+            stats.record_checkout(reused=getattr(conn, "sock", None) is not None)
+            return conn
+
+    CountingPool.__name__ = f"Counting{base.__name__}"
+    return CountingPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats: PoolStats, allow_private_addresses: bool = False, **kwargs) -> None:
+        self._stats = stats
+        self._allow_private = allow_private_addresses
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        http_cls = None if self._allow_private else _public_only(HTTPConnection)
+        https_cls = None if self._allow_private else _public_only(HTTPSConnection)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self._stats, http_cls),
+            "https": _counting_pool(HTTPSConnectionPool, self._stats, https_cls),
+        }
+
+
+class _HostSlots:
+    """A host's concurrency semaphore and how many requests are holding or awaiting it."""
+
+    def __init__(self, size: int) -> None:
+        self.semaphore = threading.BoundedSemaphore(size)
+        self.users = 0
+
+
+class HttpClient:
+    """Keep-alive HTTP client shared by all outbound fetches of one process.
+
+    Connections are pooled per host by a single ``requests.Session`` and a
+    bounded semaphore caps how many requests may be in flight to any one host,
+    so a slow retailer cannot tie up every worker thread. Unless
+    ``allow_private_addresses`` is set, connections to non-public addresses
+    raise ``BlockedAddress``.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 5.0,
+        pool_maxsize: int = 10,
+        max_per_host: int = 4,
+        host_wait: float = 5.0,
+        user_agent: str = DEFAULT_USER_AGENT,
+        allow_private_addresses: bool = False,
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_per_host = max_per_host
+        self.host_wait = host_wait
+        self.stats = PoolStats()
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = _CountingAdapter(
+            self.stats,
+            allow_private_addresses=allow_private_addresses,
+            pool_connections=pool_maxsize,
+            pool_maxsize=pool_maxsize,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Only hosts with a request in flight or waiting have an entry, so
+        # crawling many distinct hosts does not grow this without bound.
+        self._host_slots: Dict[str, _HostSlots] = {}
+        self._slots_lock = threading.Lock()
+
+    @contextmanager
+    def _host_slot(self, url: str) -> Iterator[None]:
+        host = urlsplit(url).netloc.lower()
+        with self._slots_lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = self._host_slots[host] = _HostSlots(self.max_per_host)
+            slots.users += 1
+        try:
+            if not slots.semaphore.acquire(timeout=self.host_wait):
+                raise HostBusy(f"Too many concurrent requests to {urlsplit(url).netloc}")
+            try:
+                yield
+            finally:
+                slots.semaphore.release()
+        finally:
+            with self._slots_lock:
+                slots.users -= 1
+                if not slots.users:
+                    del self._host_slots[host]
+
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs) -> Iterator[requests.Response]:
+        """Open a streamed response; the host slot is held until the block exits."""
+
+        with self._host_slot(url):
+            kwargs.setdefault("timeout", self.timeout)
+            response = self.session.request(method, url, stream=True, **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Fetch ``url`` fully (body read, connection back in the pool)."""
+
+        with self.stream("GET", url, **kwargs) as response:
+            response.content  # noqa: B018 - read so the connection can be reused
+        return response
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def get_http_client() -> HttpClient:
+    """Return the current process's shared client for this app.
+
+    The client is rebuilt after a fork so gunicorn workers never share pooled
+    sockets with the master process.
+    """
+
+    holder = current_app.extensions.setdefault("giftlist.http", {})
+    pid = os.getpid()
+    client = holder.get(pid)
+    if client is not None:
+        return client
+    with _client_lock:
+        client = holder.get(pid)
+        if client is None:
+            # Anything keyed by another pid was inherited from the parent.
+            holder.clear()
+            config = current_app.config
+            client = holder[pid] = HttpClient(
+                connect_timeout=config.get("HTTP_CONNECT_TIMEOUT", 3.05),
+                read_timeout=config.get("HTTP_READ_TIMEOUT", 5.0),
+                pool_maxsize=config.get("HTTP_POOL_MAXSIZE", 10),
+                max_per_host=config.get("HTTP_MAX_PER_HOST", 4),
+                host_wait=config.get("HTTP_HOST_WAIT_SECONDS", 5.0),
+                user_agent=config.get("HTTP_USER_AGENT", DEFAULT_USER_AGENT),
+                allow_private_addresses=config.get("HTTP_ALLOW_PRIVATE_ADDRESSES", False),
+            )
+    return client
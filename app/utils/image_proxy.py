@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app, url_for
+
+from .cache import app_cache
+from .images import IMAGE_EXTENSIONS, download_image
+from .storage import upload_root
+
+PROXY_DIR = "_proxy"
+_LOCK_STRIPES = 64
+
+
+def _key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def sign_url(url: str) -> str:
+    mac = hmac.new(current_app.config["SECRET_KEY"].encode("utf-8"), url.encode("utf-8"), hashlib.sha256)
+    return base64.urlsafe_b64encode(mac.digest()[:18]).decode()
+
+
+def verify_signature(url: str, signature: str) -> bool:
+    return hmac.compare_digest(sign_url(url), signature or "")
+
+
+def proxied_image_url(url: str) -> str:
+    """Local URL that serves the remote image at ``url`` through the proxy cache."""
+
+    return url_for("gifts.image_proxy", sig=sign_url(url), url=url)
+
+
+def is_proxyable(url: Optional[str]) -> bool:
+    return bool(url) and urlsplit(url).scheme in {"http", "https"}
+
+
+class ProxyCache:
+    """Size-bounded disk cache of remote images, evicted least recently used first.
+
+    Entries live under ``_proxy/`` in the upload folder, named by the hash of
+    their source URL. A hit bumps the file's access time, so atime order is
+    LRU order and survives restarts without any index. The running total is kept
+    in memory and re-measured from disk whenever an eviction pass runs, so
+    several processes sharing the directory converge on the real size.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None
+        self._lock = threading.Lock()
+        self._fill_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+    def relative_path(self, key: str, extension: str) -> str:
+        return f"{PROXY_DIR}/{key[:2]}/{key}{extension}"
+
+    def lookup(self, key: str) -> Optional[str]:
+        for extension in IMAGE_EXTENSIONS.values():
+            relative = self.relative_path(key, extension)
+            path = self.root / relative
+            try:
+                # Record the hit in the access time only: mtime feeds the ETag.
+                os.utime(path, (time.time(), path.stat().st_mtime))
+            except FileNotFoundError:
+                continue
+            return relative
+        return None
+
+    def fetch(self, url: str) -> str:
+        """Return the cached copy of ``url``, downloading it on a miss."""
+
+        key = _key(url)
+        relative = self.lookup(key)
+        if relative is not None:
+            return relative
+        # One download per URL at a time; later requests wait and then hit.
+        with self._fill_locks[int(key[:4], 16) % _LOCK_STRIPES]:
+            relative = self.lookup(key)
+            if relative is not None:
+                return relative
+            tmp_path, mime_type, _ = download_image(url, prefix=".proxy-")
+            relative = self.relative_path(key, IMAGE_EXTENSIONS[mime_type])
+            target = self.root / relative
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                size = tmp_path.stat().st_size
+                os.replace(tmp_path, target)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+        self._added(size, keep=target)
+        return relative
+
+    def _added(self, size: int, keep: Path) -> None:
+        with self._lock:
+            if self._total is None:
+                self._total = sum(entry_size for _, entry_size, _ in self._entries())
+            else:
+                self._total += size
+            if self._total > self.max_bytes:
+                self._evict(keep)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        base = self.root / PROXY_DIR
+        if not base.is_dir():
+            return entries
+        with os.scandir(base) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.startswith("."):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_atime, stat.st_size, Path(entry.path)))
+        return entries
+
+    def _evict(self, keep: Path) -> None:
+        # Trim to 90% so a busy cache is not rescanned on every insert.
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+        self._total = total
+
+
+def get_proxy_cache() -> ProxyCache:
+    holder = current_app.extensions.setdefault("giftlist.image_proxy", {})
+    cache = holder.get("cache")
+    if cache is None:
+        cache = holder.setdefault(
+            "cache",
+            ProxyCache(upload_root(), current_app.config.get("IMAGE_PROXY_CACHE_BYTES", 256 * 1024 * 1024)),
+        )
+    return cache
+
+
+def fetch_proxied_image(url: str) -> Optional[str]:
+    """Return the cache-relative path of ``url``'s image, or ``None`` if it cannot be fetched.
+
+    Failures are remembered for ``IMAGE_PROXY_FAILURE_TTL_SECONDS`` so a broken
+    link on a busy page does not trigger a download per visitor.
+    """
+
+    failures = app_cache("image_proxy_failures", maxsize=4096)
+    if failures.get(url):
+        return None
+    try:
+        return get_proxy_cache().fetch(url)
+    except (requests.RequestException, ValueError, OSError) as exc:
+        current_app.logger.info("Image proxy could not fetch %s: %s", url, exc)
+        failures.set(url, True, ttl=current_app.config.get("IMAGE_PROXY_FAILURE_TTL_SECONDS", 300))
+        return None
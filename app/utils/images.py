@@ -1,57 +1,201 @@
 from __future__ import annotations
 
-import mimetypes
-import secrets
+import codecs
+import hashlib
+import io
+from dataclasses import dataclass
 from html.parser import HTMLParser
 from pathlib import Path
 from urllib.parse import urljoin
 
 import requests
 from flask import current_app
-from PIL import Image
+from PIL import Image, ImageOps
 from werkzeug.datastructures import FileStorage
-from werkzeug.utils import secure_filename
+
+from .http import get_http_client
+from .storage import store_bytes, store_file, temp_upload_path
 
 ALLOWED_MIME_TYPES = {"image/png", "image/jpeg", "image/webp"}
+IMAGE_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HTML_CHUNK_SIZE = 16 * 1024
+_SNIFF_BYTES = 12
 
 
-def _safe_filename(filename: str) -> str:
-    base = secure_filename(filename)
-    if not base:
-        base = secrets.token_hex(8)
-    return base
+def save_upload(file: FileStorage) -> str:
+    """Validate an uploaded image in memory and store it content-addressed; return its relative path.
 
+    Size, magic bytes and the decoded image header are all checked before
+    anything is written, so a rejected upload never touches the upload
+    folder. With ``UPLOAD_REENCODE`` on, the image is re-encoded without its
+    metadata (EXIF, GPS) and capped at ``UPLOAD_MAX_DIMENSION`` pixels.
+    """
 
-def _upload_folder() -> Path:
-    folder = Path(current_app.config["UPLOAD_FOLDER"])
-    folder.mkdir(parents=True, exist_ok=True)
-    return folder
+    config = current_app.config
+    data, mime_type = read_upload(file, config.get("MAX_CONTENT_LENGTH", 2 * 1024 * 1024))
+    validate_image_bytes(data, mime_type, config.get("UPLOAD_MAX_PIXELS", 40_000_000))
+    if config.get("UPLOAD_REENCODE", False):
+        data = reencode_image(
+            data, config.get("UPLOAD_MAX_DIMENSION", 2048), config.get("UPLOAD_REENCODE_QUALITY", 85)
+        )
+    return store_bytes(data, IMAGE_EXTENSIONS[mime_type])
 
 
-def save_upload(file: FileStorage) -> str:
-    upload_folder = _upload_folder()
-    filename = _safe_filename(file.filename or "upload")
-    extension = Path(filename).suffix or ".jpg"
-    filepath = upload_folder / f"{secrets.token_hex(8)}{extension}"
-    file.stream.seek(0)
-    file.save(filepath)
-    _validate_image(filepath)
-    return filepath.name
+def read_upload(file: FileStorage, max_size: int) -> tuple[bytes, str]:
+    """Read an upload into memory, rejecting it by size or magic bytes as early as possible."""
 
+    stream = file.stream
+    try:
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    except (AttributeError, OSError, ValueError):
+        size = None
+    if size is not None and size > max_size:
+        raise ValueError("Image file is too large")
 
-def fetch_image(url: str) -> str:
-    resp = requests.get(url, timeout=5)
-    resp.raise_for_status()
-    content_type = resp.headers.get("Content-Type", "").split(";")[0]
-    if content_type not in ALLOWED_MIME_TYPES:
+    head = stream.read(_SNIFF_BYTES)
+    mime_type = sniff_image_type(head)
+    if mime_type is None:
         raise ValueError("Unsupported image type")
-    extension = mimetypes.guess_extension(content_type) or ".jpg"
-    upload_folder = _upload_folder()
-    filename = upload_folder / f"{secrets.token_hex(8)}{extension}"
-    with open(filename, "wb") as f:
-        f.write(resp.content)
-    _validate_image(filename)
-    return filename.name
+    data = head + stream.read(max_size + 1 - len(head))
+    if len(data) > max_size:
+        raise ValueError("Image file is too large")
+    return data, mime_type
+
+
+def validate_image_bytes(data: bytes, mime_type: str, max_pixels: int) -> None:
+    """Check that ``data`` decodes as the sniffed format within the pixel budget."""
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if Image.MIME.get(image.format or "") != mime_type:
+                raise ValueError("Image content does not match its type")
+            if image.width * image.height > max_pixels:
+                raise ValueError("Image dimensions are too large")
+            image.verify()
+    except ValueError:
+        raise
+    except Exception as exc:
+        raise ValueError("Invalid image file") from exc
+
+
+def reencode_image(data: bytes, max_dimension: int, quality: int) -> bytes:
+    """Re-encode ``data`` in its own format without metadata, fitting ``max_dimension``."""
+
+    with Image.open(io.BytesIO(data)) as image:
+        fmt = image.format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(out, format=fmt, quality=quality, optimize=True)
+        elif fmt == "WEBP":
+            image.save(out, format=fmt, quality=quality)
+        else:
+            image.save(out, format=fmt, optimize=True)
+    return out.getvalue()
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Identify an allowed image format from its leading magic bytes."""
+
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def fetch_image(url: str) -> str:
+    """Download the image at ``url`` into upload storage and return its relative path.
+
+    Only a fully validated file is moved into content-addressed storage; see
+    :func:`download_image` for the limits applied while downloading.
+    """
+
+    tmp_path, mime_type, digest = download_image(url, prefix=".fetch-")
+    try:
+        return store_file(tmp_path, IMAGE_EXTENSIONS[mime_type], digest=digest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def download_image(url: str, prefix: str = ".download-") -> tuple[Path, str, str]:
+    """Stream the image at ``url`` into a validated temp file in the upload folder.
+
+    The body is hashed on the way. The download stops as soon as the declared
+    or received size passes ``MAX_CONTENT_LENGTH`` or the first bytes are not
+    a known image format. Returns ``(temp_path, mime_type, sha256)``; the
+    caller owns the temp file.
+    """
+
+    max_size = current_app.config.get("MAX_CONTENT_LENGTH", 2 * 1024 * 1024)
+    with get_http_client().stream("GET", url) as resp:
+        resp.raise_for_status()
+        content_type = resp.headers.get("Content-Type", "").split(";")[0]
+        if content_type not in ALLOWED_MIME_TYPES:
+            raise ValueError("Unsupported image type")
+        declared = resp.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_size:
+            raise ValueError("Image file is too large")
+
+        tmp_path = temp_upload_path(prefix)
+        try:
+            digest = hashlib.sha256()
+            with open(tmp_path, "wb") as out:
+                sniffed = _stream_to_file(resp, _HashingWriter(out, digest), max_size)
+            _validate_image(tmp_path)
+            return tmp_path, sniffed, digest.hexdigest()
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+
+class _HashingWriter:
+    def __init__(self, out, digest) -> None:
+        self._out = out
+        self._digest = digest
+
+    def write(self, data: bytes) -> None:
+        self._digest.update(data)
+        self._out.write(data)
+
+
+def _stream_to_file(resp: requests.Response, out, max_size: int) -> str:
+    """Copy ``resp`` into ``out`` enforcing the size cap; return the sniffed MIME type."""
+
+    head = b""
+    sniffed: str | None = None
+    received = 0
+    for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+        if not chunk:
+            continue
+        received += len(chunk)
+        if received > max_size:
+            raise ValueError("Image file is too large")
+        if sniffed is None:
+            head += chunk
+            if len(head) < _SNIFF_BYTES:
+                continue
+            sniffed = sniff_image_type(head)
+            if sniffed is None:
+                raise ValueError("Unsupported image type")
+            out.write(head)
+            continue
+        out.write(chunk)
+    if sniffed is None:
+        sniffed = sniff_image_type(head)
+        if sniffed is None:
+            raise ValueError("Unsupported image type")
+        out.write(head)
+    return sniffed
 
 
 def _validate_image(path: Path) -> None:
@@ -81,8 +225,17 @@ class _ImageMetaParser(HTMLParser):
     def __init__(self) -> None:
         super().__init__()
         self.image_url: str | None = None
+        self.head_closed = False
+
+    @property
+    def done(self) -> bool:
+        """Nothing later in the document can change the answer."""
+        return self.image_url is not None or self.head_closed
 
     def handle_starttag(self, tag: str, attrs):  # type: ignore[override]
+        if tag.lower() == "body":
+            self.head_closed = True
+            return
         if tag.lower() != "meta" or self.image_url:
             return
         attr_map = {name.lower(): value for name, value in attrs if value}
@@ -92,6 +245,102 @@ class _ImageMetaParser(HTMLParser):
             if content.strip():
                 self.image_url = content.strip()
 
+    def handle_endtag(self, tag: str):  # type: ignore[override]
+        if tag.lower() == "head":
+            self.head_closed = True
+
+
+@dataclass
+class PageProbe:
+    """Outcome of fetching a product page for image metadata."""
+
+    image_url: str | None = None
+    not_modified: bool = False
+    etag: str | None = None
+    last_modified: str | None = None
+    bytes_read: int = 0
+
+
+def _response_charset(resp: requests.Response) -> str:
+    content_type = resp.headers.get("Content-Type", "")
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            charset = value.strip().strip("\"'")
+            try:
+                codecs.lookup(charset)
+            except LookupError:
+                break
+            return charset
+    return "utf-8"
+
+
+def _feed_head(resp: requests.Response, parser: _ImageMetaParser, max_bytes: int) -> int:
+    """Feed ``resp`` to ``parser`` chunk by chunk until it is done or ``max_bytes`` are read."""
+
+    decoder = codecs.getincrementaldecoder(_response_charset(resp))(errors="replace")
+    received = 0
+    for chunk in resp.iter_content(HTML_CHUNK_SIZE):
+        if not chunk:
+            continue
+        chunk = chunk[: max_bytes - received]
+        received += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done or received >= max_bytes:
+            return received
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return received
+
+
+def probe_page(page_url: str, etag: str | None = None, last_modified: str | None = None) -> PageProbe:
+    """Fetch ``page_url`` and report the image URL advertised in its metadata.
+
+    ``etag``/``last_modified`` turn the request into a conditional GET; a 304
+    comes back as ``PageProbe(not_modified=True)``. The body is parsed as it
+    streams in and the download stops at ``</head>``/``<body>``, as soon as an
+    image candidate is found, or after ``IMAGE_INFERENCE_MAX_BYTES``; closing
+    the unread response drops the connection. Transport and HTTP errors
+    propagate as ``requests.RequestException`` so callers that can retry (the
+    job queue) are able to tell them apart from a page that simply has no image.
+    """
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    with get_http_client().stream("GET", page_url, headers=headers) as resp:
+        resp.raise_for_status()
+        probe = PageProbe(etag=resp.headers.get("ETag"), last_modified=resp.headers.get("Last-Modified"))
+        if resp.status_code == 304:
+            probe.not_modified = True
+            return probe
+
+        content_type = resp.headers.get("Content-Type", "").lower()
+        if "html" not in content_type:
+            return probe
+
+        parser = _ImageMetaParser()
+        max_bytes = current_app.config.get("IMAGE_INFERENCE_MAX_BYTES", 256 * 1024)
+        try:
+            probe.bytes_read = _feed_head(resp, parser, max_bytes)
+        except requests.RequestException:
+            raise
+        except Exception:
+            return probe
+
+    if parser.image_url:
+        probe.image_url = urljoin(resp.url, parser.image_url)
+    return probe
+
+
+def probe_image_url(page_url: str) -> str | None:
+    """Fetch ``page_url`` and return the image URL advertised in its metadata."""
+
+    return probe_page(page_url).image_url
+
 
 def infer_image_url(page_url: str) -> str | None:
     """Try to infer an image URL from the HTML metadata of ``page_url``."""
@@ -99,27 +348,6 @@ def infer_image_url(page_url: str) -> str | None:
     if not page_url:
         return None
     try:
-        resp = requests.get(
-            page_url,
-            timeout=5,
-            headers={"User-Agent": "GiftListBot/1.0 (+https://example.com)"},
-        )
-        resp.raise_for_status()
+        return probe_image_url(page_url)
     except requests.RequestException:
         return None
-
-    content_type = resp.headers.get("Content-Type", "").lower()
-    if "html" not in content_type:
-        return None
-
-    parser = _ImageMetaParser()
-    try:
-        parser.feed(resp.text)
-        parser.close()
-    except Exception:
-        return None
-
-    if not parser.image_url:
-        return None
-
-    return urljoin(resp.url, parser.image_url)
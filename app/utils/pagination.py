@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+from ..extensions import db
+
+
+@dataclass
+class KeysetPage:
+    items: List[Any]
+    next_cursor: Optional[str]
+    cursor: Optional[str]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self) -> bool:
+        return self.cursor is None
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    raw = f"{sort_value.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Decode a cursor produced by :func:`encode_cursor`; garbage yields ``None``."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        sort_value, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(
+    stmt: Select,
+    sort_column,
+    id_column,
+    cursor: Optional[str],
+    per_page: int,
+    descending: bool = True,
+    scalars: bool = True,
+) -> KeysetPage:
+    """Fetch the page of ``stmt`` that follows ``cursor`` ordered by ``(sort_column, id_column)``.
+
+    The seek predicate is a row-value comparison on the same pair the query is
+    ordered by, so a composite index on ``(..., sort_column, id_column)`` serves
+    every page with a range scan of ``per_page + 1`` rows however deep it is.
+    Items must expose the two columns as attributes (ORM entities, or labelled
+    rows whose labels match the column keys).
+    """
+
+    position = decode_cursor(cursor)
+    key = tuple_(sort_column, id_column)
+    if position is not None:
+        stmt = stmt.where(key < position if descending else key > position)
+    if descending:
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+    else:
+        stmt = stmt.order_by(sort_column.asc(), id_column.asc())
+    stmt = stmt.limit(per_page + 1)
+
+    result = db.session.scalars(stmt) if scalars else db.session.execute(stmt)
+    items = list(result)
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return KeysetPage(items=items, next_cursor=next_cursor, cursor=cursor if position is not None else None)
@@ -1,29 +1,161 @@
 from __future__ import annotations
 
+import os
+import sqlite3
+import threading
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict
 from functools import wraps
-from typing import Callable, Deque, Dict
+from typing import Callable, List, Optional, Protocol, Tuple
 
 from flask import current_app, request
 from werkzeug.exceptions import TooManyRequests
 
+# (window index, hits in that window, hits in the window before it)
+WindowState = Tuple[int, int, int]
 
-class InMemoryRateLimiter:
-    def __init__(self) -> None:
-        self._requests: Dict[str, Deque[float]] = defaultdict(deque)
 
-    def check(self, key: str, limit: int, window: int) -> None:
-        now = time.time()
-        bucket = self._requests[key]
-        while bucket and now - bucket[0] > window:
-            bucket.popleft()
-        if len(bucket) >= limit:
+def sliding_window_hit(state: Optional[WindowState], now: float, limit: int, window: int) -> Tuple[WindowState, bool]:
+    """Apply one request to a sliding-window counter; return the new state and whether it is allowed.
+
+    The previous fixed window's count is weighted by how much of it still
+    overlaps the trailing ``window`` seconds, which approximates a true
+    sliding log with three integers per key. Rejected requests are not
+    counted, so a client that backs off recovers on schedule.
+    """
+
+    index = int(now // window)
+    current = previous = 0
+    if state is not None:
+        last_index, last_current, last_previous = state
+        if last_index == index:
+            current, previous = last_current, last_previous
+        elif last_index == index - 1:
+            previous = last_current
+    overlap = 1 - (now % window) / window
+    allowed = previous * overlap + current < limit
+    if allowed:
+        current += 1
+    return (index, current, previous), allowed
+
+
+class RateLimitStore(Protocol):
+    def hit(self, key: str, limit: int, window: int, now: float) -> bool:
+        ...
+
+
+class MemoryRateLimitStore:
+    """Per-process store: a bounded LRU of window counters.
+
+    Keys whose last hit is more than two windows old carry no weight and are
+    dropped as they are found at the cold end of the LRU; ``max_keys`` caps
+    memory even under a flood of distinct clients.
+    """
+
+    def __init__(self, max_keys: int = 10_000) -> None:
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, WindowState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> bool:
+        with self._lock:
+            state, allowed = sliding_window_hit(self._windows.get(key), now, limit, window)
+            self._windows[key] = state
+            self._windows.move_to_end(key)
+            self._evict(int(now // window) - 1)
+            return allowed
+
+    def _evict(self, oldest_live_index: int) -> None:
+        while self._windows:
+            key, (index, _, _) = next(iter(self._windows.items()))
+            if len(self._windows) <= self.max_keys and index >= oldest_live_index:
+                break
+            del self._windows[key]
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+
+class SQLiteRateLimitStore:
+    """Store shared by every worker process on the host through one SQLite file.
+
+    Each hit is a single ``BEGIN IMMEDIATE`` transaction, so concurrent
+    workers serialise on the file lock and see each other's counts. Rows
+    idle for two windows are purged every ``purge_interval`` seconds.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 60.0) -> None:
+        self.path = path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, "
+                "current INTEGER NOT NULL, previous INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> bool:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_index, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            state, allowed = sliding_window_hit(tuple(row) if row else None, now, limit, window)
+            conn.execute(
+                "INSERT INTO rate_limits (key, window_index, current, previous, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET window_index = excluded.window_index, current = excluded.current, "
+                "previous = excluded.previous, updated_at = excluded.updated_at",
+                (key, *state, now),
+            )
+            if now - self._last_purge > self.purge_interval:
+                self._last_purge = now
+                conn.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - 2 * window,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def keys(self) -> List[str]:
+        return [row[0] for row in self._connection().execute("SELECT key FROM rate_limits ORDER BY key")]
+
+
+class RateLimiter:
+    def __init__(self, store: RateLimitStore) -> None:
+        self.store = store
+
+    def check(self, key: str, limit: int, window: int, now: Optional[float] = None) -> None:
+        if not self.store.hit(key, limit, window, time.time() if now is None else now):
             raise TooManyRequests("Too many requests, please try again later.")
-        bucket.append(now)
 
 
-limiter = InMemoryRateLimiter()
+def get_limiter() -> RateLimiter:
+    """Return the current app's limiter, built from ``RATELIMIT_BACKEND`` on first use."""
+
+    holder = current_app.extensions.setdefault("giftlist.rate_limit", {})
+    limiter = holder.get("limiter")
+    if limiter is None:
+        config = current_app.config
+        backend = config.get("RATELIMIT_BACKEND", "memory")
+        if backend == "sqlite":
+            store: RateLimitStore = SQLiteRateLimitStore(config["RATELIMIT_STORAGE_PATH"])
+        elif backend == "memory":
+            store = MemoryRateLimitStore(max_keys=config.get("RATELIMIT_MAX_KEYS", 10_000))
+        else:
+            raise RuntimeError(f"Unknown RATELIMIT_BACKEND {backend!r}")
+        limiter = holder.setdefault("limiter", RateLimiter(store))
+    return limiter
 
 
 def limit_auth_route(func: Callable):
@@ -32,7 +164,7 @@ def limit_auth_route(func: Callable):
         window = current_app.config.get("RATELIMIT_WINDOW_SECONDS", 60)
         limit = current_app.config.get("RATELIMIT_AUTH", 5)
         key = f"auth:{request.remote_addr or 'unknown'}:{request.endpoint}"
-        limiter.check(key, limit, window)
+        get_limiter().check(key, limit, window)
         return func(*args, **kwargs)
 
     return wrapper
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import mimetypes
+import os
+import zlib
+from pathlib import Path
+from urllib.parse import quote
+
+from flask import Response, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+SEND_MODES = {"python", "x-accel-redirect", "x-sendfile"}
+
+
+def check_send_mode(mode: str) -> str:
+    """Return ``mode`` if it is a known ``UPLOADS_SEND_MODE``; a typo must not serve empty bodies."""
+
+    if mode not in SEND_MODES:
+        raise RuntimeError(f"Unknown UPLOADS_SEND_MODE {mode!r}; expected one of {', '.join(sorted(SEND_MODES))}")
+    return mode
+
+
+def _etag(path: Path, stat: os.stat_result) -> str:
+    # Stored files are never rewritten under the same name, so identity,
+    # size and mtime pin the bytes without hashing the file on every hit.
+    checksum = zlib.adler32(str(path).encode("utf-8")) & 0xFFFFFFFF
+    return f"{int(stat.st_mtime)}-{stat.st_size}-{checksum}"
+
+
+def send_immutable_file(root: Path, relative: str, max_age: int | None = None, immutable: bool = True) -> Response:
+    """Serve ``root/relative`` as an immutable, far-future cacheable asset.
+
+    ``UPLOADS_SEND_MODE`` picks who moves the bytes: ``python`` streams the file
+    from this worker (with Range support), ``x-accel-redirect`` hands it to
+    nginx under ``UPLOADS_ACCEL_PREFIX`` and ``x-sendfile`` to Apache/lighttpd.
+    In every mode a matching ``If-None-Match`` is answered with a 304 from a
+    single ``stat`` call, before the file is opened. Files whose bytes may
+    change under the same URL pass ``immutable=False`` and a shorter ``max_age``.
+    """
+
+    joined = safe_join(str(root), relative)
+    if joined is None:
+        abort(404)
+    path = Path(joined)
+    try:
+        stat = path.stat()
+    except OSError:
+        abort(404)
+    if not path.is_file():
+        abort(404)
+
+    config = current_app.config
+    mode = check_send_mode(config.get("UPLOADS_SEND_MODE", "python"))
+    if max_age is None:
+        max_age = config.get("UPLOADS_MAX_AGE", 365 * 24 * 3600)
+    etag = _etag(path, stat)
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+    elif mode == "python":
+        response = send_file(path, conditional=True, etag=etag, max_age=max_age)
+    else:
+        response = current_app.response_class(mimetype=mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+        if mode == "x-accel-redirect":
+            prefix = config.get("UPLOADS_ACCEL_PREFIX", "/_uploads/").rstrip("/")
+            response.headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative)}"
+        else:
+            response.headers["X-Sendfile"] = str(path.resolve())
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response = response.make_conditional(request)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    return response
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def upsert_insert(connection, model):
+    """An ``INSERT`` for ``model`` that supports ``on_conflict_do_*`` on ``connection``'s dialect.
+
+    PostgreSQL and SQLite (3.24+) share the ``ON CONFLICT`` syntax; every
+    other dialect is handed the SQLite construct and will fail loudly.
+    """
+
+    if connection.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
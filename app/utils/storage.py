@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from flask import current_app
+
+HASH_CHUNK_SIZE = 1024 * 1024
+_CONTENT_PATH_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def upload_root() -> Path:
+    folder = Path(current_app.config["UPLOAD_FOLDER"])
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+
+def temp_upload_path(prefix: str) -> Path:
+    """Create an empty temp file inside the upload folder (same filesystem as its target)."""
+
+    fd, name = tempfile.mkstemp(dir=upload_root(), prefix=prefix, suffix=".part")
+    os.close(fd)
+    return Path(name)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_path(digest: str, extension: str) -> str:
+    """Relative storage path for content hashed to ``digest``: ``ab/cd/abcd….ext``."""
+
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+
+def is_content_addressed(relative: str) -> bool:
+    return bool(_CONTENT_PATH_RE.match(relative or ""))
+
+
+def _touch(path: Path) -> None:
+    # A duplicate is about to gain a reference; restart its grace period so the
+    # upload collector cannot remove it between now and the referencing commit.
+    # Only atime is set (which bumps ctime); mtime feeds the served ETag.
+    try:
+        os.utime(path, (time.time(), path.stat().st_mtime))
+    except FileNotFoundError:
+        pass
+
+
+def store_file(tmp_path: Path, extension: str, digest: str | None = None) -> str:
+    """Move a validated temp file into content-addressed storage.
+
+    Identical bytes always land on the same path, so a duplicate upload just
+    discards its temp file. The rename is atomic, so readers never observe a
+    partially written file. Returns the path relative to the upload folder.
+    """
+
+    digest = digest or file_digest(tmp_path)
+    relative = content_path(digest, extension)
+    target = upload_root() / relative
+    if target.exists():
+        tmp_path.unlink(missing_ok=True)
+        _touch(target)
+        return relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, target)
+    return relative
+
+
+def store_bytes(data: bytes, extension: str) -> str:
+    """Write validated ``data`` into content-addressed storage; return its relative path.
+
+    A duplicate is detected from the hash before anything is written. New
+    content goes to a temp file beside its target and is renamed into place.
+    """
+
+    relative = content_path(hashlib.sha256(data).hexdigest(), extension)
+    target = upload_root() / relative
+    if target.exists():
+        _touch(target)
+        return relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=target.parent, prefix=".store-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(name, target)
+    except BaseException:
+        Path(name).unlink(missing_ok=True)
+        raise
+    return relative
@@ -0,0 +1,129 @@
+"""Compare full-page vs head-only image inference over large product pages.
+
+Usage::
+
+    python benchmarks/bench_head_parse.py [--fixtures DIR] [--rounds N]
+
+Every ``*.html`` file in the fixtures directory is served from a local HTTP
+server and probed both ways. Drop saved retailer pages into the directory to
+benchmark real markup; synthetic 1-3 MB pages are generated when it is empty.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import create_app  # noqa: E402
+from app.utils.http import get_http_client  # noqa: E402
+from app.utils.images import _ImageMetaParser, probe_page  # noqa: E402
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def _synthetic_page(body_bytes: int, with_image: bool) -> bytes:
+    head = ["<!doctype html><html><head><meta charset='utf-8'><title>LEGO Millennium Falcon 75192</title>"]
+    head += [f"<link rel='preload' href='/static/chunk-{i}.js' as='script'>" for i in range(60)]
+    head.append("<script>window.__CONFIG__ = {" + ",".join(f'"k{i}": {i}' for i in range(400)) + "};</script>")
+    if with_image:
+        head.append("<meta property='og:image' content='https://cdn.example.com/75192.jpg'>")
+    head.append("</head><body>")
+    row = "<div class='tile'><a href='/p/{0}'>Product {0}</a><span class='price'>$19.99</span></div>\n"
+    body, index = [], 0
+    size = 0
+    while size < body_bytes:
+        chunk = row.format(index)
+        body.append(chunk)
+        size += len(chunk)
+        index += 1
+    return ("".join(head) + "".join(body) + "</body></html>").encode()
+
+
+def ensure_fixtures(directory: Path) -> list[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    pages = sorted(directory.glob("*.html"))
+    if pages:
+        return pages
+    for name, size, with_image in [
+        ("retail_1mb.html", 1 << 20, True),
+        ("retail_3mb.html", 3 << 20, True),
+        ("retail_2mb_no_og.html", 2 << 20, False),
+    ]:
+        (directory / name).write_bytes(_synthetic_page(size, with_image))
+    return sorted(directory.glob("*.html"))
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        return None
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # The head-only probe hangs up mid-body on purpose.
+        return None
+
+
+def legacy_probe(url: str) -> tuple[str | None, int]:
+    """The pre-streaming behaviour: download everything, then parse everything."""
+    resp = get_http_client().get(url)
+    parser = _ImageMetaParser()
+    parser.feed(resp.text)
+    parser.close()
+    return parser.image_url, len(resp.content)
+
+
+def streaming_probe(url: str) -> tuple[str | None, int]:
+    probe = probe_page(url)
+    return probe.image_url, probe.bytes_read
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = ensure_fixtures(args.fixtures)
+    handler = functools.partial(_QuietHandler, directory=str(args.fixtures))
+    server = _QuietServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    app = create_app("testing")
+    with app.app_context():
+        print(f"{'fixture':<26}{'size':>10}{'full KiB':>10}{'head KiB':>10}{'full ms':>10}{'head ms':>10}{'same':>6}")
+        for page in pages:
+            url = f"{base}/{page.name}"
+            results = {}
+            for label, probe in (("full", legacy_probe), ("head", streaming_probe)):
+                timings = []
+                for _ in range(args.rounds):
+                    started = time.perf_counter()
+                    image_url, read = probe(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                results[label] = (image_url, read, statistics.median(timings))
+            same = results["full"][0] == results["head"][0]
+            print(
+                f"{page.name:<26}{os.path.getsize(page) // 1024:>9}K"
+                f"{results['full'][1] / 1024:>10.0f}{results['head'][1] / 1024:>10.1f}"
+                f"{results['full'][2]:>10.1f}{results['head'][2]:>10.1f}{'yes' if same else 'NO':>6}"
+            )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Measure login throughput against password hash cost.
+
+Usage::
+
+    python benchmarks/bench_password_hashing.py [--threads N] [--seconds S]
+
+For each hash method a user is created and logged in repeatedly through the
+test client (one full request per login), then ``--threads`` threads verify
+the same password through the bounded hasher at once, which shows how many
+logins per second one worker process can sustain at that cost.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import create_app, db  # noqa: E402
+from app.models import User  # noqa: E402
+from app.services.passwords import get_password_hasher  # noqa: E402
+
+METHODS = ["pbkdf2:sha256:1000", "pbkdf2:sha256:260000", "pbkdf2:sha256:600000", "scrypt:16384:8:1", "scrypt:32768:8:1"]
+
+
+def login_ms(app, rounds: int) -> float:
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        response = client.post("/login", data={"email": "bench@example.com", "password": "password123"})
+        assert response.status_code == 302, response.status_code
+        client.get("/logout")
+    return (time.perf_counter() - started) * 1000 / rounds
+
+
+def concurrent_verifies(app, threads: int, seconds: float) -> float:
+    with app.app_context():
+        hasher = get_password_hasher()
+        password_hash = db.session.scalar(db.select(User.password_hash))
+    done = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int) -> None:
+        while time.perf_counter() < deadline:
+            hasher.verify(password_hash, "password123")
+            done[index] += 1
+
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(done) / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'method':<24}{'login ms':>10}{'verifies/s':>12}")
+    for method in METHODS:
+        app = create_app("testing")
+        app.config["PASSWORD_HASH_METHOD"] = method
+        with app.app_context():
+            user = User(email="bench@example.com", name="Bench")
+            user.set_password("password123")
+            db.session.add(user)
+            db.session.commit()
+        per_login = login_ms(app, args.rounds)
+        throughput = concurrent_verifies(app, args.threads, args.seconds)
+        print(f"{method:<24}{per_login:>10.1f}{throughput:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
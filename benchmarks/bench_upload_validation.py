@@ -0,0 +1,103 @@
+"""Compare disk-first vs in-memory validation of image uploads.
+
+Usage::
+
+    python benchmarks/bench_upload_validation.py [--rounds N]
+
+Each case is pushed through the previous ``save_upload`` flow (write the
+upload to disk, stat it, reopen it for ``verify()``, delete on failure) and
+through the current one (validate the stream, write only accepted bytes).
+Uploads go to a throwaway directory, and every round uses distinct bytes so
+content-addressed deduplication does not skip the write.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import create_app  # noqa: E402
+from app.utils.images import IMAGE_EXTENSIONS, _validate_image, save_upload, sniff_image_type  # noqa: E402
+from app.utils.storage import store_file, temp_upload_path  # noqa: E402
+
+
+def _jpeg(size: tuple[int, int]) -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def cases() -> list[tuple[str, bytes]]:
+    valid = _jpeg((1200, 900))
+    return [
+        ("valid jpeg", valid),
+        ("not an image", b"%PDF-1.7\n" + bytes(len(valid))),
+        ("corrupt png", b"\x89PNG\r\n\x1a\n" + bytes(len(valid))),
+        ("oversized", b"\xff\xd8\xff" + bytes(3 * 1024 * 1024)),
+    ]
+
+
+def legacy_save_upload(file: FileStorage) -> str:
+    """The pre-change flow: save to disk first, validate the file, clean up on failure."""
+    tmp_path = temp_upload_path(".upload-")
+    try:
+        file.stream.seek(0)
+        file.save(tmp_path)
+        _validate_image(tmp_path)
+        with open(tmp_path, "rb") as handle:
+            sniffed = sniff_image_type(handle.read(12))
+        if sniffed is None:
+            raise ValueError("Unsupported image type")
+        return store_file(tmp_path, IMAGE_EXTENSIONS[sniffed])
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _unique(data: bytes) -> bytes:
+    # Bytes after a JPEG's end-of-image marker are ignored by decoders.
+    return data + uuid.uuid4().bytes if data.startswith(b"\xff\xd8\xff") else data
+
+
+def run(save, data: bytes, rounds: int) -> tuple[float, str]:
+    timings = []
+    outcome = "stored"
+    for _ in range(rounds):
+        upload = FileStorage(stream=io.BytesIO(_unique(data)), filename="upload.jpg")
+        started = time.perf_counter()
+        try:
+            save(upload)
+        except ValueError as exc:
+            outcome = str(exc)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    with tempfile.TemporaryDirectory() as folder, app.app_context():
+        app.config["UPLOAD_FOLDER"] = folder
+        print(f"{'case':<16}{'size':>10}{'disk ms':>10}{'memory ms':>11}  outcome")
+        for name, data in cases():
+            legacy_ms, outcome = run(legacy_save_upload, data, args.rounds)
+            memory_ms, _ = run(save_upload, data, args.rounds)
+            print(f"{name:<16}{len(data) // 1024:>9}K{legacy_ms:>10.2f}{memory_ms:>11.2f}  {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,9 +22,60 @@ class BaseConfig:
     WTF_CSRF_TIME_LIMIT = None
     UPLOAD_FOLDER = get_upload_folder()
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 2 * 1024 * 1024))  # 2MB default
+    UPLOADS_SEND_MODE = os.getenv("UPLOADS_SEND_MODE", "python")  # python | x-accel-redirect | x-sendfile
+    UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/_uploads/")
+    UPLOADS_MAX_AGE = int(os.getenv("UPLOADS_MAX_AGE", 365 * 24 * 3600))
+    UPLOADS_GC_GRACE_SECONDS = int(os.getenv("UPLOADS_GC_GRACE_SECONDS", 24 * 3600))
+    UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", 40_000_000))
+    UPLOAD_REENCODE = os.getenv("UPLOAD_REENCODE", "false").lower() in {"1", "true", "yes"}
+    UPLOAD_MAX_DIMENSION = int(os.getenv("UPLOAD_MAX_DIMENSION", 2048))
+    UPLOAD_REENCODE_QUALITY = int(os.getenv("UPLOAD_REENCODE_QUALITY", 85))
+    IMAGE_DERIVATIVE_WIDTHS = tuple(int(w) for w in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,960").split(","))
+    IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", 80))
+    IMAGE_PROXY_CACHE_BYTES = int(os.getenv("IMAGE_PROXY_CACHE_BYTES", 256 * 1024 * 1024))
+    IMAGE_PROXY_MAX_AGE = int(os.getenv("IMAGE_PROXY_MAX_AGE", 24 * 3600))
+    IMAGE_PROXY_FAILURE_TTL_SECONDS = int(os.getenv("IMAGE_PROXY_FAILURE_TTL_SECONDS", 300))
     ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
     RATELIMIT_AUTH = int(os.getenv("RATELIMIT_AUTH", 5))
     RATELIMIT_WINDOW_SECONDS = int(os.getenv("RATELIMIT_WINDOW_SECONDS", 60))
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", 0))  # 0 = one per CPU
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 0))  # 0 = 4 per thread
+    PASSWORD_HASH_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", 10))
+    IDENTITY_CACHE_TTL_SECONDS = int(os.getenv("IDENTITY_CACHE_TTL_SECONDS", 30))
+    IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", 4096))
+    IDENTITY_INVALIDATION_PATH = os.getenv("IDENTITY_INVALIDATION_PATH", str(BASE_DIR / "identity.stamp"))
+    RATELIMIT_BACKEND = os.getenv("RATELIMIT_BACKEND", "memory")  # memory | sqlite
+    RATELIMIT_STORAGE_PATH = os.getenv("RATELIMIT_STORAGE_PATH", str(BASE_DIR / "ratelimit.sqlite3"))
+    RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", 10_000))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 5))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+    HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 4))
+    HTTP_HOST_WAIT_SECONDS = float(os.getenv("HTTP_HOST_WAIT_SECONDS", 5))
+    HTTP_ALLOW_PRIVATE_ADDRESSES = os.getenv("HTTP_ALLOW_PRIVATE_ADDRESSES", "false").lower() in {"1", "true", "yes"}
+    IMAGE_INFERENCE_TTL_SECONDS = int(os.getenv("IMAGE_INFERENCE_TTL_SECONDS", 24 * 3600))
+    IMAGE_INFERENCE_NEGATIVE_TTL_SECONDS = int(os.getenv("IMAGE_INFERENCE_NEGATIVE_TTL_SECONDS", 3600))
+    IMAGE_INFERENCE_MAX_BYTES = int(os.getenv("IMAGE_INFERENCE_MAX_BYTES", 256 * 1024))
+    IMAGE_INFERENCE_LRU_SIZE = int(os.getenv("IMAGE_INFERENCE_LRU_SIZE", 2048))
+    JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", 2))
+    JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 1.0))
+    JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 5))
+    JOBS_BACKOFF_SECONDS = int(os.getenv("JOBS_BACKOFF_SECONDS", 30))
+    JOBS_BACKOFF_MAX_SECONDS = int(os.getenv("JOBS_BACKOFF_MAX_SECONDS", 3600))
+    JOBS_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOBS_LOCK_TIMEOUT_SECONDS", 300))
+    GIFTS_PER_PAGE = int(os.getenv("GIFTS_PER_PAGE", 48))
+    GIFTS_IMPORT_BATCH_SIZE = int(os.getenv("GIFTS_IMPORT_BATCH_SIZE", 500))
+    GIFTS_IMPORT_MAX_ROWS = int(os.getenv("GIFTS_IMPORT_MAX_ROWS", 5000))
+    GIFT_LIST_CACHE_TTL_SECONDS = int(os.getenv("GIFT_LIST_CACHE_TTL_SECONDS", 60))
+    GIFT_LIST_CACHE_SIZE = int(os.getenv("GIFT_LIST_CACHE_SIZE", 1024))
+    GIFT_LIST_INVALIDATION_PATH = os.getenv("GIFT_LIST_INVALIDATION_PATH", str(BASE_DIR / "gift_lists.stamp"))
+    PURCHASES_PER_PAGE = int(os.getenv("PURCHASES_PER_PAGE", 50))
+    PURCHASE_CLAIM_MAX_GIFTS = int(os.getenv("PURCHASE_CLAIM_MAX_GIFTS", 100))
+    USERS_PER_PAGE = int(os.getenv("USERS_PER_PAGE", 50))
+    API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 200))
+    API_GZIP_MIN_BYTES = int(os.getenv("API_GZIP_MIN_BYTES", 1024))
+    USERS_TYPEAHEAD_LIMIT = int(os.getenv("USERS_TYPEAHEAD_LIMIT", 8))
 
 
 class DevelopmentConfig(BaseConfig):
@@ -40,3 +91,8 @@ class TestingConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     WTF_CSRF_ENABLED = False
     RATELIMIT_AUTH = 1000
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    IDENTITY_INVALIDATION_PATH = None
+    GIFT_LIST_INVALIDATION_PATH = None
+    # The test HTTP server listens on loopback.
+    HTTP_ALLOW_PRIVATE_ADDRESSES = True
@@ -0,0 +1,49 @@
+"""add user directory search structures"""
+
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Frozen copies of the statements in app/services/search.py as of this
+# revision, so later changes to the app never rewrite an applied migration.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "name, email, content='users', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF name, email ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); "
+    "INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS users_fts_au",
+    "DROP TRIGGER IF EXISTS users_fts_ad",
+    "DROP TRIGGER IF EXISTS users_fts_ai",
+    "DROP TABLE IF EXISTS users_fts",
+]
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users "
+    "USING gin ((lower(name) || ' ' || lower(email)) gin_trgm_ops)",
+]
+POSTGRES_DROP_DDL = ["DROP INDEX IF EXISTS ix_users_search_trgm"]
+
+
+def _run(statements_by_dialect) -> None:
+    bind = op.get_bind()
+    for statement in statements_by_dialect.get(bind.dialect.name, []):
+        bind.exec_driver_sql(statement)
+
+
+def upgrade() -> None:
+    _run({"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL})
+
+
+def downgrade() -> None:
+    _run({"sqlite": SQLITE_DROP_DDL, "postgresql": POSTGRES_DROP_DDL})
@@ -0,0 +1,65 @@
+"""store a unique username slug on users"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# Frozen copies of app.models.slug_base and the SQLite search triggers as of
+# this revision, so later changes to the app never rewrite an applied migration.
+_SLUG_INVALID_RE = re.compile(r"[^a-z0-9._-]+")
+SQLITE_SEARCH_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF name, email ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); "
+    "INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+]
+
+
+def slug_base(email: str) -> str:
+    local_part = (email or "").split("@")[0].lower()
+    return _SLUG_INVALID_RE.sub("-", local_part).strip("-.") or "user"
+
+
+def _restore_search_triggers(bind) -> None:
+    # SQLite batch mode rebuilds the table, which drops the search triggers.
+    if bind.dialect.name == "sqlite":
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            bind.exec_driver_sql(statement)
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("slug", sa.String(length=255), nullable=True))
+
+    users = sa.table("users", sa.column("id", sa.Integer), sa.column("email", sa.String), sa.column("slug", sa.String))
+    bind = op.get_bind()
+    taken: set[str] = set()
+    # Oldest account keeps the bare local part, matching the old resolver.
+    rows = bind.execute(sa.select(users.c.id, users.c.email).order_by(users.c.id)).all()
+    for user_id, email in rows:
+        base = slug_base(email)
+        slug, suffix = base, 2
+        while slug in taken:
+            slug, suffix = f"{base}-{suffix}", suffix + 1
+        taken.add(slug)
+        bind.execute(users.update().where(users.c.id == user_id).values(slug=slug))
+
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column("slug", existing_type=sa.String(length=255), nullable=False)
+        batch_op.create_unique_constraint("uq_users_slug", ["slug"])
+    _restore_search_triggers(bind)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_constraint("uq_users_slug", type_="unique")
+        batch_op.drop_column("slug")
+    _restore_search_triggers(op.get_bind())
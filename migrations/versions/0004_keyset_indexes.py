@@ -0,0 +1,18 @@
+"""add composite indexes backing keyset pagination"""
+
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_gifts_owner_created", "gifts", ["owner_id", "created_at", "id"])
+    op.create_index("ix_purchases_buyer_purchased", "purchases", ["buyer_id", "purchased_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_purchases_buyer_purchased", table_name="purchases")
+    op.drop_index("ix_gifts_owner_created", table_name="gifts")
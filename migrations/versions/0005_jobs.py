@@ -0,0 +1,32 @@
+"""add background job queue"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(length=64), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="queued"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column("run_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("locked_at", sa.DateTime()),
+        sa.Column("last_error", sa.Text()),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=True, server_default=sa.func.now()),
+    )
+    op.create_index("ix_jobs_status_run_at", "jobs", ["status", "run_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_status_run_at", table_name="jobs")
+    op.drop_table("jobs")
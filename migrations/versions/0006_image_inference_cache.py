@@ -0,0 +1,27 @@
+"""add shared cache for product-page image inference"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "image_inference_cache",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("url_key", sa.String(length=64), nullable=False, unique=True),
+        sa.Column("page_url", sa.String(length=2048), nullable=False),
+        sa.Column("image_url", sa.String(length=512)),
+        sa.Column("etag", sa.String(length=255)),
+        sa.Column("last_modified", sa.String(length=64)),
+        sa.Column("fetched_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("image_inference_cache")
@@ -0,0 +1,31 @@
+"""add reference counts for content-addressed upload storage"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stored_files",
+        sa.Column("path", sa.String(length=512), primary_key=True),
+        sa.Column("size", sa.BigInteger()),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=True, server_default=sa.func.now()),
+    )
+    # Count what existing gifts already point at; `flask uploads-migrate` then
+    # moves those legacy files into content-addressed storage.
+    op.execute(
+        "INSERT INTO stored_files (path, ref_count) "
+        "SELECT image_path, COUNT(*) FROM gifts WHERE image_path IS NOT NULL AND image_path <> '' "
+        "GROUP BY image_path"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stored_files")
@@ -0,0 +1,16 @@
+"""index gifts.image_path for the upload garbage collector"""
+
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_gifts_image_path", "gifts", ["image_path"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_gifts_image_path", table_name="gifts")
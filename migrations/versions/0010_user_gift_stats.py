@@ -0,0 +1,31 @@
+"""add user_gift_stats, per-user gift totals maintained on every gift and purchase write"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_gift_stats",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("gift_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("purchased_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_price", sa.Numeric(12, 2), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=True, server_default=sa.func.now()),
+    )
+    # Same aggregate as `flask stats-rebuild`.
+    op.execute(
+        "INSERT INTO user_gift_stats (user_id, gift_count, purchased_count, total_price) "
+        "SELECT users.id, COUNT(gifts.id), COUNT(purchases.id), COALESCE(SUM(gifts.price), 0) "
+        "FROM users LEFT OUTER JOIN gifts ON gifts.owner_id = users.id "
+        "LEFT OUTER JOIN purchases ON purchases.gift_id = gifts.id GROUP BY users.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_gift_stats")
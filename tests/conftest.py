@@ -1,10 +1,14 @@
 import os
 import sys
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pytest
 from flask import Flask
+from sqlalchemy import event
 
 from app import create_app, db
 from app.models import Gift, Purchase, User
@@ -62,3 +66,81 @@ def create_user(email: str, password: str = 'password123', name: str = 'User') -
     db.session.add(user)
     db.session.commit()
     return user
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement issued on the app engine inside the block."""
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _record)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail when the wrapped block issues more than ``limit`` SQL statements."""
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        listing = "\n".join(f"  {i + 1}. {sql}" for i, sql in enumerate(statements))
+        pytest.fail(f"Expected at most {limit} queries, got {len(statements)}:\n{listing}")
+
+
+class StandInServer:
+    """Local HTTP server standing in for retailer sites and image CDNs.
+
+    ``routes`` maps a path to ``(status, headers, body)`` or to a callable that
+    receives the request handler and returns that tuple.
+    """
+
+    def __init__(self) -> None:
+        self.routes: dict = {}
+        self.requests: list = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):  # noqa: N802 - http.server naming
+                server.requests.append((self.path, dict(self.headers)))
+                route = server.routes.get(self.path.split("?")[0])
+                if route is None:
+                    route = (404, {"Content-Type": "text/plain"}, b"not found")
+                status, headers, body = route(self) if callable(route) else route
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if "Content-Length" not in headers:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                return None
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture()
+def http_server():
+    server = StandInServer()
+    yield server
+    server.close()
@@ -0,0 +1,110 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from tests.conftest import count_queries, create_gift, create_user, purchase_gift
+
+
+def _login(client, email):
+    client.get("/logout")
+    client.post("/login", data={"email": email, "password": "password123"}, follow_redirects=True)
+
+
+def _setup():
+    alice = create_user("alice@example.com", name="Alice")
+    bob = create_user("bob@example.com", name="Bob")
+    carol = create_user("carol@example.com", name="Carol")
+    start = datetime(2024, 1, 1)
+    gifts = [
+        create_gift(alice, title=f"Item-{index}", price=Decimal("5"), created_at=start + timedelta(minutes=index))
+        for index in range(5)
+    ]
+    purchase_gift(gifts[0], bob)
+    purchase_gift(gifts[1], carol)
+    return gifts
+
+
+def test_api_requires_login(client, app):
+    response = client.get("/api/v1/me/purchases")
+    assert response.status_code == 401
+    assert response.json == {"error": "Authentication required"}
+
+
+def test_guest_sees_purchase_state_and_owner_never_does(client, app):
+    _setup()
+    _login(client, "bob@example.com")
+    items = client.get("/api/v1/users/alice/gifts").json["items"]
+    assert [(item["purchased"], item["purchased_by_me"]) for item in items[:3]] == [
+        (True, True),
+        (True, False),
+        (False, False),
+    ]
+    assert "buyer_id" not in items[0]
+
+    _login(client, "alice@example.com")
+    payload = client.get("/api/v1/users/alice/gifts?fields=title,purchased,purchased_by_me").json
+    assert payload["items"][0] == {"title": "Item-0"}
+    assert all(set(item) == {"title"} for item in payload["items"])
+    full = client.get("/api/v1/users/alice/gifts").json["items"][0]
+    assert "purchased" not in full and full["price"] == "5.00" and full["created_at"] == "2024-01-01T00:00:00Z"
+
+
+def test_fields_select_only_requested_columns(client, app):
+    _setup()
+    _login(client, "bob@example.com")
+    client.get("/api/v1/users/alice/gifts")
+    with count_queries() as statements:
+        response = client.get("/api/v1/users/alice/gifts?fields=title,price")
+    assert response.json["items"][0] == {"title": "Item-0", "price": "5.00"}
+    gift_query = next(sql for sql in statements if "FROM gifts" in sql)
+    assert "gifts.notes" not in gift_query and "gifts.description" not in gift_query
+    assert "purchases" not in gift_query
+
+    response = client.get("/api/v1/users/alice/gifts?fields=title,buyer_id")
+    assert response.status_code == 400 and "buyer_id" in response.json["error"]
+    assert client.get("/api/v1/users/nobody/gifts").status_code == 404
+
+
+def test_keyset_pagination(client, app):
+    _setup()
+    _login(client, "bob@example.com")
+    seen, url = [], "/api/v1/users/alice/gifts?fields=title&limit=2"
+    while url:
+        payload = client.get(url).json
+        seen.extend(item["title"] for item in payload["items"])
+        cursor = payload["next_cursor"]
+        url = f"/api/v1/users/alice/gifts?fields=title&limit=2&cursor={cursor}" if cursor else None
+    assert seen == [f"Item-{index}" for index in range(5)]
+
+
+def test_etag_and_gzip(client, app):
+    app.config["API_GZIP_MIN_BYTES"] = 100
+    gifts = _setup()
+    _login(client, "bob@example.com")
+    first = client.get("/api/v1/users/alice/gifts", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in first.headers["Vary"]
+    assert json.loads(gzip.decompress(first.data))["items"][0]["title"] == "Item-0"
+
+    etag = first.headers["ETag"]
+    again = client.get("/api/v1/users/alice/gifts", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    plain = client.get("/api/v1/users/alice/gifts")
+    assert "Content-Encoding" not in plain.headers and plain.headers["ETag"] == etag
+
+    _login(client, "carol@example.com")
+    client.post(f"/gifts/{gifts[1].id}/unpurchase")
+    _login(client, "bob@example.com")
+    assert client.get("/api/v1/users/alice/gifts", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_my_purchases(client, app):
+    _setup()
+    _login(client, "bob@example.com")
+    payload = client.get("/api/v1/me/purchases?fields=gift_title,owner_username").json
+    assert payload == {"items": [{"gift_title": "Item-0", "owner_username": "alice"}], "next_cursor": None}
+    with count_queries() as statements:
+        ids = client.get("/api/v1/me/purchases?fields=id,gift_id").json["items"]
+    assert len(ids) == 1 and set(ids[0]) == {"id", "gift_id"}
+    assert not any("JOIN" in sql for sql in statements)
@@ -1,5 +1,17 @@
-from tests.conftest import create_user
+import os
+import threading
+
+import pytest
+from flask import g
+from werkzeug.security import generate_password_hash
+
+from app import models
+from app.extensions import db
 from app.models import User
+from app.services import passwords
+from app.services.identity import _identity_cache, identity_cache_stats
+from app.services.passwords import get_password_hasher
+from tests.conftest import count_queries, create_user
 
 
 def test_register_and_login(client, app):
@@ -23,6 +35,23 @@ def test_register_and_login(client, app):
     assert b"Logged in successfully" in response.data
 
 
+def test_register_retries_when_a_concurrent_sign_up_takes_the_slug(client, app, monkeypatch):
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    stale = iter(["alice"])
+    fresh = models.unique_slug
+    # The first pick is made before the other sign-up committed.
+    monkeypatch.setattr(models, "unique_slug", lambda *args: next(stale, None) or fresh(*args))
+
+    response = client.post(
+        "/register",
+        data={"name": "Alice Two", "email": "alice@other.example", "password": "password123", "confirm": "password123"},
+    )
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.filter_by(email="alice@other.example").one().slug == "alice-2"
+
+
 def test_login_failure(client, app):
     with app.app_context():
         create_user("alice@example.com", password="password123", name="Alice")
@@ -32,3 +61,150 @@ def test_login_failure(client, app):
         follow_redirects=True,
     )
     assert b"Invalid credentials" in response.data
+
+
+def test_login_upgrades_outdated_password_hash(client, app):
+    with app.app_context():
+        user = create_user("alice@example.com", name="Alice")
+        user.password_hash = generate_password_hash("password123", "pbkdf2:sha256:500")
+        db.session.commit()
+
+    response = client.post("/login", data={"email": "alice@example.com", "password": "wrong"})
+    with app.app_context():
+        assert User.query.one().password_hash.startswith("pbkdf2:sha256:500$")
+
+    response = client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.one().password_hash.startswith("pbkdf2:sha256:1000$")
+        assert User.query.one().check_password("password123")
+
+
+def test_password_hashing_sheds_load_when_saturated(client, app, monkeypatch):
+    app.config.update(PASSWORD_HASH_CONCURRENCY=1, PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_WAIT_SECONDS=0.01)
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+        hasher = get_password_hasher()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash(password, method):
+        started.set()
+        release.wait(5)
+        return generate_password_hash(password, method)
+
+    # Another sign-up holds the only slot while its hash runs.
+    monkeypatch.setattr(passwords, "generate_password_hash", slow_hash)
+    signup = threading.Thread(target=hasher.hash, args=("password123",))
+    signup.start()
+    try:
+        assert started.wait(5)
+        response = client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+        assert response.status_code == 503
+    finally:
+        release.set()
+        signup.join()
+    response = client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+    assert response.status_code == 302
+
+
+def test_password_hasher_inherited_across_fork_is_shut_down(app):
+    with app.app_context():
+        inherited = get_password_hasher()
+        holder = app.extensions["giftlist.passwords"]
+        holder[-1] = holder.pop(os.getpid())
+        assert get_password_hasher() is not inherited
+    with pytest.raises(RuntimeError):
+        inherited.hash("password123")
+
+
+def _user_lookups(statements):
+    return [sql for sql in statements if "FROM users" in sql and "users.id = " in sql]
+
+
+def _fresh(client, method, path, **kwargs):
+    # The app fixture keeps one app context open, so ``g`` (and Flask-Login's
+    # per-request user on it) would otherwise carry over between requests.
+    g.pop("_login_user", None)
+    return client.open(path, method=method, **kwargs)
+
+
+def _fresh_get(client, path):
+    return _fresh(client, "GET", path)
+
+
+def test_authenticated_requests_reuse_cached_identity(client, app):
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+
+    with count_queries() as statements:
+        assert _fresh_get(client, "/me/gifts").status_code == 200
+        db.session.remove()
+        assert _fresh_get(client, "/me/gifts").status_code == 200
+    assert len(_user_lookups(statements)) == 1
+    assert identity_cache_stats()["hits"] == 1
+
+    user = User.query.one()
+    user.name = "Alice Renamed"
+    db.session.commit()
+    db.session.remove()
+    assert b"Alice Renamed" in _fresh_get(client, "/me/gifts").data
+    assert identity_cache_stats()["misses"] == 2
+
+
+def test_password_change_ends_other_sessions(app):
+    first, second = app.test_client(), app.test_client()
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    for browser in (first, second):
+        _fresh(browser, "POST", "/login", data={"email": "alice@example.com", "password": "password123"})
+        assert _fresh_get(browser, "/me/gifts").status_code == 200
+
+    user = User.query.one()
+    user.set_password("new-password456")
+    db.session.commit()
+
+    assert _fresh_get(second, "/me/gifts").status_code == 302
+    _fresh(first, "POST", "/login", data={"email": "alice@example.com", "password": "new-password456"})
+    assert _fresh_get(first, "/me/gifts").status_code == 200
+
+
+def test_shared_invalidation_file_clears_other_workers(app, client, tmp_path):
+    marker = tmp_path / "identity.stamp"
+    app.config["IDENTITY_INVALIDATION_PATH"] = str(marker)
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+    _fresh_get(client, "/me/gifts")
+    db.session.remove()
+
+    # Another worker changed the user: only the marker file tells us.
+    marker.write_text("")
+    os.utime(marker, ns=(0, 123456789))
+    with count_queries() as statements:
+        _fresh_get(client, "/me/gifts")
+    assert len(_user_lookups(statements)) == 1
+
+
+def test_identity_is_forgotten_only_once_the_change_commits(app, tmp_path):
+    marker = tmp_path / "identity.stamp"
+    app.config["IDENTITY_INVALIDATION_PATH"] = str(marker)
+    browser = app.test_client()
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    _fresh(browser, "POST", "/login", data={"email": "alice@example.com", "password": "password123"})
+    assert _fresh_get(browser, "/me/gifts").status_code == 200
+
+    user = User.query.one()
+    old_key = (user.id, user.session_version)
+    stale = _identity_cache().get(old_key)
+    user.set_password("new-password456")
+    db.session.flush()
+    assert not marker.exists()
+    # A concurrent request still reads the committed (old) row and caches it.
+    _identity_cache().set(old_key, stale)
+    db.session.commit()
+
+    assert marker.exists()
+    assert _identity_cache().get(old_key) is None
+    assert _fresh_get(browser, "/me/gifts").status_code == 302
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+from app.extensions import db
+from app.models import Gift, Job, UserGiftStats
+from app.services.gift_images import INFER_GIFT_IMAGE
+from tests.conftest import count_queries, create_gift, create_user
+
+
+def _login(client):
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+
+
+def _csv(rows, header=("title", "description", "url", "image_url", "price", "notes")):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def test_export_streams_csv_and_json(client, app):
+    alice = create_user("alice@example.com", name="Alice")
+    bob = create_user("bob@example.com", name="Bob")
+    create_gift(alice, title="Kite", price=Decimal("12.50"), url="https://example.com/kite")
+    create_gift(alice, title='Board game, "deluxe"', notes="line one\nline two")
+    create_gift(bob, title="Not mine")
+    _login(client)
+
+    response = client.get("/me/gifts/export.csv")
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    assert 'filename="alice-gifts.csv"' in response.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["title"] for row in rows] == ["Kite", 'Board game, "deluxe"']
+    assert rows[0]["price"] == "12.50" and rows[1]["notes"] == "line one\nline two"
+
+    payload = json.loads(client.get("/me/gifts/export.json").data)
+    assert [item["title"] for item in payload] == ["Kite", 'Board game, "deluxe"']
+    assert payload[0]["price"] == "12.50" and payload[1]["price"] is None
+
+    assert client.get("/me/gifts/export.xml").status_code == 404
+
+
+def test_import_validates_batches_and_queues_inference(client, app):
+    app.config["GIFTS_IMPORT_BATCH_SIZE"] = 400
+    alice = create_user("alice@example.com", name="Alice")
+    rows = [(f"Gift {index}", "", f"https://shop.example.com/{index}", "", "2.50", "") for index in range(1000)]
+    rows[10] = ("", "", "", "", "", "")
+    rows[20] = ("Bad link", "", "ftp://example.com/x", "", "", "")
+    rows[30] = ("Has image", "", "https://shop.example.com/img", "https://cdn.example.com/x.jpg", "abc", "")
+    _login(client)
+
+    with count_queries() as statements:
+        response = client.post(
+            "/me/gifts/import",
+            data={"file": (io.BytesIO(_csv(rows)), "wishlist.csv")},
+            content_type="multipart/form-data",
+            follow_redirects=True,
+        )
+    body = response.get_data(as_text=True)
+    assert "Imported 997 gift(s)" in body
+    assert "Skipped 3 row(s)" in body and "row 11: title" in body and "row 21: url" in body
+
+    gift_inserts = [sql for sql in statements if sql.startswith("INSERT INTO gifts")]
+    assert 1 <= len(gift_inserts) <= 6
+    assert db.session.scalar(db.select(db.func.count(Gift.id)).where(Gift.owner_id == alice.id)) == 997
+    jobs = db.session.scalar(db.select(db.func.count(Job.id)).where(Job.kind == INFER_GIFT_IMAGE))
+    assert jobs == 997
+
+    stats = db.session.get(UserGiftStats, alice.id)
+    db.session.refresh(stats)
+    assert stats.gift_count == 997
+    assert stats.total_price == Decimal("2492.50")
+    assert "Gift 0" in client.get("/users/alice/gifts").get_data(as_text=True)
+
+
+def test_import_round_trips_json_and_refreshes_lists(client, app):
+    create_user("alice@example.com", name="Alice")
+    _login(client)
+    client.get("/users/alice/gifts")
+    payload = [
+        {"title": "Kite", "price": 12.5, "url": "https://example.com/kite", "image_url": "https://example.com/k.jpg"},
+        {"title": "Socks", "notes": "wool"},
+        "not an object",
+    ]
+    response = client.post(
+        "/me/gifts/import",
+        data={"file": (io.BytesIO(json.dumps(payload).encode()), "gifts.json")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    assert "Imported 2 gift(s)" in response.get_data(as_text=True)
+    assert db.session.scalar(db.select(db.func.count(Job.id))) == 0
+
+    page = client.get("/users/alice/gifts").get_data(as_text=True)
+    assert "Kite" in page and "Socks" in page
+    exported = json.loads(client.get("/me/gifts/export.json").data)
+    assert [(item["title"], item["price"]) for item in exported] == [("Kite", "12.50"), ("Socks", None)]
+
+
+def test_import_rejects_unreadable_files(client, app):
+    create_user("alice@example.com", name="Alice")
+    _login(client)
+    response = client.post(
+        "/me/gifts/import",
+        data={"file": (io.BytesIO(b'[{"title": "Kite"}, {"title": '), "gifts.json")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    assert "not valid JSON" in response.get_data(as_text=True)
+
+    response = client.post(
+        "/me/gifts/import",
+        data={"file": (io.BytesIO(b"title\nKite\n"), "gifts.txt")},
+        content_type="multipart/form-data",
+    )
+    assert b"CSV or JSON files only" in response.data
+    # The broken file never reached a full batch, so nothing was committed.
+    assert db.session.scalar(db.select(db.func.count(Gift.id))) == 0
+
+
+def test_gifts_import_command(app, runner, tmp_path):
+    alice = create_user("alice@example.com", name="Alice")
+    path = tmp_path / "gifts.jsonl"
+    path.write_text('{"title": "Kite"}\n{"title": "Yo-yo", "price": "3"}\n{"price": "x"}\n')
+
+    result = runner.invoke(args=["gifts-import", "alice@example.com", str(path)])
+    assert "Imported 2 gift(s)" in result.output and "skipped 1" in result.output
+    assert db.session.scalar(db.select(db.func.count(Gift.id)).where(Gift.owner_id == alice.id)) == 2
+
+    result = runner.invoke(args=["gifts-import", "nobody@example.com", str(path)])
+    assert result.exit_code != 0 and "No user with email" in result.output
+
+
+def test_import_over_the_row_limit_commits_nothing(client, app):
+    app.config["GIFTS_IMPORT_BATCH_SIZE"] = 2
+    app.config["GIFTS_IMPORT_MAX_ROWS"] = 5
+    alice = create_user("alice@example.com", name="Alice")
+    _login(client)
+    rows = [(f"Gift {index}", "", f"https://shop.example.com/{index}", "", "1", "") for index in range(7)]
+    response = client.post(
+        "/me/gifts/import",
+        data={"file": (io.BytesIO(_csv(rows)), "wishlist.csv")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    assert "limited to 5 rows" in response.get_data(as_text=True)
+    assert db.session.scalar(db.select(db.func.count(Gift.id))) == 0
+    assert db.session.scalar(db.select(db.func.count(Job.id))) == 0
+    stats = db.session.get(UserGiftStats, alice.id, populate_existing=True)
+    assert stats.gift_count == 0 and stats.total_price == 0
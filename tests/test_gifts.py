@@ -1,5 +1,11 @@
+import re
+from types import SimpleNamespace
+
+from app.extensions import db
 from app.models import Gift
-from tests.conftest import create_gift, create_user, purchase_gift
+from app.services.gift_images import WARM_PROXY_IMAGE
+from app.utils import conditional
+from tests.conftest import assert_max_queries, create_gift, create_user, purchase_gift
 
 
 def test_owner_cannot_see_purchase_status(client, app):
@@ -29,6 +35,53 @@ def test_non_owner_sees_purchase_status(client, app):
     assert b"Mark as Purchased" not in response.data
 
 
+def test_owner_gift_lists_query_budget(client, app):
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        bob = create_user("bob@example.com", name="Bob")
+        for index in range(12):
+            gift = create_gift(alice, title=f"Gift {index}")
+            purchase_gift(gift, bob)
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    # The dashboard also reads the owner's ``user_gift_stats`` row by key.
+    for url, budget in (("/dashboard", 4), ("/me/gifts", 3), ("/users/alice/gifts", 3)):
+        with app.app_context(), assert_max_queries(budget):
+            response = client.get(url)
+        assert response.status_code == 200
+        assert b"Gift 11" in response.data
+
+
+def test_gift_lists_use_keyset_pagination(client, app):
+    from datetime import datetime
+
+    app.config["GIFTS_PER_PAGE"] = 4
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        create_user("bob@example.com", name="Bob")
+        same_moment = datetime(2024, 12, 1, 9, 0, 0)
+        for index in range(10):
+            # Identical timestamps force the id tie-breaker to keep pages disjoint.
+            create_gift(alice, title=f"Item-{index:02d}", created_at=same_moment)
+
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    seen = []
+    url = "/users/alice/gifts"
+    while url:
+        with app.app_context(), assert_max_queries(3):
+            body = client.get(url).data
+        seen.extend(re.findall(rb"Item-\d\d", body))
+        match = re.search(rb'href="([^"]+cursor=[^"]+)"', body)
+        url = match.group(1).decode().replace("&amp;", "&") if match else None
+    assert seen == [f"Item-{index:02d}".encode() for index in range(10)]
+
+    client.get("/logout")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    body = client.get("/me/gifts").data
+    assert re.findall(rb"card-title\">(Item-\d\d)", body) == [b"Item-09", b"Item-08", b"Item-07", b"Item-06"]
+    assert client.get("/me/gifts?cursor=not-a-cursor").status_code == 200
+
+
 def test_owner_cannot_edit_others_gift(client, app):
     with app.app_context():
         alice = create_user("alice@example.com", name="Alice")
@@ -45,15 +98,20 @@ def test_owner_cannot_edit_others_gift(client, app):
     assert b"You cannot edit this gift" in response.data
 
 
-def test_create_gift_infers_image_url(client, app, monkeypatch):
+def test_create_gift_queues_image_inference(client, app, monkeypatch):
+    from app.models import Job
+    from app.services.jobs import run_pending_jobs
+
     with app.app_context():
         user = create_user("dave@example.com", name="Dave")
 
-    def fake_infer(url: str) -> str | None:
+    from app.utils.images import PageProbe
+
+    def fake_probe(url: str, etag=None, last_modified=None) -> PageProbe:
         assert url == "https://example.com/widget"
-        return "https://cdn.example.com/widget.jpg"
+        return PageProbe(image_url="https://cdn.example.com/widget.jpg")
 
-    monkeypatch.setattr("app.gifts.routes.infer_image_url", fake_infer)
+    monkeypatch.setattr("app.services.image_inference.probe_page", fake_probe)
 
     client.post("/login", data={"email": "dave@example.com", "password": "password123"}, follow_redirects=True)
 
@@ -71,26 +129,103 @@ def test_create_gift_infers_image_url(client, app, monkeypatch):
     )
 
     with app.app_context():
+        gift = Gift.query.filter_by(title="Widget").one()
+        assert not gift.image_url
+        job = Job.query.one()
+        assert job.payload == {"gift_id": gift.id, "url": "https://example.com/widget"}
+
+        assert run_pending_jobs(limit=1) == 1
         gift = Gift.query.filter_by(title="Widget").one()
         assert gift.image_url == "https://cdn.example.com/widget.jpg"
+        assert db.session.get(Job, job.id).status == Job.DONE
+        # The inferred image is then fetched into the proxy cache off the request path.
+        warmup = Job.query.filter(Job.id != job.id).one()
+        assert warmup.kind == WARM_PROXY_IMAGE
+        assert warmup.payload == {"url": "https://cdn.example.com/widget.jpg"}
 
 
-def test_infer_image_url_parses_meta(monkeypatch):
+def test_infer_image_url_parses_meta(app, http_server):
     from app.utils.images import infer_image_url
 
-    class FakeResponse:
-        headers = {"Content-Type": "text/html; charset=utf-8"}
-        text = """<html><head><meta property='og:image' content='/img/prod.jpg'></head></html>"""
-        url = "https://shop.example.com/item"
+    http_server.routes["/item"] = (
+        200,
+        {"Content-Type": "text/html; charset=utf-8"},
+        b"<html><head><meta property='og:image' content='/img/prod.jpg'></head></html>",
+    )
 
-        def raise_for_status(self):
-            return None
+    with app.app_context():
+        result = infer_image_url(http_server.url("/item"))
+    assert result == http_server.url("/img/prod.jpg")
+    assert http_server.requests[0][1]["User-Agent"].startswith("GiftListBot/")
 
-    def fake_get(url, timeout=5, headers=None):
-        assert url == "https://shop.example.com/item"
-        return FakeResponse()
 
-    monkeypatch.setattr("app.utils.images.requests.get", fake_get)
+def test_list_pages_answer_conditional_gets(client, app):
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        create_user("bob@example.com", name="Bob")
+        gift_id = create_gift(alice, title="Kite").id
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    # The login flash is rendered (and consumed) by the first page view.
+    client.get("/me/gifts")
+    for url in ("/dashboard", "/me/gifts", "/users/alice/gifts", "/me/purchases"):
+        first = client.get(url)
+        etag = first.headers["ETag"]
+        assert "private" in first.headers["Cache-Control"] and "no-cache" in first.headers["Cache-Control"]
+        again = client.get(url, headers={"If-None-Match": etag})
+        assert again.status_code == 304, url
+        assert again.data == b""
+
+    etag = client.get("/me/gifts").headers["ETag"]
+    client.post(f"/gifts/{gift_id}/edit", data={"title": "Red kite"})
+    assert client.get("/me/gifts", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_rolls_over_before_the_csrf_token_expires(client, app, monkeypatch):
+    app.config["WTF_CSRF_TIME_LIMIT"] = 3600
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    client.get("/users/alice/gifts")
+
+    now = 1_800_000_000.0
+    monkeypatch.setattr(conditional, "time", SimpleNamespace(time=lambda: now))
+    etag = client.get("/users/alice/gifts").headers["ETag"]
+    assert client.get("/users/alice/gifts", headers={"If-None-Match": etag}).status_code == 304
+
+    now += 3601
+    response = client.get("/users/alice/gifts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etags_differ_between_owner_and_guest_views(client, app):
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        bob = create_user("bob@example.com", name="Bob")
+        purchase_gift(create_gift(alice, title="Kite"), bob)
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    client.get("/users/alice/gifts")
+    owner_etag = client.get("/users/alice/gifts").headers["ETag"]
+    client.get("/logout")
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    client.get("/users/alice/gifts")
+
+    response = client.get("/users/alice/gifts", headers={"If-None-Match": owner_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != owner_etag
+    assert b"Purchased by you" in response.data
+
+
+def test_pending_flash_is_never_hidden_behind_304(client, app):
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    client.get("/me/gifts")
+    etag = client.get("/me/gifts").headers["ETag"]
 
-    result = infer_image_url("https://shop.example.com/item")
-    assert result == "https://shop.example.com/img/prod.jpg"
+    client.post("/gifts/create", data={"title": "Yo-yo"})
+    response = client.get("/me/gifts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Yo-yo" in response.data
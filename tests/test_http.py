@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from app.utils import http as http_module
+from app.utils.http import BlockedAddress, HostBusy, HttpClient, _is_public, get_http_client
+
+
+def test_connections_are_reused(http_server):
+    http_server.routes["/ping"] = (200, {"Content-Type": "text/plain"}, b"pong")
+    client = HttpClient(allow_private_addresses=True)
+    for _ in range(3):
+        assert client.get(http_server.url("/ping")).text == "pong"
+    assert client.stats.snapshot() == {"requests": 3, "pool_hits": 2, "pool_misses": 1}
+
+
+def test_per_host_concurrency_is_capped(http_server):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow(handler):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.1)
+        with lock:
+            active.pop()
+        return 200, {"Content-Type": "text/plain"}, b"ok"
+
+    http_server.routes["/slow"] = slow
+    client = HttpClient(max_per_host=2, allow_private_addresses=True)
+    threads = [threading.Thread(target=client.get, args=(http_server.url("/slow"),)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+
+def test_host_wait_and_read_timeout(http_server):
+    def stall(handler):
+        time.sleep(0.5)
+        return 200, {"Content-Type": "text/plain"}, b"late"
+
+    http_server.routes["/stall"] = stall
+    client = HttpClient(read_timeout=0.1, max_per_host=1, host_wait=0.05, allow_private_addresses=True)
+    with pytest.raises(requests.Timeout):
+        client.get(http_server.url("/stall"))
+
+    with client.stream("GET", http_server.url("/stall"), timeout=2):
+        with pytest.raises(HostBusy):
+            client.get(http_server.url("/stall"))
+
+
+def test_idle_hosts_do_not_keep_slots(http_server):
+    http_server.routes["/ping"] = (200, {"Content-Type": "text/plain"}, b"pong")
+    client = HttpClient(max_per_host=1, host_wait=0.05, allow_private_addresses=True)
+    with client.stream("GET", http_server.url("/ping")):
+        assert len(client._host_slots) == 1
+        with pytest.raises(HostBusy):
+            client.get(http_server.url("/ping"))
+        assert len(client._host_slots) == 1
+    assert client._host_slots == {}
+    assert client.get(http_server.url("/ping")).text == "pong"
+    assert client._host_slots == {}
+
+
+@pytest.mark.parametrize(
+    "address, public",
+    [
+        ("93.184.216.34", True),
+        ("2606:2800:220:1:248:1893:25c8:1946", True),
+        ("127.0.0.1", False),
+        ("10.0.0.5", False),
+        ("192.168.1.1", False),
+        ("169.254.169.254", False),
+        ("0.0.0.0", False),
+        ("::1", False),
+        ("fe80::1%eth0", False),
+        ("::ffff:127.0.0.1", False),
+        ("224.0.0.1", False),
+    ],
+)
+def test_only_public_addresses_count_as_public(address, public):
+    assert _is_public(address) is public
+
+
+def test_private_addresses_are_refused_before_any_request(http_server):
+    seen = []
+    http_server.routes["/internal"] = lambda handler: seen.append(1) or (200, {}, b"secret")
+    client = HttpClient()
+    with pytest.raises(BlockedAddress):
+        client.get(http_server.url("/internal"))
+    assert seen == []
+    assert client._host_slots == {}
+
+
+def test_connected_peer_is_checked_again(http_server, monkeypatch):
+    # DNS may answer differently for the vetting lookup and the connection.
+    monkeypatch.setattr(http_module, "ensure_public_host", lambda host, port: None)
+    http_server.routes["/internal"] = (200, {}, b"secret")
+    with pytest.raises(BlockedAddress):
+        HttpClient().get(http_server.url("/internal"))
+    assert http_server.requests == []
+
+
+def test_client_is_shared_per_app(app):
+    app.config["HTTP_MAX_PER_HOST"] = 7
+    with app.app_context():
+        client = get_http_client()
+        assert get_http_client() is client
+        assert client.max_per_host == 7
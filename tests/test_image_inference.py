@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models import ImageInferenceCache
+from app.services.image_inference import cached_infer_image_url, normalize_page_url
+from app.utils.cache import app_cache
+
+PAGE = b"<html><head><meta property='og:image' content='/img/set.jpg'></head><body></body></html>"
+
+
+def test_normalize_page_url():
+    assert (
+        normalize_page_url("HTTPS://Shop.Example.com:443/set?utm_source=x&b=2&a=1#reviews")
+        == "https://shop.example.com/set?a=1&b=2"
+    )
+    assert normalize_page_url("http://shop.example.com:8080") == "http://shop.example.com:8080/"
+
+
+def test_inference_is_cached_in_process_and_in_database(app, http_server):
+    http_server.routes["/set"] = (200, {"Content-Type": "text/html"}, PAGE)
+    url = http_server.url("/set")
+    with app.app_context():
+        assert cached_infer_image_url(url) == http_server.url("/img/set.jpg")
+        assert cached_infer_image_url(url + "?utm_campaign=xmas") == http_server.url("/img/set.jpg")
+        assert len(http_server.requests) == 1
+
+        # Another worker has an empty LRU but shares the table.
+        app_cache("image_inference").clear()
+        assert cached_infer_image_url(url) == http_server.url("/img/set.jpg")
+        assert len(http_server.requests) == 1
+        assert ImageInferenceCache.query.count() == 1
+
+
+def test_expired_entry_is_revalidated_with_etag(app, http_server):
+    def page(handler):
+        if handler.headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"Content-Type": "text/html", "ETag": '"v1"'}, PAGE
+
+    http_server.routes["/set"] = page
+    url = http_server.url("/set")
+    with app.app_context():
+        cached_infer_image_url(url)
+        row = ImageInferenceCache.query.one()
+        row.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        app_cache("image_inference").clear()
+
+        assert cached_infer_image_url(url) == http_server.url("/img/set.jpg")
+        assert http_server.requests[-1][1]["If-None-Match"] == '"v1"'
+        assert ImageInferenceCache.query.one().expires_at > datetime.utcnow()
+
+
+def test_pages_without_images_are_negatively_cached(app, http_server):
+    app.config["IMAGE_INFERENCE_NEGATIVE_TTL_SECONDS"] = 600
+    http_server.routes["/plain"] = (200, {"Content-Type": "text/html"}, b"<html><head></head></html>")
+    with app.app_context():
+        assert cached_infer_image_url(http_server.url("/plain")) is None
+        assert cached_infer_image_url(http_server.url("/plain")) is None
+        assert cached_infer_image_url(http_server.url("/gone")) is None
+        assert cached_infer_image_url(http_server.url("/gone")) is None
+        assert len(http_server.requests) == 2
+        row = ImageInferenceCache.query.filter(ImageInferenceCache.page_url.like("%/plain")).one()
+        assert row.image_url is None
+        assert row.expires_at < datetime.utcnow() + timedelta(seconds=601)
@@ -0,0 +1,121 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.services.jobs import run_pending_jobs
+from app.utils.image_proxy import get_proxy_cache, proxied_image_url
+from tests.conftest import create_gift, create_user
+
+
+def png_bytes(size=(4, 4), color="red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture()
+def upload_dir(app, tmp_path):
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    return tmp_path
+
+
+def proxy_path(app, url):
+    with app.test_request_context():
+        return proxied_image_url(url)
+
+
+def test_proxy_refuses_internal_addresses(client, app, upload_dir, http_server):
+    app.config["HTTP_ALLOW_PRIVATE_ADDRESSES"] = False
+    http_server.routes["/a.png"] = (200, {"Content-Type": "image/png"}, png_bytes())
+    assert client.get(proxy_path(app, http_server.url("/a.png"))).status_code == 404
+    assert http_server.requests == []
+
+
+def test_new_gift_image_is_warmed_off_the_request_path(client, app, upload_dir, http_server):
+    data = png_bytes()
+    http_server.routes["/a.png"] = (200, {"Content-Type": "image/png"}, data)
+    url = http_server.url("/a.png")
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+    client.post("/gifts/create", data={"title": "Kite", "image_url": url})
+    assert http_server.requests == []
+
+    with app.app_context():
+        assert run_pending_jobs() == 1
+    assert len(http_server.requests) == 1
+    assert client.get(proxy_path(app, url)).data == data
+    assert len(http_server.requests) == 1
+
+
+def test_proxy_fetches_once_and_serves_locally(client, app, upload_dir, http_server):
+    data = png_bytes()
+    http_server.routes["/a.png"] = (200, {"Content-Type": "image/png"}, data)
+    path = proxy_path(app, http_server.url("/a.png"))
+
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.data == data
+    assert first.mimetype == "image/png"
+    assert "max-age=86400" in first.headers["Cache-Control"]
+    assert "immutable" not in first.headers["Cache-Control"]
+
+    second = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert client.get(path).data == data
+    assert len(http_server.requests) == 1
+
+
+def test_proxy_rejects_unsigned_urls(client, app, upload_dir, http_server):
+    http_server.routes["/a.png"] = (200, {"Content-Type": "image/png"}, png_bytes())
+    path = proxy_path(app, http_server.url("/a.png"))
+    tampered = path.replace("a.png", "b.png")
+
+    assert client.get(tampered).status_code == 404
+    assert client.get(path.split("?")[0] + "?url=file:///etc/passwd").status_code == 404
+    assert http_server.requests == []
+
+
+def test_proxy_remembers_failures(client, app, upload_dir, http_server):
+    http_server.routes["/fake.png"] = (200, {"Content-Type": "image/png"}, b"<html>not an image</html>")
+    path = proxy_path(app, http_server.url("/fake.png"))
+
+    assert client.get(path).status_code == 404
+    assert client.get(path).status_code == 404
+    assert len(http_server.requests) == 1
+    assert not list(upload_dir.rglob("*.png"))
+
+
+def test_proxy_cache_evicts_least_recently_used(app, upload_dir, http_server):
+    images = {f"/{color}.png": png_bytes((64, 64), color) for color in ("red", "green", "blue")}
+    for route, data in images.items():
+        http_server.routes[route] = (200, {"Content-Type": "image/png"}, data)
+    budget = sum(len(data) for data in images.values()) - 1
+    app.config["IMAGE_PROXY_CACHE_BYTES"] = budget
+
+    with app.app_context():
+        cache = get_proxy_cache()
+        red = cache.fetch(http_server.url("/red.png"))
+        green = cache.fetch(http_server.url("/green.png"))
+        os.utime(upload_dir / red, (1, 1))
+        os.utime(upload_dir / green, (2, 2))
+        etag_source = (upload_dir / red).stat().st_mtime
+        cache.fetch(http_server.url("/red.png"))  # a hit makes red the most recent
+        blue = cache.fetch(http_server.url("/blue.png"))
+
+    assert (upload_dir / red).stat().st_mtime == etag_source
+    assert (upload_dir / blue).exists()
+    assert not (upload_dir / green).exists()
+
+
+def test_gift_cards_use_proxied_remote_images(client, app, upload_dir):
+    with app.app_context():
+        owner = create_user("alice@example.com", name="Alice")
+        create_gift(owner, title="Lamp", image_url="https://cdn.example.com/lamp.jpg")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+
+    page = client.get("/me/gifts").get_data(as_text=True)
+    assert 'src="/images/proxy/' in page
+    assert 'src="https://cdn.example.com/lamp.jpg"' not in page
@@ -0,0 +1,347 @@
+import hashlib
+import io
+
+import pytest
+import requests
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app.gifts import routes as gift_routes
+from app.utils.http import HostBusy
+from app.utils.images import fetch_image, save_upload
+from app.utils.storage import content_path
+from tests.conftest import create_gift, create_user
+
+
+def png_bytes(size=(4, 4)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeStreamResponse:
+    def __init__(self, chunks, headers):
+        self._chunks = chunks
+        self.headers = headers
+        self.consumed = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        return None
+
+    def iter_content(self, chunk_size):
+        for chunk in self._chunks:
+            self.consumed += 1
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+@pytest.fixture()
+def upload_dir(app, tmp_path):
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    return tmp_path
+
+
+def install_response(monkeypatch, response):
+    class FakeClient:
+        def stream(self, method, url, **kwargs):
+            assert method == "GET"
+            return response
+
+    monkeypatch.setattr("app.utils.images.get_http_client", lambda: FakeClient())
+
+
+def test_fetch_image_streams_valid_png(app, upload_dir, monkeypatch):
+    data = png_bytes()
+    response = FakeStreamResponse([data[:5], data[5:]], {"Content-Type": "image/png"})
+    install_response(monkeypatch, response)
+
+    name = fetch_image("https://cdn.example.com/a.png")
+
+    assert name == content_path(hashlib.sha256(data).hexdigest(), ".png")
+    assert (upload_dir / name).read_bytes() == data
+    assert [path for path in upload_dir.rglob("*") if path.is_file()] == [upload_dir / name]
+    assert response.closed
+
+
+def test_fetch_image_rejects_declared_oversize_without_reading(app, upload_dir, monkeypatch):
+    app.config["MAX_CONTENT_LENGTH"] = 1024
+    response = FakeStreamResponse([b"x" * 4096], {"Content-Type": "image/png", "Content-Length": "4096"})
+    install_response(monkeypatch, response)
+
+    with pytest.raises(ValueError, match="too large"):
+        fetch_image("https://cdn.example.com/big.png")
+    assert response.consumed == 0
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_fetch_image_aborts_once_observed_size_passes_cap(app, upload_dir, monkeypatch):
+    app.config["MAX_CONTENT_LENGTH"] = 1024
+    chunks = [png_bytes()[:16]] + [b"\0" * 512] * 100
+    response = FakeStreamResponse(chunks, {"Content-Type": "image/png"})
+    install_response(monkeypatch, response)
+
+    with pytest.raises(ValueError, match="too large"):
+        fetch_image("https://cdn.example.com/endless.png")
+    assert response.consumed == 3
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_fetch_image_checks_magic_bytes_first(app, upload_dir, monkeypatch):
+    chunks = [b"<html><body>not an image</body></html>"] + [b"\0" * 512] * 10
+    response = FakeStreamResponse(chunks, {"Content-Type": "image/jpeg"})
+    install_response(monkeypatch, response)
+
+    with pytest.raises(ValueError, match="Unsupported image type"):
+        fetch_image("https://cdn.example.com/fake.jpg")
+    assert response.consumed == 1
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_fetch_image_over_http(app, upload_dir, http_server):
+    data = png_bytes()
+    http_server.routes["/a.png"] = (200, {"Content-Type": "image/png"}, data)
+    with app.app_context():
+        name = fetch_image(http_server.url("/a.png"))
+    assert (upload_dir / name).read_bytes() == data
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [(HostBusy("Too many concurrent requests to cdn.example.com"), 503), (requests.ConnectTimeout("slow"), 502)],
+)
+def test_image_fetcher_maps_download_failures(client, app, monkeypatch, error, status):
+    def failing_fetch(url):
+        raise error
+
+    monkeypatch.setattr(gift_routes, "fetch_image", failing_fetch)
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+    response = client.post("/images/fetch", json={"url": "https://cdn.example.com/a.png"})
+    assert response.status_code == status
+    assert response.get_json()["error"]
+
+
+def test_image_fetcher_refuses_internal_addresses(client, app, upload_dir, http_server):
+    app.config["HTTP_ALLOW_PRIVATE_ADDRESSES"] = False
+    http_server.routes["/a.png"] = (200, {"Content-Type": "image/png"}, png_bytes())
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+    response = client.post("/images/fetch", json={"url": http_server.url("/a.png")})
+    assert response.status_code == 400
+    assert "non-public address" in response.get_json()["error"]
+    assert http_server.requests == []
+
+
+def test_probe_page_stops_reading_after_head(app, http_server):
+    from app.utils.images import probe_page
+
+    body = b"<p>" + b"x" * (2 * 1024 * 1024) + b"</p>"
+    http_server.routes["/with-image"] = (
+        200,
+        {"Content-Type": "text/html"},
+        b"<html><head><title>Set</title><meta property='og:image' content='/set.jpg'>"
+        b"</head><body>" + body + b"</body></html>",
+    )
+    http_server.routes["/no-image"] = (
+        200,
+        {"Content-Type": "text/html; charset=iso-8859-1"},
+        "<html><head><title>Caf\xe9</title></head><body>".encode("latin-1") + body + b"</body></html>",
+    )
+    with app.app_context():
+        probe = probe_page(http_server.url("/with-image"))
+        assert probe.image_url == http_server.url("/set.jpg")
+        assert probe.bytes_read <= 16 * 1024
+
+        probe = probe_page(http_server.url("/no-image"))
+        assert probe.image_url is None
+        assert probe.bytes_read <= 16 * 1024
+
+
+def test_probe_page_respects_byte_cap(app, http_server):
+    from app.utils.images import probe_page
+
+    app.config["IMAGE_INFERENCE_MAX_BYTES"] = 40 * 1024
+    filler = b"<meta name='keywords' content='" + b"lego " * 40000 + b"'>"
+    http_server.routes["/huge-head"] = (
+        200,
+        {"Content-Type": "text/html"},
+        b"<html><head>" + filler + b"<meta property='og:image' content='/late.jpg'></head></html>",
+    )
+    with app.app_context():
+        probe = probe_page(http_server.url("/huge-head"))
+    assert probe.image_url is None
+    assert probe.bytes_read == 40 * 1024
+
+
+def test_uploaded_file_is_immutable_and_conditional(app, client, upload_dir):
+    data = png_bytes()
+    (upload_dir / "abc123.png").write_bytes(data)
+
+    response = client.get("/uploads/abc123.png")
+    assert response.status_code == 200
+    assert response.data == data
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "max-age=31536000" in response.headers["Cache-Control"]
+    etag = response.headers["ETag"]
+
+    response = client.get("/uploads/abc123.png", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    response = client.get("/uploads/abc123.png", headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.data == data[:8]
+
+    assert client.get("/uploads/../secret.png").status_code == 404
+    assert client.get("/uploads/missing.png").status_code == 404
+
+
+def test_uploaded_file_offloads_to_front_proxy(app, client, upload_dir):
+    (upload_dir / "abc123.png").write_bytes(png_bytes())
+
+    app.config.update(UPLOADS_SEND_MODE="x-accel-redirect", UPLOADS_ACCEL_PREFIX="/protected/")
+    response = client.get("/uploads/abc123.png")
+    assert response.headers["X-Accel-Redirect"] == "/protected/abc123.png"
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.data == b""
+    response = client.get("/uploads/abc123.png", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    app.config["UPLOADS_SEND_MODE"] = "x-sendfile"
+    response = client.get("/uploads/abc123.png")
+    assert response.headers["X-Sendfile"] == str((upload_dir / "abc123.png").resolve())
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+def test_unknown_send_mode_is_a_configuration_error(app, client, upload_dir):
+    from app import create_app
+    from config import TestingConfig
+
+    class TypoConfig(TestingConfig):
+        UPLOADS_SEND_MODE = "x-accel"
+
+    with pytest.raises(RuntimeError, match="Unknown UPLOADS_SEND_MODE 'x-accel'"):
+        create_app(TypoConfig)
+
+    (upload_dir / "abc123.png").write_bytes(png_bytes())
+    app.config["UPLOADS_SEND_MODE"] = "xsendfile"
+    with pytest.raises(RuntimeError, match="UPLOADS_SEND_MODE"):
+        client.get("/uploads/abc123.png")
+
+
+def store_upload(upload_dir, data, name="ab/cd/" + "0" * 64 + ".png"):
+    path = upload_dir / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return name
+
+
+def test_image_variant_is_rendered_once_and_cached(client, upload_dir):
+    source = store_upload(upload_dir, png_bytes((1200, 600)))
+
+    response = client.get(f"/images/640/webp/{source}")
+    assert response.status_code == 200
+    assert response.mimetype == "image/webp"
+    assert "immutable" in response.headers["Cache-Control"]
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.size == (640, 320)
+
+    rendered = upload_dir / "_derivatives" / "ab" / "cd" / ("0" * 64) / "640.webp"
+    mtime = rendered.stat().st_mtime_ns
+    again = client.get(f"/images/640/webp/{source}")
+    assert again.data == response.data
+    assert rendered.stat().st_mtime_ns == mtime
+
+
+def test_image_variant_never_upscales_and_flattens_jpeg(client, upload_dir):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (100, 50), (0, 0, 0, 0)).save(buffer, format="PNG")
+    source = store_upload(upload_dir, buffer.getvalue())
+
+    response = client.get(f"/images/320/jpeg/{source}")
+    assert response.status_code == 200
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.format == "JPEG"
+        assert image.size == (100, 50)
+        assert image.getpixel((0, 0)) == (255, 255, 255)
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/images/500/webp/{source}", "/images/640/gif/{source}", "/images/640/webp/missing.png", "/images/640/webp/../x.png"],
+)
+def test_image_variant_rejects_unknown_requests(client, upload_dir, path):
+    source = store_upload(upload_dir, png_bytes())
+    assert client.get(path.format(source=source)).status_code == 404
+    assert not (upload_dir / "_derivatives").exists() or not any((upload_dir / "_derivatives").rglob("*.*"))
+
+
+def test_gift_cards_render_srcset(client, app, upload_dir):
+    with app.app_context():
+        owner = create_user("alice@example.com", name="Alice")
+        create_gift(owner, title="Lamp", image_path=store_upload(upload_dir, png_bytes()))
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"})
+
+    page = client.get("/me/gifts").get_data(as_text=True)
+    assert 'type="image/webp"' in page
+    assert f"/images/320/webp/ab/cd/{'0' * 64}.png 320w" in page
+    assert f"/images/960/jpeg/ab/cd/{'0' * 64}.png 960w" in page
+    assert 'loading="lazy"' in page
+
+
+def upload(data: bytes, filename="photo.png") -> FileStorage:
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"GIF89a" + b"\x00" * 64, "Unsupported image type"),
+        (b"\x89PNG\r\n\x1a\n" + b"\x00" * 64, "Invalid image file"),
+        (b"\x89PNG\r\n\x1a\n" + b"\x00" * (3 * 1024 * 1024), "too large"),
+    ],
+)
+def test_save_upload_rejects_before_writing(app, upload_dir, data, message):
+    with app.app_context(), pytest.raises(ValueError, match=message):
+        save_upload(upload(data))
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_save_upload_rejects_mismatched_container(app, upload_dir):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buffer, format="JPEG")
+    disguised = b"\x89PNG\r\n\x1a\n" + buffer.getvalue()
+    with app.app_context(), pytest.raises(ValueError):
+        save_upload(upload(disguised))
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_save_upload_enforces_pixel_budget(app, upload_dir):
+    app.config["UPLOAD_MAX_PIXELS"] = 100
+    with app.app_context(), pytest.raises(ValueError, match="dimensions"):
+        save_upload(upload(png_bytes((20, 20))))
+
+
+def test_save_upload_reencodes_without_exif(app, upload_dir):
+    app.config["UPLOAD_REENCODE"] = True
+    app.config["UPLOAD_MAX_DIMENSION"] = 64
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"  # Make
+    exif[0x0112] = 6  # rotated 90 degrees
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 100), "blue").save(buffer, format="JPEG", exif=exif)
+
+    with app.app_context():
+        name = save_upload(upload(buffer.getvalue(), "photo.jpg"))
+    assert name.endswith(".jpg")
+    with Image.open(upload_dir / name) as image:
+        assert image.size == (32, 64)
+        assert not image.getexif()
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import requests
+
+from app.extensions import db
+from app.models import Gift, ImageInferenceCache, Job
+from app.services.gift_images import queue_image_inference
+from app.services.jobs import claim_next_job, enqueue, job_handler, run_pending_jobs
+from tests.conftest import create_gift, create_user
+
+
+def test_failed_job_is_retried_with_backoff(app):
+    calls = []
+
+    @job_handler("test.flaky")
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError("retailer timed out")
+
+    app.config.update(JOBS_BACKOFF_SECONDS=60, JOBS_MAX_ATTEMPTS=3)
+    with app.app_context():
+        enqueue("test.flaky", {"n": 1})
+        db.session.commit()
+
+        assert run_pending_jobs() == 1
+        job = Job.query.one()
+        assert job.status == Job.QUEUED
+        assert job.attempts == 1
+        assert "retailer timed out" in job.last_error
+        assert job.run_at > datetime.utcnow() + timedelta(seconds=30)
+        # Not due yet, so nothing runs.
+        assert run_pending_jobs() == 0
+
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+        assert run_pending_jobs() == 1
+        job = Job.query.one()
+        assert job.status == Job.DONE
+        assert job.attempts == 2
+    assert calls == [{"n": 1}, {"n": 1}]
+
+
+def test_job_fails_after_max_attempts(app):
+    @job_handler("test.broken")
+    def broken(payload):
+        raise RuntimeError("boom")
+
+    app.config.update(JOBS_MAX_ATTEMPTS=1)
+    with app.app_context():
+        enqueue("test.broken", {})
+        enqueue("test.unknown-kind", {})
+        db.session.commit()
+        assert run_pending_jobs() == 2
+        assert {job.status for job in Job.query.all()} == {Job.FAILED}
+
+
+def test_stale_running_job_is_reclaimed(app):
+    with app.app_context():
+        job = Job(kind="test.noop", payload={}, status=Job.RUNNING, locked_at=datetime.utcnow() - timedelta(hours=1))
+        db.session.add(job)
+        db.session.commit()
+        claimed = claim_next_job()
+        assert claimed is not None and claimed.id == job.id
+        assert claim_next_job() is None
+
+
+def _failing_probe(status, probes):
+    def fake_probe(url, etag=None, last_modified=None):
+        probes.append(url)
+        response = requests.Response()
+        response.status_code = status
+        raise requests.HTTPError(response=response)
+
+    return fake_probe
+
+
+def test_image_inference_job_skips_stale_payload_and_gives_up_on_404(app, monkeypatch):
+    probes = []
+    monkeypatch.setattr("app.services.image_inference.probe_page", _failing_probe(404, probes))
+    with app.app_context():
+        owner = create_user("erin@example.com", name="Erin")
+        gift = create_gift(owner, title="Kite", url="https://shop.example.com/kite")
+        queue_image_inference(gift)
+        gift.url = "https://shop.example.com/kite-v2"
+        queue_image_inference(gift)
+        db.session.commit()
+
+        assert run_pending_jobs() == 2
+        assert probes == ["https://shop.example.com/kite-v2"]
+        # A missing page is a cached "no image" answer, not a job failure.
+        statuses = [job.status for job in Job.query.order_by(Job.id)]
+        assert statuses == [Job.DONE, Job.DONE]
+        cached = ImageInferenceCache.query.one()
+        assert cached.page_url == "https://shop.example.com/kite-v2"
+        assert cached.image_url is None and cached.expires_at > datetime.utcnow()
+        assert db.session.get(Gift, gift.id).image_url is None
+
+
+def test_image_inference_job_gives_up_on_403(app, monkeypatch):
+    probes = []
+    monkeypatch.setattr("app.services.image_inference.probe_page", _failing_probe(403, probes))
+    with app.app_context():
+        owner = create_user("erin@example.com", name="Erin")
+        gift = create_gift(owner, title="Kite", url="https://shop.example.com/kite")
+        queue_image_inference(gift)
+        db.session.commit()
+
+        assert run_pending_jobs() == 1
+        assert probes == ["https://shop.example.com/kite"]
+        assert Job.query.one().status == Job.FAILED
+        assert ImageInferenceCache.query.count() == 0
+        assert db.session.get(Gift, gift.id).image_url is None
+
+
+def test_jobs_worker_cli_drains_queue(app, runner):
+    @job_handler("test.cli")
+    def noop(payload):
+        return None
+
+    with app.app_context():
+        enqueue("test.cli", {})
+        db.session.commit()
+    result = runner.invoke(args=["jobs-worker", "--once"])
+    assert "Ran 1 job(s)" in result.output
@@ -1,5 +1,7 @@
+import re
+
 from app.models import User
-from tests.conftest import create_gift, create_user
+from tests.conftest import assert_max_queries, count_queries, create_gift, create_user, purchase_gift
 
 
 def setup_users(app):
@@ -64,3 +66,160 @@ def test_unpurchase_requires_buyer(client, app):
     client.post("/login", data={"email": "carol@example.com", "password": "password123"}, follow_redirects=True)
     response = client.post(f"/gifts/{gift_id}/unpurchase", follow_redirects=True)
     assert b"only unmark gifts you purchased" in response.data
+
+
+def test_my_purchases_single_query_and_pagination(client, app):
+    alice, bob = setup_users(app)
+    app.config["PURCHASES_PER_PAGE"] = 5
+    with app.app_context():
+        carol = create_user("carol@example.com", name="Carol")
+        for index in range(7):
+            owner = alice if index % 2 else carol
+            purchase_gift(create_gift(owner, title=f"Present {index}"), bob)
+
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    # current user + the ETag's data version + one joined SELECT for the rows
+    with app.app_context(), assert_max_queries(3):
+        response = client.get("/me/purchases")
+    body = response.data
+    assert body.count(b"list-group-item") == 5
+    assert b"For Carol (carol@example.com)" in body
+    next_url = re.search(rb'href="([^"]+cursor=[^"]+)"', body).group(1).decode()
+
+    response = client.get(next_url)
+    assert response.data.count(b"list-group-item") == 2
+    assert b"Present 0" in response.data
+    assert b"Next page" not in response.data
+
+
+def test_claim_is_one_insert_and_updates_stats(client, app):
+    from app.extensions import db
+    from app.models import UserGiftStats
+
+    alice, bob = setup_users(app)
+    with app.app_context():
+        gift_id = create_gift(alice, title="Camera").id
+        alice_id = alice.id
+
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    client.get("/users/alice/gifts")
+    with count_queries() as statements:
+        response = client.post(f"/gifts/{gift_id}/purchase", headers={"Referer": "/users/alice/gifts"})
+    assert response.status_code == 302
+    inserts = [sql for sql in statements if sql.startswith("INSERT INTO purchases")]
+    assert len(inserts) == 1 and "ON CONFLICT" in inserts[0] and "RETURNING" in inserts[0]
+    assert not any(sql.startswith("ROLLBACK") for sql in statements)
+
+    assert db.session.get(UserGiftStats, alice_id, populate_existing=True).purchased_count == 1
+    assert b"Purchased by you" in client.get("/users/alice/gifts").data
+    assert client.post("/gifts/999/purchase").status_code == 404
+
+
+def test_batch_claim_reports_per_gift_results(client, app):
+    from app.extensions import db
+    from app.models import Purchase
+
+    alice, bob = setup_users(app)
+    with app.app_context():
+        carol = create_user("carol@example.com", name="Carol")
+        free = [create_gift(alice, title=f"Free {index}").id for index in range(3)]
+        taken = create_gift(alice, title="Taken")
+        purchase_gift(taken, carol)
+        mine = create_gift(bob, title="Mine").id
+        taken_id, bob_id = taken.id, bob.id
+
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    response = client.post("/purchases/claim", json={"gift_ids": [*free, taken_id, mine, 12345, free[0]]})
+    assert response.status_code == 200
+    assert response.json["claimed"] == 3
+    assert response.json["results"] == [
+        {"gift_id": free[0], "status": "claimed"},
+        {"gift_id": free[1], "status": "claimed"},
+        {"gift_id": free[2], "status": "claimed"},
+        {"gift_id": taken_id, "status": "taken"},
+        {"gift_id": mine, "status": "own_gift"},
+        {"gift_id": 12345, "status": "not_found"},
+    ]
+    again = client.post("/purchases/claim", json={"gift_ids": free[:1]})
+    assert again.json["results"] == [{"gift_id": free[0], "status": "already_yours"}]
+    assert db.session.scalar(db.select(db.func.count(Purchase.id)).where(Purchase.buyer_id == bob_id)) == 3
+
+    assert client.post("/purchases/claim", json={"gift_ids": "1,2"}).status_code == 400
+    assert client.post("/purchases/claim", json={"gift_ids": [True]}).status_code == 400
+    app.config["PURCHASE_CLAIM_MAX_GIFTS"] = 2
+    assert client.post("/purchases/claim", json={"gift_ids": [1, 2, 3]}).status_code == 400
+
+
+def test_concurrent_claims_have_exactly_one_winner(tmp_path):
+    import threading
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Purchase, UserGiftStats
+    from app.services.purchases import CLAIMED, TAKEN, claim_gifts
+    from config import TestingConfig
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'claims.db'}"
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        owner = create_user("owner@example.com", name="Owner")
+        buyers = [create_user(f"buyer{index}@example.com", name=f"Buyer {index}").id for index in range(12)]
+        gift_id = create_gift(owner, title="Last one in stock").id
+        owner_id = owner.id
+        db.session.remove()
+
+    barrier = threading.Barrier(len(buyers))
+    results, errors = [], []
+
+    def shopper(buyer_id):
+        with app.app_context():
+            try:
+                barrier.wait()
+                results.append(claim_gifts(buyer_id, [gift_id])[gift_id])
+            except Exception as exc:  # noqa: BLE001 - surfaced by the assertion below
+                errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=shopper, args=(buyer_id,)) for buyer_id in buyers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(results) == [CLAIMED] + [TAKEN] * (len(buyers) - 1)
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count(Purchase.id))) == 1
+        assert db.session.get(UserGiftStats, owner_id).purchased_count == 1
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_my_purchases_etag_changes_when_a_purchase_is_swapped(client, app):
+    from app.extensions import db
+    from app.models import Purchase
+
+    alice, bob = setup_users(app)
+    with app.app_context():
+        kite, yoyo, scarf = (create_gift(alice, title=title).id for title in ("Kite", "Yo-yo", "Scarf"))
+
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    client.post(f"/gifts/{scarf}/purchase")
+    client.post(f"/gifts/{yoyo}/purchase")
+    client.get("/me/purchases")
+    etag = client.get("/me/purchases").headers["ETag"]
+    swapped_id = db.session.scalar(db.select(Purchase.id).where(Purchase.gift_id == yoyo))
+
+    # Undo the latest purchase and buy an older gift: SQLite reuses the row id
+    # and the newest purchased gift (Scarf) stays the same.
+    client.post(f"/gifts/{yoyo}/unpurchase")
+    client.post(f"/gifts/{kite}/purchase")
+    assert db.session.scalar(db.select(Purchase.id).where(Purchase.gift_id == kite)) == swapped_id
+    client.get("/me/purchases")
+
+    response = client.get("/me/purchases", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Kite" in response.data and b"Yo-yo" not in response.data
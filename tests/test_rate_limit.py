@@ -0,0 +1,90 @@
+import multiprocessing
+
+import pytest
+from werkzeug.exceptions import TooManyRequests
+
+from app.utils.rate_limit import (
+    MemoryRateLimitStore,
+    RateLimiter,
+    SQLiteRateLimitStore,
+    sliding_window_hit,
+)
+
+
+def test_sliding_window_weights_previous_window():
+    state = None
+    for _ in range(10):
+        state, allowed = sliding_window_hit(state, 59.0, limit=10, window=60)
+        assert allowed
+    state, allowed = sliding_window_hit(state, 59.5, limit=10, window=60)
+    assert not allowed
+
+    # A quarter into the next window three quarters of the old hits still count.
+    state, allowed = sliding_window_hit(state, 75.0, limit=10, window=60)
+    assert state == (1, 1, 10) and allowed
+    state, allowed = sliding_window_hit(state, 75.0, limit=10, window=60)
+    state, allowed = sliding_window_hit(state, 75.0, limit=10, window=60)
+    assert state == (1, 3, 10) and allowed
+    state, allowed = sliding_window_hit(state, 75.0, limit=10, window=60)
+    assert state == (1, 3, 10) and not allowed
+
+    # Two windows later nothing carries over.
+    assert sliding_window_hit(state, 200.0, limit=10, window=60) == ((3, 1, 0), True)
+
+
+def test_memory_store_is_bounded_and_drops_idle_keys():
+    store = MemoryRateLimitStore(max_keys=3)
+    for index in range(5):
+        store.hit(f"ip-{index}", limit=5, window=60, now=10.0)
+    assert len(store) == 3
+
+    store.hit("late", limit=5, window=60, now=500.0)
+    assert len(store) == 1
+
+
+def test_limiter_raises_too_many_requests():
+    limiter = RateLimiter(MemoryRateLimitStore())
+    limiter.check("auth:1.2.3.4:auth.login", limit=2, window=60, now=1.0)
+    limiter.check("auth:1.2.3.4:auth.login", limit=2, window=60, now=2.0)
+    with pytest.raises(TooManyRequests):
+        limiter.check("auth:1.2.3.4:auth.login", limit=2, window=60, now=3.0)
+    limiter.check("auth:5.6.7.8:auth.login", limit=2, window=60, now=3.0)
+
+
+def _hit_from_worker(path, results):
+    store = SQLiteRateLimitStore(path)
+    results.put([store.hit("auth:shared", limit=5, window=60, now=30.0) for _ in range(4)])
+
+
+def test_sqlite_store_shares_counts_across_processes(tmp_path):
+    path = str(tmp_path / "ratelimit.sqlite3")
+    SQLiteRateLimitStore(path).keys()  # create the schema before the workers race
+    results = multiprocessing.get_context("spawn").Queue()
+    workers = [
+        multiprocessing.get_context("spawn").Process(target=_hit_from_worker, args=(path, results)) for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes = [outcome for _ in workers for outcome in results.get(timeout=30)]
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert outcomes.count(True) == 5
+    assert outcomes.count(False) == 7
+
+
+def test_sqlite_store_purges_idle_keys(tmp_path):
+    store = SQLiteRateLimitStore(str(tmp_path / "ratelimit.sqlite3"), purge_interval=0)
+    store.hit("old", limit=5, window=60, now=10.0)
+    store.hit("new", limit=5, window=60, now=500.0)
+    assert store.keys() == ["new"]
+
+
+def test_auth_routes_use_configured_backend(app, client, tmp_path):
+    app.config.update(
+        RATELIMIT_BACKEND="sqlite", RATELIMIT_STORAGE_PATH=str(tmp_path / "limits.sqlite3"), RATELIMIT_AUTH=2
+    )
+    assert client.get("/login").status_code == 200
+    assert client.get("/login").status_code == 200
+    assert client.get("/login").status_code == 302
+    assert SQLiteRateLimitStore(str(tmp_path / "limits.sqlite3")).keys() == ["auth:127.0.0.1:auth.login"]
@@ -0,0 +1,175 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from app.extensions import db
+from app.models import Gift, StoredFile
+from app.services import uploads
+from app.services.uploads import collect_orphaned_uploads
+from tests.conftest import count_queries, create_gift, create_user
+
+
+def image_bytes(color="red", fmt="PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture()
+def upload_dir(app, tmp_path):
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    return tmp_path
+
+
+def stored_files(root):
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob("*") if path.is_file())
+
+
+def post_gift(client, title, data, filename="photo.png"):
+    return client.post(
+        "/gifts/create",
+        data={"title": title, "image_file": (io.BytesIO(data), filename)},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+
+
+def test_duplicate_uploads_share_one_file(client, app, upload_dir):
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+
+    data = image_bytes()
+    post_gift(client, "Lamp", data, "lamp.png")
+    post_gift(client, "Same lamp", data, "IMG_0001.PNG")
+
+    with app.app_context():
+        paths = {gift.image_path for gift in Gift.query.all()}
+        assert len(paths) == 1
+        path = paths.pop()
+        assert stored_files(upload_dir) == [path]
+        assert db.session.get(StoredFile, path).ref_count == 2
+
+        gift = Gift.query.filter_by(title="Lamp").one()
+        gift_id = gift.id
+    client.post(f"/gifts/{gift_id}/delete", follow_redirects=True)
+    with app.app_context():
+        assert db.session.get(StoredFile, path).ref_count == 1
+    assert client.get(f"/uploads/{path}").status_code == 200
+
+
+def test_replacing_an_image_moves_the_reference(app, upload_dir):
+    with app.app_context():
+        owner = create_user("alice@example.com", name="Alice")
+        gift = create_gift(owner, title="Scarf", image_path="aa/bb/old.png")
+        gift.image_path = "cc/dd/new.png"
+        db.session.commit()
+        counts = {row.path: row.ref_count for row in StoredFile.query.all()}
+    assert counts == {"aa/bb/old.png": 0, "cc/dd/new.png": 1}
+
+
+def test_uploads_migrate_moves_legacy_files(app, runner, upload_dir):
+    data = image_bytes("blue")
+    (upload_dir / "0123456789abcdef.png").write_bytes(data)
+    (upload_dir / "fedcba9876543210.png").write_bytes(data)
+    with app.app_context():
+        owner = create_user("alice@example.com", name="Alice")
+        create_gift(owner, title="One", image_path="0123456789abcdef.png")
+        create_gift(owner, title="Two", image_path="fedcba9876543210.png")
+        create_gift(owner, title="Gone", image_path="missing.png")
+
+    result = runner.invoke(args=["uploads-migrate", "--batch-size", "2"])
+    assert "Migrated 1 file(s), deduplicated 1, 1 missing on disk" in result.output
+
+    with app.app_context():
+        paths = {gift.title: gift.image_path for gift in Gift.query.all()}
+        assert paths["One"] == paths["Two"]
+        assert stored_files(upload_dir) == [paths["One"]]
+        assert db.session.get(StoredFile, paths["One"]).ref_count == 2
+        assert db.session.get(StoredFile, "0123456789abcdef.png").ref_count == 0
+
+
+def write_upload(root, relative, data=b"x" * 100):
+    path = root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_uploads_gc_removes_unreferenced_files_after_grace(app, runner, upload_dir):
+    kept = "aa/bb/" + "a" * 64 + ".png"
+    orphan = "cc/dd/" + "c" * 64 + ".png"
+    write_upload(upload_dir, kept)
+    write_upload(upload_dir, orphan, b"y" * 2048)
+    write_upload(upload_dir, f"_derivatives/cc/dd/{'c' * 64}/320.webp", b"z" * 512)
+    write_upload(upload_dir, "_proxy/ab/" + "b" * 64 + ".png")
+    write_upload(upload_dir, ".upload-stale.part")
+    with app.app_context():
+        owner = create_user("alice@example.com", name="Alice")
+        create_gift(owner, title="Kept", image_path=kept)
+        gone = create_gift(owner, title="Gone", image_path=orphan)
+        db.session.delete(gone)
+        db.session.commit()
+
+    fresh = runner.invoke(args=["uploads-gc"])
+    assert "Removed 0 of 3 file(s)" in fresh.output
+    assert "3 inside the grace period" in fresh.output
+
+    preview = runner.invoke(args=["uploads-gc", "--grace-seconds", "0", "--dry-run"])
+    assert "Would remove 2 of 3 file(s), 2.1 KiB" in preview.output
+    assert (upload_dir / orphan).exists()
+
+    result = runner.invoke(args=["uploads-gc", "--grace-seconds", "0"])
+    assert "Removed 2 of 3 file(s), 2.6 KiB" in result.output
+    assert stored_files(upload_dir) == ["_proxy/ab/" + "b" * 64 + ".png", kept]
+    with app.app_context():
+        assert db.session.get(StoredFile, orphan) is None
+        assert db.session.get(StoredFile, kept).ref_count == 1
+
+
+def test_uploads_gc_checks_references_in_batches(app, upload_dir):
+    paths = [f"{index:02x}/00/{index:064x}.png" for index in range(7)]
+    for path in paths:
+        write_upload(upload_dir, path)
+    with app.app_context():
+        owner = create_user("alice@example.com", name="Alice")
+        for path in paths[::2]:
+            create_gift(owner, title=path, image_path=path)
+        stats = collect_orphaned_uploads(grace_seconds=0, batch_size=2)
+    assert stats["removed"] == 3
+    assert stored_files(upload_dir) == sorted(paths[::2])
+
+
+def test_uploads_gc_spares_a_file_reused_after_the_scan(app, upload_dir, monkeypatch):
+    reused, orphan = "aa/00/" + "a" * 64 + ".png", "bb/00/" + "b" * 64 + ".png"
+    for path in (reused, orphan):
+        write_upload(upload_dir, path)
+    scan = uploads._iter_upload_files
+
+    def scan_then_dedupe(root):
+        yield from scan(root)
+        # A deduplicating upload touches the file before its gift commits.
+        time.sleep(0.05)
+        os.utime(upload_dir / reused)
+
+    monkeypatch.setattr(uploads, "_iter_upload_files", scan_then_dedupe)
+    with app.app_context():
+        stats = collect_orphaned_uploads(grace_seconds=0)
+    assert stats["removed"] == 1 and stats["recent"] == 1
+    assert stored_files(upload_dir) == [reused]
+
+
+def test_first_reference_is_a_single_upsert(app, upload_dir):
+    alice = create_user("alice@example.com", name="Alice")
+    path = "ab/cd/" + "e" * 64 + ".png"
+    with count_queries() as statements:
+        create_gift(alice, title="Lamp", image_path=path)
+    writes = [sql for sql in statements if "stored_files" in sql]
+    assert len(writes) == 1 and writes[0].startswith("INSERT") and "ON CONFLICT" in writes[0]
+
+    create_gift(alice, title="Same lamp", image_path=path)
+    row = db.session.get(StoredFile, path, populate_existing=True)
+    assert row.ref_count == 2
@@ -1,4 +1,12 @@
-from tests.conftest import create_gift, create_user
+import os
+from decimal import Decimal
+
+from flask import g
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import Gift, UserGiftStats
+from tests.conftest import assert_max_queries, create_gift, create_user, purchase_gift
 
 
 def test_user_search(client, app):
@@ -14,6 +22,55 @@ def test_user_search(client, app):
     assert b"/users/alice/gifts" not in body
 
 
+def test_user_search_ranks_and_paginates(client, app):
+    app.config["USERS_PER_PAGE"] = 2
+    with app.app_context():
+        create_user("alice@example.com", name="Alice Wonderland")
+        create_user("alison@example.com", name="Alison Smith")
+        create_user("alicia@example.com", name="Alicia Keys")
+        create_user("bob@example.com", name="Bob Builder")
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    response = client.get("/users?q=ali")
+    assert response.data.count(b"list-group-item-action") == 2
+    assert b"page=2" in response.data
+    response = client.get("/users?q=ali&page=2")
+    assert response.data.count(b"list-group-item-action") == 1
+    assert b"Bob Builder" not in response.data
+
+    response = client.get("/users?q=%22%2A")
+    assert response.status_code == 200
+    assert b"No users found" in response.data
+
+
+def test_user_search_follows_renames(client, app):
+    from app.extensions import db
+    from app.models import User
+
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+        user = create_user("bob@example.com", name="Bob")
+        user.name = "Robert Builder"
+        db.session.commit()
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    assert b"Robert Builder" in client.get("/users?q=robert").data
+    assert b"Robert Builder" not in client.get("/users?q=bobby").data
+
+
+def test_user_typeahead(client, app):
+    with app.app_context():
+        create_user("alice@example.com", name="Alice Wonderland")
+        create_user("bob@example.com", name="Bob Builder")
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    response = client.get("/users/typeahead?q=bui")
+    assert response.get_json() == {
+        "results": [{"name": "Bob Builder", "username": "bob", "url": "/users/bob/gifts"}]
+    }
+    assert client.get("/users/typeahead?q=").get_json() == {"results": []}
+
+
 def test_view_user_gifts_respects_privacy(client, app):
     with app.app_context():
         alice = create_user("alice@example.com", name="Alice")
@@ -22,3 +79,234 @@ def test_view_user_gifts_respects_privacy(client, app):
     client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
     response = client.get("/users/alice/gifts")
     assert b"Mark as Purchased" not in response.data
+
+
+def test_user_gifts_query_budget(client, app):
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        bob = create_user("bob@example.com", name="Bob")
+        create_user("carol@example.com", name="Carol")
+        for index in range(12):
+            gift = create_gift(alice, title=f"Gift {index}")
+            if index % 2:
+                purchase_gift(gift, bob)
+
+    client.post("/login", data={"email": "carol@example.com", "password": "password123"}, follow_redirects=True)
+    # current user + list owner + gifts with their purchases
+    with app.app_context(), assert_max_queries(3):
+        response = client.get("/users/alice/gifts")
+    assert response.data.count(b"badge bg-success") == 6
+
+
+def test_shared_local_parts_get_distinct_slugs(client, app):
+    with app.app_context():
+        first = create_user("alice@example.com", name="Alice Example")
+        second = create_user("Alice@other.org", name="Alice Other")
+        create_gift(second, title="Telescope")
+        assert (first.slug, second.slug) == ("alice", "alice-2")
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    response = client.get("/users/alice-2/gifts")
+    assert b"Alice Other" in response.data
+    assert b"Telescope" in response.data
+    assert b"Alice Example's Gift List" in client.get("/users/ALICE/gifts").data
+
+
+def test_username_cache_invalidated_on_change(client, app):
+    from app.extensions import db
+    from app.models import User
+
+    with app.app_context():
+        create_user("alice@example.com", name="Alice")
+        create_user("bob@example.com", name="Bob")
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    assert client.get("/users/bob/gifts").status_code == 200
+
+    with app.app_context():
+        bob = User.query.filter_by(email="bob@example.com").one()
+        bob.slug = "robert"
+        db.session.commit()
+
+    assert client.get("/users/bob/gifts").status_code == 404
+    assert client.get("/users/robert/gifts").status_code == 200
+
+
+def test_repeat_gift_list_views_skip_the_database(client, app):
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        bob = create_user("bob@example.com", name="Bob")
+        gift = create_gift(alice, title="Kite")
+        purchase_gift(gift, bob)
+
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    # Start each request the way a real one starts: fresh session and no user
+    # memoised on the app context (which the fixture shares between requests).
+    db.session.remove()
+    g.pop("_login_user", None)
+    first = client.get("/users/alice/gifts")
+    db.session.remove()
+    g.pop("_login_user", None)
+    with app.app_context(), assert_max_queries(0):
+        second = client.get("/users/alice/gifts")
+    assert second.data == first.data
+    assert b"Purchased by you" in second.data
+
+
+def test_gift_list_cache_follows_writes_and_keeps_the_surprise(client, app):
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        create_user("bob@example.com", name="Bob")
+        create_user("carol@example.com", name="Carol")
+        gift_id = create_gift(alice, title="Kite").id
+
+    # Warm both viewer classes before anything is purchased.
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    assert b"Kite" in client.get("/users/alice/gifts").data
+    client.get("/logout")
+    client.post("/login", data={"email": "bob@example.com", "password": "password123"}, follow_redirects=True)
+    assert b"Mark as Purchased" in client.get("/users/alice/gifts").data
+
+    client.post(f"/gifts/{gift_id}/purchase", follow_redirects=True)
+    assert b"Purchased by you" in client.get("/users/alice/gifts").data
+    client.get("/logout")
+
+    client.post("/login", data={"email": "carol@example.com", "password": "password123"}, follow_redirects=True)
+    page = client.get("/users/alice/gifts").data
+    assert b"badge bg-success" in page and b"by you" not in page and b"Mark as Purchased" not in page
+    client.get("/logout")
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    client.post(f"/gifts/{gift_id}/edit", data={"title": "Red kite"}, follow_redirects=True)
+    page = client.get("/users/alice/gifts").data
+    assert b"Red kite" in page
+    assert b"badge bg-success" not in page
+
+
+def test_gift_list_writes_reach_other_workers_through_the_marker(client, app, tmp_path):
+    marker = tmp_path / "gift_lists.stamp"
+    app.config["GIFT_LIST_INVALIDATION_PATH"] = str(marker)
+    with app.app_context():
+        alice = create_user("alice@example.com", name="Alice")
+        gift_id = create_gift(alice, title="Kite").id
+    assert marker.exists()
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    assert b"Kite" in client.get("/users/alice/gifts").data
+
+    # Another worker renamed the gift: only the marker file tells us.
+    db.session.execute(db.update(Gift).where(Gift.id == gift_id).values(title="Red kite"))
+    db.session.commit()
+    assert b"Red kite" not in client.get("/users/alice/gifts").data
+    os.utime(marker, ns=(0, 123456789))
+    assert b"Red kite" in client.get("/users/alice/gifts").data
+
+
+def _stats(user_id):
+    db.session.expire_all()
+    row = db.session.get(UserGiftStats, user_id)
+    return row.gift_count, row.purchased_count, row.total_price
+
+
+def test_gift_stats_follow_gift_and_purchase_writes(app):
+    alice = create_user("alice@example.com", name="Alice")
+    bob = create_user("bob@example.com", name="Bob")
+    assert _stats(alice.id) == (0, 0, Decimal("0"))
+
+    kite = create_gift(alice, title="Kite", price=Decimal("12.50"))
+    yoyo = create_gift(alice, title="Yo-yo")
+    purchase_gift(kite, bob)
+    assert _stats(alice.id) == (2, 1, Decimal("12.50"))
+
+    yoyo.price = Decimal("3.25")
+    db.session.commit()
+    assert _stats(alice.id) == (2, 1, Decimal("15.75"))
+
+    # Deleting a purchased gift cascades to its purchase first.
+    db.session.delete(db.session.get(type(kite), kite.id))
+    db.session.commit()
+    assert _stats(alice.id) == (1, 0, Decimal("3.25"))
+    assert _stats(bob.id) == (0, 0, Decimal("0"))
+
+    db.session.rollback()
+    create_gift(bob, title="Scarf", price=Decimal("20"))
+    db.session.add(type(kite)(owner=bob, title="Socks", price=Decimal("5")))
+    db.session.flush()
+    db.session.rollback()
+    assert _stats(bob.id) == (1, 0, Decimal("20.00"))
+
+
+def test_missing_stats_row_is_seeded_even_when_another_writer_wins(app):
+    alice = create_user("alice@example.com", name="Alice")
+    create_gift(alice, title="Kite", price=Decimal("12.50"))
+    db.session.execute(db.delete(UserGiftStats))
+    db.session.commit()
+
+    create_gift(alice, title="Yo-yo", price=Decimal("2"))
+    assert _stats(alice.id) == (2, 0, Decimal("14.50"))
+
+    # Another transaction seeds the row between our UPDATE missing it and our INSERT.
+    db.session.execute(db.delete(UserGiftStats))
+    db.session.commit()
+    engine = db.session.get_bind()
+    raced = []
+
+    def seed_first(conn, cursor, statement, parameters, context, executemany):
+        if not raced and statement.startswith("UPDATE user_gift_stats") and cursor.rowcount == 0:
+            raced.append(statement)
+            conn.connection.cursor().execute(
+                "INSERT INTO user_gift_stats (user_id, gift_count, purchased_count, total_price, updated_at) "
+                "VALUES (?, 5, 0, 40, CURRENT_TIMESTAMP)",
+                (alice.id,),
+            )
+
+    event.listen(engine, "after_cursor_execute", seed_first)
+    try:
+        create_gift(alice, title="Ball", price=Decimal("1"))
+    finally:
+        event.remove(engine, "after_cursor_execute", seed_first)
+    assert raced
+    assert _stats(alice.id) == (6, 0, Decimal("41.00"))
+
+
+def test_directory_shows_stats_in_one_query(client, app):
+    alice = create_user("alice@example.com", name="Alice")
+    bob = create_user("bob@example.com", name="Bob")
+    for index in range(5):
+        carol = create_user(f"carol{index}@example.com", name=f"Carol {index}")
+        create_gift(carol, title="Book", price=Decimal("10"))
+    kite = create_gift(alice, title="Kite", price=Decimal("12.50"))
+    purchase_gift(kite, bob)
+
+    client.post("/login", data={"email": "alice@example.com", "password": "password123"}, follow_redirects=True)
+    client.get("/users")
+    with assert_max_queries(1):
+        body = client.get("/users").data.decode()
+    assert body.count("1 gifts") == 6
+    assert "$10.00" in body and "$12.50" in body
+    # Alice sees others' purchased counts but never her own.
+    assert body.count("purchased</span>") == 6
+    assert "1 purchased" not in body
+
+    dashboard = client.get("/dashboard").data.decode()
+    assert "1 gift," in dashboard and "$12.50 in total" in dashboard
+    assert "purchased" not in dashboard.split("Quick overview")[1].split("</p>")[0]
+
+
+def test_stats_rebuild_command_repairs_drift(app, runner):
+    alice = create_user("alice@example.com", name="Alice")
+    bob = create_user("bob@example.com", name="Bob")
+    create_gift(alice, title="Kite", price=Decimal("12.50"))
+    db.session.execute(db.update(UserGiftStats).values(gift_count=99, total_price=0))
+    db.session.commit()
+
+    result = runner.invoke(args=["stats-rebuild"])
+    assert "Rebuilt gift statistics for 2 user(s)" in result.output
+    assert _stats(alice.id) == (1, 0, Decimal("12.50"))
+    assert _stats(bob.id) == (0, 0, Decimal("0"))
+
+    # A user without a row (created before the table existed) starts from real totals.
+    db.session.execute(db.delete(UserGiftStats).where(UserGiftStats.user_id == alice.id))
+    db.session.commit()
+    create_gift(alice, title="Yo-yo", price=Decimal("2"))
+    assert _stats(alice.id) == (2, 0, Decimal("14.50"))